@@ -1,7 +1,11 @@
-from app.common import logger
+from app.common import logger, tracing
 from ...services import ffmpeg_converter
-from .types import CutSlConfig, VideoSuffix
+from .types import CutSlConfig, VideoSuffix, FileResult, FileStatus, ValidityCheck
+import concurrent.futures
 import os
+import shutil
+import tempfile
+import time
 from datetime import datetime, timedelta, date
 from typing import TypedDict
 from pathlib import Path
@@ -9,6 +13,9 @@ import re
 
 __all__: list[str] = ["merger_handler", "cut_sl_speedup_handler"]
 
+# Spans of the handlers and their per file steps, see app.common.tracing
+_traced = tracing.traced("mideo_converter")
+
 
 class HandleSpeedup(TypedDict):
     start_hour: int
@@ -97,8 +104,14 @@ def _group_files_by_date(video_files: list[Path], start_hour: int = 0) -> Groupe
     return grouped_files
 
 
+@_traced
 def _merge_videos(
-    video_dict: GroupedVideos, save_path: Path, delete_after: bool, **otherkwargs
+    video_dict: GroupedVideos,
+    save_path: Path,
+    delete_after: bool,
+    check: ValidityCheck = ValidityCheck.DURATION,
+    max_workers: int | None = None,
+    **otherkwargs,
 ) -> int:
     """_summary_
 
@@ -106,6 +119,8 @@ def _merge_videos(
         video_dict (GroupedVideos): _description_
         save_path (Path): _description_
         delete_after (bool): _description_
+        check (ValidityCheck, optional): How the clips are validated.
+        max_workers (int | None, optional): Clips validated at once.
 
     Returns:
         int: _description_
@@ -113,6 +128,18 @@ def _merge_videos(
     today: date = datetime.today().date()
     dir_to_delete: set[Path] = set()
 
+    # Validate the clips of every day in one batch, cached from previous runs
+    validity: dict[Path, bool] = ffmpeg_converter.probe_valid_videos(
+        (
+            video_path
+            for date_key, videos in video_dict.items()
+            if date_key != today
+            for video_path in videos.values()
+        ),
+        check,
+        max_workers,
+    )
+
     for date_key, videos in video_dict.items():
 
         if date_key == today:
@@ -125,7 +152,7 @@ def _merge_videos(
         # Prepare the input file list with valid check for ffmpeg
         input_files: list[Path] = []
         for video_path in sorted_videos.values():
-            if ffmpeg_converter.probe_is_valid_video(video_path):
+            if validity[video_path]:
                 input_files.append(video_path)
                 dir_to_delete.add(video_path.parent)
 
@@ -181,11 +208,14 @@ def _merge_videos(
     return 0
 
 
+@_traced
 def merger_handler(
     folder_path: Path,
     start_hour: int = 6,
     delete_after: bool = True,
     valid_extensions: set[str] | None = None,
+    check: ValidityCheck = ValidityCheck.DURATION,
+    max_workers: int | None = None,
     **otherkwargs,
 ) -> int:
     """_summary_
@@ -194,6 +224,9 @@ def merger_handler(
         folder_path (Path): _description_
         start_hour (int, optional): _description_. Defaults to 6.
         delete_after (bool, optional): _description_. Defaults to True.
+        check (ValidityCheck, optional): HEADER only reads the header of the clips,
+            DURATION probes their duration. Defaults to ValidityCheck.DURATION.
+        max_workers (int | None, optional): Clips validated at once.
 
     Returns:
         int: _description_
@@ -210,12 +243,115 @@ def merger_handler(
     grouped_videos: GroupedVideos = _group_files_by_date(video_files, start_hour)
 
     do_merge: int = _merge_videos(
-        grouped_videos, folder_path, delete_after, **otherkwargs
+        grouped_videos, folder_path, delete_after, check, max_workers, **otherkwargs
     )
 
     return do_merge
 
 
+def _move_file(source: Path, target: Path) -> None:
+    """Replace target with source, copying when they are on different drives."""
+    try:
+        source.replace(target)
+    except OSError:
+        # os.replace can't cross drives on Windows
+        shutil.move(source, target)
+
+
+@_traced
+def _cut_sl_speedup_file(
+    video: Path,
+    output_file: Path,
+    multiple: int | float,
+    same_encode: bool,
+    cut_sl_config: CutSlConfig,
+    fused: bool = False,
+    profile: ffmpeg_converter.types.EncodeProfile | None = None,
+    calibrate: bool = False,
+    **otherkwargs,
+) -> FileResult:
+    """Cut silence and speed up one video in a temp dir of its own.
+
+    The output only appears at output_file once every step succeeded. With fused,
+    both steps run as one filter graph and the video is encoded once. An encode
+    profile replaces the codec and bitrate copied with same_encode.
+    """
+    result: FileResult = {
+        "input_file": video,
+        "output_file": output_file,
+        "status": FileStatus.FAILED,
+        "cut_silence_seconds": 0.0,
+        "speedup_seconds": 0.0,
+        "total_seconds": 0.0,
+    }
+    started: float = time.perf_counter()
+    tracing.current_span().set(input_file=video.name)
+    # Next to the output, so the finished file is renamed and not copied across
+    # drives, and the intermediates don't fill the system drive
+    temp_dir: Path = Path(
+        tempfile.mkdtemp(prefix=f".{video.stem}_", dir=output_file.parent)
+    )
+    try:
+        cut_file: Path = temp_dir / ("cut_silence" + video.suffix)
+        original_encode: dict = {}
+        if multiple != 0 and profile is not None:
+            original_encode = ffmpeg_converter.encode_profile_args(
+                profile, calibrate, video
+            )
+        elif multiple != 0 and same_encode:
+            original_encode = dict(ffmpeg_converter.probe_encoding(video))
+        if fused and multiple != 0:
+            cut_silence = ffmpeg_converter.cut_silence_speedup(
+                video,
+                cut_file,
+                multiple,
+                **cut_sl_config,
+                **(original_encode | otherkwargs),
+            )
+        else:
+            cut_silence = ffmpeg_converter.cut_silence(
+                video, cut_file, **cut_sl_config
+            )
+        result["cut_silence_seconds"] = time.perf_counter() - started
+        if cut_silence != 0:
+            result["error"] = f"cut_silence returned {cut_silence}"
+            logger.error(f"Failed to cut silence for {video}. Skipping.")
+            return result
+
+        if multiple != 0 and not fused:
+            speedup_started: float = time.perf_counter()
+            speedup_file: Path = temp_dir / ("speedup" + video.suffix)
+            speedup = ffmpeg_converter.speedup(
+                cut_file, speedup_file, multiple, **(original_encode | otherkwargs)
+            )
+            result["speedup_seconds"] = time.perf_counter() - speedup_started
+            if speedup != 0:
+                result["error"] = f"speedup returned {speedup}"
+                logger.error(f"Failed to speed up {video}. Skipping.")
+                return result
+            cut_file = speedup_file
+        elif multiple == 0:
+            logger.info(f"{multiple = } for {video}. No sppedup.")
+
+        # Get the file's timestamp to the first video's epoch time
+        video_epoch = _extract_epoch(video)
+        if video_epoch:
+            os.utime(cut_file, (video_epoch, video_epoch))
+        _move_file(cut_file, output_file)
+        result["status"] = FileStatus.DONE
+        logger.info(
+            f"Cut silence and speeding up video saved to {output_file}, set timestamps as the original file."
+        )
+    except Exception as e:
+        result["error"] = str(e)
+        logger.error(f"Failed to cut silence and speed up {video}. Error: {e}")
+    finally:
+        result["total_seconds"] = time.perf_counter() - started
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return result
+
+
+@_traced
 def _cut_sl_speedup(
     input_folder: Path,
     multiple: int | float = 0,
@@ -223,70 +359,89 @@ def _cut_sl_speedup(
     output_folder_name: str = "cut_sl_speedup",
     valid_extensions: set[str] | None = None,
     cut_sl_config: CutSlConfig | None = None,
+    max_workers: int | None = None,
+    fused: bool = False,
+    profile: ffmpeg_converter.types.EncodeProfile | None = None,
+    calibrate: bool = False,
     **otherkwargs,
-):
-    """_summary_
+) -> int:
+    """Cut silence and speed up every video of input_folder, several files at a time.
 
     Args:
         input_folder (Path): _description_
         multiple (int | float): _description_
         same_encode (bool, optional): _description_. Defaults to True.
         output_folder_name (str, optional): _description_. Defaults to "cut_sl_speedup".
+        max_workers (int | None, optional): Files processed at once. Defaults to the
+            ffmpeg scheduler's job limit.
+        fused (bool, optional): Cut silence and speed up in a single encode.
+            Defaults to False.
+        profile (EncodeProfile | None, optional): Encode profile of the speedup.
+        calibrate (bool, optional): Pick the preset of profile by calibration.
 
     Returns:
-        _type_: _description_
+        int: 0 if every file succeeded, 1 if there is no file, 2 if some failed
     """
-    video_files: list[Path] = _list_video_files(input_folder, valid_extensions, False)
+    video_files: list[Path] = sorted(
+        _list_video_files(input_folder, valid_extensions, False)
+    )
     if not video_files:
         logger.info(f"no {valid_extensions} files in {input_folder}")
         return 1
 
     if cut_sl_config is None:
         cut_sl_config = {}
+    if max_workers is None:
+        max_workers = ffmpeg_converter.scheduler.max_jobs
 
     output_folder: Path = input_folder / output_folder_name
     output_folder.mkdir(parents=True, exist_ok=True)
 
-    for video in video_files:
-        # Get the file's timestamp to the first video's epoch time
-        video_epoch = _extract_epoch(video)
-
-        output_file: Path = output_folder / (
-            video.stem + "_" + output_folder_name + video.suffix
-        )
-
-        cut_silence = ffmpeg_converter.cut_silence(video, output_file, **cut_sl_config)
-
-        if cut_silence != 0:
-            logger.error(f"Failed to cut silence for {video}. Skipping.")
-            continue
-
-        if multiple != 0:
-            original_encode: ffmpeg_converter.types.EncodeKwargs = (
-                (ffmpeg_converter.probe_encoding_info(video)) if same_encode else {}
-            )
-
-            ffmpeg_converter.speedup(
-                output_file, output_file, multiple, **(original_encode | otherkwargs)
+    started: float = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: list[concurrent.futures.Future[FileResult]] = [
+            executor.submit(
+                _cut_sl_speedup_file,
+                video,
+                output_folder / (video.stem + "_" + output_folder_name + video.suffix),
+                multiple,
+                same_encode,
+                cut_sl_config,
+                fused,
+                profile,
+                calibrate,
+                **otherkwargs,
             )
-        else:
-            logger.info(f"{multiple = } for {video}. No sppedup.")
-
-        if video_epoch:
-            os.utime(output_file, (video_epoch, video_epoch))
+            for video in video_files
+        ]
+        results: list[FileResult] = [future.result() for future in futures]
 
+    for result in results:
         logger.info(
-            f"Cut silence and speeding up video saved to {output_file}, set timestamps as the original file."
+            f"{result['input_file'].name}: {result['status']} in {result['total_seconds']:.1f}s "
+            f"(cut silence {result['cut_silence_seconds']:.1f}s, speedup {result['speedup_seconds']:.1f}s)"
         )
-
-    return 0
+    failed: list[FileResult] = [
+        result for result in results if result["status"] != FileStatus.DONE
+    ]
+    logger.info(
+        f"Processed {len(results) - len(failed)}/{len(results)} files in {input_folder} "
+        f"in {time.perf_counter() - started:.1f}s with {max_workers} workers, "
+        f"{sum(result['total_seconds'] for result in results):.1f}s of file time."
+    )
+    return 2 if failed else 0
 
 
+@_traced
 def cut_sl_speedup_handler(
     folder_path: Path,
     multiple: int | float = 2,
     valid_extensions: set[str] | None = None,
     cut_sl_config: CutSlConfig | None = None,
+    max_workers: int | None = None,
+    fused: bool = False,
+    profile: ffmpeg_converter.types.EncodeProfile | None = None,
+    calibrate: bool = False,
     **otherkwargs,
 ) -> int:
     """_summary_
@@ -294,6 +449,10 @@ def cut_sl_speedup_handler(
     Args:
         folder_path (Path): _description_
         multiple (int, optional): _description_. Defaults to 50.
+        max_workers (int | None, optional): Files processed at once.
+        fused (bool, optional): Cut silence and speed up in a single encode.
+        profile (EncodeProfile | None, optional): Encode profile of the speedup.
+        calibrate (bool, optional): Pick the preset of profile by calibration.
 
     Returns:
         int: _description_
@@ -314,6 +473,10 @@ def cut_sl_speedup_handler(
         multiple,
         valid_extensions=valid_extensions,
         cut_sl_config=defalut_cut_sl_config | cut_sl_config,
+        max_workers=max_workers,
+        fused=fused,
+        profile=profile,
+        calibrate=calibrate,
         **otherkwargs,
     )
 
@@ -1,6 +1,7 @@
 from typing import TypedDict, NotRequired
 from pathlib import Path
 from enum import StrEnum, auto
+from ...services.ffmpeg_converter.types import EncodeProfile, ValidityCheck
 
 
 class CutSlConfig(TypedDict):
@@ -14,6 +15,8 @@ class MideoMergerTask(TypedDict):
     start_hour: int
     delete_after: bool
     valid_extensions: NotRequired[set[str]]
+    check: NotRequired[ValidityCheck]
+    max_workers: NotRequired[int]
 
 
 # SpeedupTask
@@ -23,6 +26,25 @@ class CutSlSpeedupTask(TypedDict):
     same_encode: NotRequired[bool]
     valid_extensions: NotRequired[set[str]]
     cut_sl_config: NotRequired[CutSlConfig]
+    max_workers: NotRequired[int]
+    fused: NotRequired[bool]
+    profile: NotRequired[EncodeProfile]
+    calibrate: NotRequired[bool]
+
+
+class FileStatus(StrEnum):
+    DONE = auto()
+    FAILED = auto()
+
+
+class FileResult(TypedDict):
+    input_file: Path
+    output_file: Path
+    status: FileStatus
+    cut_silence_seconds: float
+    speedup_seconds: float
+    total_seconds: float
+    error: NotRequired[str]
 
 
 class VideoSuffix(StrEnum):
@@ -2,6 +2,7 @@ from logging import Logger
 import os
 from . import constants
 from . import mytypes
+from . import tracing
 from .logger import setup_logger
 
 # Create App directories if they don't exist
@@ -19,4 +20,4 @@ os.environ["PATH"] = os.pathsep.join(
         os.environ["PATH"],
     ]
 )
-__all__: list[str] = ["constants", "mytypes", "logger"]
+__all__: list[str] = ["constants", "mytypes", "tracing", "logger"]
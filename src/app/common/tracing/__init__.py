@@ -0,0 +1,28 @@
+from .tracing import (
+    Span,
+    span,
+    current_span,
+    traced,
+    enabled,
+    enable,
+    disable,
+    reset,
+    events,
+    export_chrome_trace,
+    TRACE_ENV,
+)
+
+
+__all__: list[str] = [
+    "Span",
+    "span",
+    "current_span",
+    "traced",
+    "enabled",
+    "enable",
+    "disable",
+    "reset",
+    "events",
+    "export_chrome_trace",
+    "TRACE_ENV",
+]
@@ -0,0 +1,208 @@
+"""Lightweight tracing spans.
+
+A span times one stage of a job (a probe, a segment cut, a merge, a
+subprocess) and carries attributes such as the segment index, bytes written
+or the exit code. Finished spans are kept as complete ("X") events of the
+Chrome trace-event format, `export_chrome_trace` writes them to a JSON file
+that opens in Perfetto (ui.perfetto.dev) or chrome://tracing. Spans of one
+thread nest by time, work spread over worker threads shows as one track per
+thread.
+
+Tracing is off unless `enable` is called or the TRIMSHH_TRACE environment
+variable names a trace file to write at exit. While off, `span` returns one
+shared no-op span and `traced` functions call straight through, so the
+instrumentation costs a flag check. The no-op span is falsy, which lets call
+sites skip computing attributes:
+
+    with span("merge", "ffmpeg_converter") as merge_span:
+        ...
+        if merge_span:
+            merge_span.set(bytes=output_file.stat().st_size)
+"""
+
+from collections.abc import Callable
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+TRACE_ENV: str = "TRIMSHH_TRACE"
+
+_enabled: bool = False
+_lock = threading.Lock()
+_events: list[dict[str, Any]] = []
+_named_threads: set[int] = set()
+_origin_ns: int = time.perf_counter_ns()
+_exit_paths: set[Path] = set()
+
+
+class Span:
+    __slots__ = ("name", "category", "attributes", "_start_ns", "_parent")
+
+    def __init__(self, name: str, category: str, attributes: dict[str, Any]) -> None:
+        self.name: str = name
+        self.category: str = category
+        self.attributes: dict[str, Any] = attributes
+        self._start_ns: int = 0
+        self._parent: Span | None = None
+
+    def __bool__(self) -> bool:
+        return True
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._parent = _current.get()
+        _current.set(self)
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        end_ns: int = time.perf_counter_ns()
+        # Set, not reset: generators may close the span in another context
+        _current.set(self._parent)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _record(
+            {
+                "name": self.name,
+                "cat": self.category,
+                "ph": "X",
+                "ts": (self._start_ns - _origin_ns) / 1000,
+                "dur": (end_ns - self._start_ns) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": self.attributes,
+            }
+        )
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _record(event: dict[str, Any]) -> None:
+    with _lock:
+        if event["tid"] not in _named_threads:
+            _named_threads.add(event["tid"])
+            _events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": event["pid"],
+                    "tid": event["tid"],
+                    "args": {"name": threading.current_thread().name},
+                }
+            )
+        _events.append(event)
+
+
+def span(name: str, category: str = "app", **attributes: Any) -> Span | _NoopSpan:
+    """Time the `with` block as a span, a no-op while tracing is off."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, category, attributes)
+
+
+def current_span() -> Span | _NoopSpan:
+    """Innermost open span of this context, to add attributes to it."""
+    if not _enabled:
+        return _NOOP
+    return _current.get() or _NOOP
+
+
+def traced[**P, R](
+    category: str = "app", name: str | None = None
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Trace every call of the decorated function as a span named after it."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        span_name: str = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(export_at_exit: Path | None = None) -> None:
+    """Start recording spans, and write them to `export_at_exit` when Python exits."""
+    global _enabled
+    _enabled = True
+    if export_at_exit is not None:
+        with _lock:
+            if not _exit_paths:
+                atexit.register(_export_at_exit)
+            _exit_paths.add(export_at_exit)
+
+
+def disable() -> None:
+    """Stop recording, the spans recorded so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+def reset() -> None:
+    """Drop the recorded spans."""
+    with _lock:
+        _events.clear()
+        _named_threads.clear()
+
+
+def events() -> list[dict[str, Any]]:
+    with _lock:
+        return list(_events)
+
+
+def export_chrome_trace(path: Path) -> Path:
+    """Write the recorded spans as a Chrome trace-event JSON file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {"traceEvents": events(), "displayTimeUnit": "ms"}, default=str
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def _export_at_exit() -> None:
+    for path in _exit_paths:
+        export_chrome_trace(path)
+
+
+if trace_path := os.environ.get(TRACE_ENV):
+    enable(Path(trace_path))
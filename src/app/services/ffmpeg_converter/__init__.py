@@ -11,10 +11,33 @@ from .ffmpeg_converter import (
     probe_encoding,
     probe_duration,
     probe_is_valid_video,
+    probe_valid_videos,
     probe_non_silence,
+    iter_silences,
+    iter_keyframes,
+    probe_keyframe_index,
+    load_keyframe_index,
+    analyze_media,
+    probe_loudness_envelope,
+    load_loudness_envelope,
+    non_silence_from_envelope,
+    probe_motion,
     cut_silence,
     cut_silence_rerender,
+    cut_silence_speedup,
+    rerender_segments,
+    encode_profile_args,
+    calibrate_profile,
+    encode_in_chunks,
+    ENCODE_PROFILES,
+    ANALYSIS_PROFILES,
 )
+from .keyframe_index import KeyframeIndex
+from .intervals import Intervals
+from .scheduler import scheduler, priority
+from .job_manifest import collect_garbage
+from .command import FFmpegCommand
+from .engine import CancelToken, FFmpegCancelled, cancellation, on_progress
 from . import types
 
 PACKAGE_NAME = "ffmpeg_converter"
@@ -47,9 +70,36 @@ __all__: list[str] = [
     "probe_encoding",
     "probe_duration",
     "is_valid_video",
+    "probe_valid_videos",
     "detect_non_silence",
+    "iter_silences",
+    "iter_keyframes",
+    "probe_keyframe_index",
+    "load_keyframe_index",
+    "KeyframeIndex",
+    "Intervals",
+    "scheduler",
+    "priority",
+    "collect_garbage",
+    "FFmpegCommand",
+    "CancelToken",
+    "FFmpegCancelled",
+    "cancellation",
+    "on_progress",
+    "analyze_media",
+    "probe_loudness_envelope",
+    "load_loudness_envelope",
+    "non_silence_from_envelope",
+    "probe_motion",
     "cut_silence",
     "cut_silence_rerender",
+    "cut_silence_speedup",
+    "rerender_segments",
+    "encode_profile_args",
+    "calibrate_profile",
+    "encode_in_chunks",
+    "ENCODE_PROFILES",
+    "ANALYSIS_PROFILES",
     "ffmpeg_Error",
     "types",
 ]
@@ -0,0 +1,314 @@
+"""Persistent media analysis cache.
+
+Probe results are stored in a SQLite file and keyed by the file identity
+(path, size, mtime and a content fingerprint) so that re-running a folder does
+not decode the same videos again. The cache is bounded by `MAX_CACHE_BYTES`
+and evicts the least recently used entries first.
+
+Clip validity is kept in a table of its own, keyed by path, size and mtime
+only: validating a day of camera clips must not read a fingerprint of each.
+Its rows are a few dozen bytes and are replaced when a file changes.
+
+The database runs in WAL mode, so reads go on while a row is written, and the
+writes of this process are serialized: parallel jobs would otherwise fail with
+"database is locked" and drop their entries.
+"""
+
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Any
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from app.common import constants, logger
+from ..db_manager import DatabaseManager
+
+CACHE_PATH: Path = constants.AppPaths.APP_DATA / "analysis_cache.sqlite"
+MAX_CACHE_BYTES: int = 256 * 1024 * 1024
+FINGERPRINT_CHUNK: int = 1024 * 1024
+# Bound parameters per query, below SQLite's limit
+QUERY_CHUNK: int = 500
+# Fingerprints kept in memory, the least recently used are dropped
+MAX_FINGERPRINTS: int = 4096
+# Seconds a connection waits for the write lock of another process
+BUSY_TIMEOUT: int = 30
+
+enabled: bool = True
+
+type FileIdentity = tuple[str, int, int, str]
+
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_initialized: set[Path] = set()
+# In insertion order, a hit is moved to the end
+_fingerprints: dict[tuple[str, int, int], str] = {}
+
+
+def _fingerprint(input_file: Path, size: int) -> str:
+    """Hash the size, the head and the tail of the file."""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(input_file, "rb") as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if size > FINGERPRINT_CHUNK * 2:
+            f.seek(-FINGERPRINT_CHUNK, 2)
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+
+def file_identity(input_file: Path) -> FileIdentity:
+    stat = input_file.stat()
+    path = str(input_file.resolve())
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        fingerprint: str | None = _fingerprints.pop(key, None)
+    if fingerprint is None:
+        fingerprint = _fingerprint(input_file, stat.st_size)
+    with _lock:
+        _fingerprints[key] = fingerprint
+        while len(_fingerprints) > MAX_FINGERPRINTS:
+            del _fingerprints[next(iter(_fingerprints))]
+    return (*key, fingerprint)
+
+
+def _connect(db_path: Path) -> DatabaseManager:
+    with _lock:
+        if db_path not in _initialized:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+    db = DatabaseManager(db_path)
+    db.sqlite = "connect"
+    db.execute_query(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}")
+    with _lock:
+        if db_path not in _initialized:
+            # Kept in the file, readers no longer block the writer
+            db.execute_query("PRAGMA journal_mode = WAL")
+            db.execute_query(
+                """
+                CREATE TABLE IF NOT EXISTS analysis (
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (path, size, mtime_ns, fingerprint, name)
+                )
+                """
+            )
+            db.execute_query(
+                "CREATE INDEX IF NOT EXISTS analysis_lru ON analysis (last_access)"
+            )
+            db.execute_query(
+                """
+                CREATE TABLE IF NOT EXISTS validity (
+                    path TEXT NOT NULL,
+                    check_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    valid INTEGER NOT NULL,
+                    PRIMARY KEY (path, check_name)
+                )
+                """
+            )
+            _initialized.add(db_path)
+    return db
+
+
+def load(input_file: Path, name: str, db_path: Path | None = None) -> bytes | None:
+    """Return the cached value of `name` for `input_file` or None."""
+    if not enabled:
+        return None
+    db_path = db_path or CACHE_PATH
+    try:
+        identity: FileIdentity = file_identity(input_file)
+        db = _connect(db_path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Analysis cache unavailable for {input_file.name}: {e}")
+        return None
+    try:
+        where = "path = ? AND size = ? AND mtime_ns = ? AND fingerprint = ? AND name = ?"
+        rows = db.execute_query(
+            f"SELECT value FROM analysis WHERE {where}", (*identity, name)
+        )
+        if not rows:
+            return None
+        with _write_lock:
+            db.execute_query(
+                f"UPDATE analysis SET last_access = ? WHERE {where}",
+                (time.time(), *identity, name),
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to read cached {name} of {input_file.name}: {e}")
+        return None
+    finally:
+        db.sqlite = "close"
+    logger.info(f"Analysis cache hit: {input_file.name} {name}")
+    return rows[0][0]
+
+
+def store(
+    input_file: Path,
+    name: str,
+    value: bytes,
+    db_path: Path | None = None,
+    max_bytes: int | None = None,
+) -> None:
+    """Store `value` as `name` for `input_file` and evict LRU entries over budget."""
+    if not enabled:
+        return
+    db_path = db_path or CACHE_PATH
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    try:
+        identity: FileIdentity = file_identity(input_file)
+        db = _connect(db_path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Analysis cache unavailable for {input_file.name}: {e}")
+        return
+    try:
+        with _write_lock:
+            # Drop entries of older versions of the same file
+            db.execute_query(
+                "DELETE FROM analysis WHERE path = ? AND name = ? AND (size != ? OR mtime_ns != ? OR fingerprint != ?)",
+                (identity[0], name, *identity[1:]),
+            )
+            db.write_db(
+                "analysis",
+                [
+                    "path",
+                    "size",
+                    "mtime_ns",
+                    "fingerprint",
+                    "name",
+                    "value",
+                    "nbytes",
+                    "last_access",
+                ],
+                [[*identity, name, value, len(value), time.time()]],
+            )
+            _evict(db, max_bytes)
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to cache {name} of {input_file.name}: {e}")
+    finally:
+        db.sqlite = "close"
+
+
+def _evict(db: DatabaseManager, max_bytes: int) -> None:
+    total: int = db.execute_query("SELECT COALESCE(SUM(nbytes), 0) FROM analysis")[0][0]
+    if total <= max_bytes:
+        return
+    rows = db.execute_query(
+        "SELECT rowid, nbytes FROM analysis ORDER BY last_access ASC"
+    )
+    evicted: list[tuple[int]] = []
+    for rowid, nbytes in rows:
+        if total <= max_bytes:
+            break
+        evicted.append((rowid,))
+        total -= nbytes
+    db.execute_many("DELETE FROM analysis WHERE rowid = ?", evicted)
+    logger.info(f"Analysis cache evicted {len(evicted)} entries")
+
+
+def load_json(input_file: Path, name: str, db_path: Path | None = None) -> Any:
+    value: bytes | None = load(input_file, name, db_path)
+    return None if value is None else json.loads(value)
+
+
+def store_json(
+    input_file: Path, name: str, value: Any, db_path: Path | None = None
+) -> None:
+    store(input_file, name, json.dumps(value).encode("utf-8"), db_path)
+
+
+def _stat_identities(input_files: Sequence[Path]) -> dict[Path, tuple[str, int, int]]:
+    identities: dict[Path, tuple[str, int, int]] = {}
+    for input_file in input_files:
+        try:
+            stat = input_file.stat()
+        except OSError:
+            continue
+        identities[input_file] = (
+            str(input_file.resolve()),
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+    return identities
+
+
+def load_validity(
+    input_files: Sequence[Path], check: str, db_path: Path | None = None
+) -> dict[Path, bool]:
+    """Cached validity of the files unchanged since they were checked."""
+    if not enabled or not input_files:
+        return {}
+    identities = _stat_identities(input_files)
+    by_path: dict[str, list[Path]] = {}
+    for input_file, identity in identities.items():
+        by_path.setdefault(identity[0], []).append(input_file)
+    paths: list[str] = list(by_path)
+    try:
+        db = _connect(db_path or CACHE_PATH)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Analysis cache unavailable for validity: {e}")
+        return {}
+    validity: dict[Path, bool] = {}
+    try:
+        for i in range(0, len(paths), QUERY_CHUNK):
+            chunk: list[str] = paths[i : i + QUERY_CHUNK]
+            rows = db.execute_query(
+                "SELECT path, size, mtime_ns, valid FROM validity"
+                f" WHERE check_name = ? AND path IN ({','.join('?' * len(chunk))})",
+                (check, *chunk),
+            )
+            for path, size, mtime_ns, valid in rows:
+                for input_file in by_path[path]:
+                    if identities[input_file] == (path, size, mtime_ns):
+                        validity[input_file] = bool(valid)
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to read cached validity: {e}")
+        return {}
+    finally:
+        db.sqlite = "close"
+    logger.info(f"Analysis cache hit: {len(validity)}/{len(input_files)} {check} validity")
+    return validity
+
+
+def store_validity(
+    validity: Mapping[Path, bool], check: str, db_path: Path | None = None
+) -> None:
+    """Store the validity of the files, replacing older versions of them."""
+    if not enabled or not validity:
+        return
+    identities = _stat_identities(list(validity))
+    try:
+        db = _connect(db_path or CACHE_PATH)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Analysis cache unavailable for validity: {e}")
+        return
+    try:
+        with _write_lock:
+            db.write_db(
+                "validity",
+                ["path", "check_name", "size", "mtime_ns", "valid"],
+                [
+                    [path, check, size, mtime_ns, int(validity[input_file])]
+                    for input_file, (path, size, mtime_ns) in identities.items()
+                ],
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to cache validity: {e}")
+    finally:
+        db.sqlite = "close"
+
+
+def clear(db_path: Path | None = None) -> None:
+    db = _connect(db_path or CACHE_PATH)
+    try:
+        with _write_lock:
+            db.execute_query("DELETE FROM analysis")
+            db.execute_query("DELETE FROM validity")
+    finally:
+        db.sqlite = "close"
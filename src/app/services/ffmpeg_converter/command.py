@@ -0,0 +1,99 @@
+"""argv builder for ffmpeg and ffprobe.
+
+An `FFmpegCommand` keeps global options, inputs and outputs apart and renders
+them as one argv list, so nothing goes through a shell and no value is ever
+quoted. Option names carry their stream specifiers ("c:v", "b:a:0"), a
+sequence value repeats the option ("map": ["0:v", "1:a"]) and "" is a bare
+flag.
+"""
+
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Self
+
+type OptionValue = str | int | float | Path | Sequence[str | int | float | Path]
+type Options = Mapping[str, OptionValue]
+
+
+def option_args(options: Options | None = None) -> list[str]:
+    """`-name value` pairs of options in order."""
+    args: list[str] = []
+    for name, value in (options or {}).items():
+        values = (
+            value if isinstance(value, Sequence) and not isinstance(value, str) else [value]
+        )
+        for value in values:
+            args.append(f"-{name}")
+            if value != "":
+                args.append(str(value))
+    return args
+
+
+class FFmpegCommand:
+    def __init__(self, program: str = "ffmpeg", **global_options: OptionValue) -> None:
+        self.program: str = program
+        self.global_options: dict[str, OptionValue] = dict(global_options)
+        self.inputs: list[tuple[dict[str, OptionValue], str | Path]] = []
+        self.outputs: list[tuple[dict[str, OptionValue], str | Path]] = []
+
+    @classmethod
+    def from_kwargs(
+        cls, kwargs: Options, program: str = "ffmpeg", **global_options: OptionValue
+    ) -> "FFmpegCommand":
+        """Read the ordered option dicts used across ffmpeg_converter.
+
+        Options collect until "i" closes an input or "y" / "" close an output,
+        "y" also sets overwrite and "" writes to "-". Options left after the
+        last output are global.
+        """
+        command = cls(program, **global_options)
+        pending: dict[str, OptionValue] = {}
+        for name, value in kwargs.items():
+            if name == "i":
+                command.input(value, pending)  # type: ignore
+            elif name == "y":
+                command.global_options["y"] = ""
+                command.output(value, pending)  # type: ignore
+            elif name == "":
+                command.output("-", pending)
+            else:
+                pending[name] = value
+                continue
+            pending = {}
+        command.global_options |= pending
+        return command
+
+    def input(
+        self, file: str | Path, options: Options | None = None, **kwargs: OptionValue
+    ) -> Self:
+        self.inputs.append((dict(options or {}) | kwargs, file))
+        return self
+
+    def output(
+        self, file: str | Path, options: Options | None = None, **kwargs: OptionValue
+    ) -> Self:
+        self.outputs.append((dict(options or {}) | kwargs, file))
+        return self
+
+    def filter_complex(self, graph: str | Path, script: bool = False) -> Self:
+        """Set the complex filter graph, from a file if `script`."""
+        self.global_options["filter_complex_script" if script else "filter_complex"] = graph
+        return self
+
+    def set_default(self, name: str, value: OptionValue) -> Self:
+        """Give every output without `name` the option."""
+        for options, _ in self.outputs:
+            options.setdefault(name, value)
+        return self
+
+    @property
+    def argv(self) -> list[str]:
+        argv: list[str] = [self.program, *option_args(self.global_options)]
+        for options, file in self.inputs:
+            argv += [*option_args(options), "-i", str(file)]
+        for options, file in self.outputs:
+            argv += [*option_args(options), str(file)]
+        return argv
+
+    def __repr__(self) -> str:
+        return f"FFmpegCommand({self.argv!r})"
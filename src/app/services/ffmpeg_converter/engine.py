@@ -0,0 +1,458 @@
+"""Asynchronous ffmpeg/ffprobe execution.
+
+Every command of the package runs on an asyncio subprocess through `run_async`
+or `iter_lines_async`. `run` and `iter_lines` are the blocking facades used by
+the converter functions: they drive a private event loop in the calling thread,
+so they work from any worker thread and keep that thread's scheduler slot. A
+thread that already runs a loop (the Textual app) gets the private loop on a
+helper thread instead and waits for it.
+
+A `CancelToken` kills the child of every command started under it, a progress
+callback receives the `-progress pipe:1` blocks of ffmpeg as `ProgressEvent`s.
+Both are looked up in context variables, so they reach every command of a job,
+including the tasks `_run_in_order` spreads over worker threads.
+"""
+
+from collections.abc import (
+    AsyncGenerator,
+    Callable,
+    Coroutine,
+    Generator,
+    Iterable,
+    Iterator,
+)
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import concurrent.futures
+import contextvars
+from functools import partial
+from pathlib import Path
+from typing import Any
+import asyncio
+import re
+import subprocess
+import threading
+from app.common import tracing
+from .types import ProgressEvent
+
+# Longest line read from a child, showinfo and ffprobe lines stay far below
+LINE_LIMIT: int = 1024 * 1024
+# Bytes read from a pipe at once, their complete lines travel as one batch
+CHUNK_BYTES: int = 64 * 1024
+
+type ProgressCallback = Callable[[ProgressEvent], None]
+
+# Keys of the `-progress` blocks of ffmpeg
+PROGRESS_KEYS: frozenset[str] = frozenset(
+    (
+        "frame",
+        "fps",
+        "bitrate",
+        "total_size",
+        "out_time_us",
+        "out_time_ms",
+        "out_time",
+        "dup_frames",
+        "drop_frames",
+        "speed",
+        "progress",
+    )
+)
+_STREAM_QUALITY_KEY = re.compile(r"stream_\d+_\d+_q")
+
+
+class FFmpegCancelled(Exception):
+    """The command was killed through its CancelToken."""
+
+
+class CancelToken:
+    """Thread safe cancel flag, cancelling kills the running commands of the job."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cancelled: bool = False
+        self._callbacks: list[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call `callback` on cancel, right away if already cancelled.
+
+        Returns:
+            Callable[[], None]: removes the callback again
+        """
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return partial(self._remove_callback, callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled:
+            raise FFmpegCancelled("Job cancelled")
+
+
+current_cancel: ContextVar[CancelToken | None] = ContextVar(
+    "current_cancel", default=None
+)
+current_progress: ContextVar[ProgressCallback | None] = ContextVar(
+    "current_progress", default=None
+)
+
+
+@contextmanager
+def cancellation(token: CancelToken | None = None) -> Iterator[CancelToken]:
+    """Run the commands started in this context under `token`, a new one if None."""
+    token = token or CancelToken()
+    reset = current_cancel.set(token)
+    try:
+        yield token
+    finally:
+        current_cancel.reset(reset)
+
+
+@contextmanager
+def on_progress(callback: ProgressCallback) -> Iterator[None]:
+    """Send the progress of the ffmpeg runs started in this context to `callback`."""
+    reset = current_progress.set(callback)
+    try:
+        yield
+    finally:
+        current_progress.reset(reset)
+
+
+def _to_float(value: str | None) -> float | None:
+    try:
+        return float(value)  # type: ignore
+    except (TypeError, ValueError):
+        return None
+
+
+def _fold_progress_line(fields: dict[str, str], line: str) -> ProgressEvent | None:
+    """Collect one `key=value` line, return the event once its block is complete."""
+    key, _, value = line.strip().partition("=")
+    if key != "progress":
+        fields[key] = value
+        return None
+    event: ProgressEvent = {
+        "frame": int(_to_float(fields.get("frame")) or 0),
+        "fps": _to_float(fields.get("fps")),
+        "out_time": max((_to_float(fields.get("out_time_us")) or 0.0) / 1e6, 0.0),
+        "speed": _to_float(fields.get("speed", "").rstrip("x")),
+        "done": value == "end",
+    }
+    fields.clear()
+    return event
+
+
+def parse_progress(lines: Iterable[str]) -> Generator[ProgressEvent, None, None]:
+    """Turn the output of `-progress` into one event per block."""
+    fields: dict[str, str] = {}
+    for line in lines:
+        if (event := _fold_progress_line(fields, line)) is not None:
+            yield event
+
+
+def _is_progress_line(line: str) -> bool:
+    key, equals, _ = line.strip().partition("=")
+    return bool(equals) and (
+        key in PROGRESS_KEYS or _STREAM_QUALITY_KEY.fullmatch(key) is not None
+    )
+
+
+def route_progress(
+    lines: Iterable[tuple[int, str]], progress: ProgressCallback
+) -> Generator[str, None, None]:
+    """Send the `-progress pipe:1` blocks on stdout to `progress`, yield the other lines.
+
+    Filters printing to stdout (ametadata with file=-) share the pipe, only the
+    `-progress` keys are taken out.
+    """
+    fields: dict[str, str] = {}
+    for fd, line in lines:
+        if fd != 1 or not _is_progress_line(line):
+            yield line
+        elif (event := _fold_progress_line(fields, line)) is not None:
+            progress(event)
+
+
+async def _spawn(
+    argv: Iterable[Any], stdout: int | None, stderr: int | None
+) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        *map(str, argv),
+        stdin=subprocess.DEVNULL,
+        stdout=stdout,
+        stderr=stderr,
+        limit=LINE_LIMIT,
+    )
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+@asynccontextmanager
+async def _supervise(
+    process: asyncio.subprocess.Process, cancel: CancelToken | None, argv: list[str]
+) -> AsyncGenerator[None, None]:
+    """Kill the child on cancel, on task cancellation and when the caller fails.
+
+    The life of the child is traced as a span with its exit code.
+    """
+    loop = asyncio.get_running_loop()
+
+    def kill_from_any_thread() -> None:
+        try:
+            loop.call_soon_threadsafe(_kill, process)
+        except RuntimeError:
+            # The loop is already closed, so is the process
+            pass
+
+    remove = cancel.add_callback(kill_from_any_thread) if cancel else lambda: None
+    with tracing.span(Path(argv[0]).name, "subprocess") as span:
+        try:
+            yield
+        except BaseException:
+            _kill(process)
+            raise
+        finally:
+            try:
+                await process.wait()
+            finally:
+                remove()
+                span.set(command=argv, pid=process.pid, exit_code=process.returncode)
+
+
+def _check_returncode(
+    argv: list[str],
+    returncode: int | None,
+    cancel: CancelToken | None,
+    stdout: str | None = None,
+    stderr: str | None = None,
+) -> None:
+    if cancel is not None and cancel.cancelled:
+        raise FFmpegCancelled(f"Cancelled {argv[0]}")
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, argv, stdout, stderr)
+
+
+async def run_async(
+    argv: Iterable[Any],
+    capture: bool = False,
+    progress: ProgressCallback | None = None,
+    cancel: CancelToken | None = None,
+) -> str:
+    """Run a command to completion.
+
+    Args:
+        capture (bool, optional): capture stdout and stderr instead of inheriting them.
+        progress (ProgressCallback | None, optional): parse stdout as `-progress`
+            output, the caller adds `-progress pipe:1`.
+        cancel (CancelToken | None, optional): Defaults to current_cancel.
+
+    Raises:
+        FFmpegCancelled: the token was cancelled
+        subprocess.CalledProcessError: non zero exit
+
+    Returns:
+        str: stdout if captured
+    """
+    argv = [str(arg) for arg in argv]
+    cancel = cancel or current_cancel.get()
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    process = await _spawn(
+        argv,
+        subprocess.PIPE if capture or progress else None,
+        subprocess.PIPE if capture else None,
+    )
+
+    async def read_stdout() -> str:
+        if process.stdout is None:
+            return ""
+        if progress is None:
+            return (await process.stdout.read()).decode("utf-8", "replace")
+        fields: dict[str, str] = {}
+        async for line in process.stdout:
+            event = _fold_progress_line(fields, line.decode("utf-8", "replace"))
+            if event is not None:
+                progress(event)
+        return ""
+
+    async def read_stderr() -> str:
+        if process.stderr is None:
+            return ""
+        return (await process.stderr.read()).decode("utf-8", "replace")
+
+    async with _supervise(process, cancel, argv):
+        stdout, stderr = await asyncio.gather(read_stdout(), read_stderr())
+        await process.wait()
+    _check_returncode(argv, process.returncode, cancel, stdout, stderr)
+    return stdout
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8", "replace").rstrip("\r")
+
+
+async def _iter_line_batches(
+    argv: Iterable[Any], cancel: CancelToken | None = None, queue_size: int = 16
+) -> AsyncGenerator[list[tuple[int, str]], None]:
+    """Run a command and yield the (fd, line) it writes, a pipe chunk at a time.
+
+    Lines of one batch come from one read of at most CHUNK_BYTES, so batches
+    keep the order of each pipe. At most `queue_size` batches wait for the
+    consumer, the child blocks on its pipes beyond that.
+    """
+    argv = [str(arg) for arg in argv]
+    cancel = cancel or current_cancel.get()
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    process = await _spawn(argv, subprocess.PIPE, subprocess.PIPE)
+    batches: asyncio.Queue[list[tuple[int, str]] | None] = asyncio.Queue(
+        maxsize=queue_size
+    )
+
+    async def pump(stream: asyncio.StreamReader, fd: int) -> None:
+        pending: bytes = b""
+        while chunk := await stream.read(CHUNK_BYTES):
+            *complete, pending = (pending + chunk).split(b"\n")
+            if complete:
+                await batches.put([(fd, _decode(line)) for line in complete])
+        if pending:
+            await batches.put([(fd, _decode(pending))])
+        await batches.put(None)
+
+    async with _supervise(process, cancel, argv):
+        pumps: list[asyncio.Task] = [
+            asyncio.create_task(pump(stream, fd))  # type: ignore
+            for fd, stream in ((1, process.stdout), (2, process.stderr))
+        ]
+        try:
+            open_pipes: int = 2
+            while open_pipes:
+                batch = await batches.get()
+                if batch is None:
+                    open_pipes -= 1
+                    continue
+                yield batch
+            await process.wait()
+        finally:
+            for task in pumps:
+                task.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+    _check_returncode(argv, process.returncode, cancel)
+
+
+async def iter_lines_async(
+    argv: Iterable[Any], cancel: CancelToken | None = None, queue_size: int = 16
+) -> AsyncGenerator[tuple[int, str], None]:
+    """Run a command and yield (fd, line) of stdout (1) and stderr (2) as they arrive.
+
+    The pipes are drained into a bounded queue of line batches, so memory stays
+    constant whatever the length of the output. The child is killed if the
+    consumer stops early.
+
+    Raises:
+        FFmpegCancelled: the token was cancelled
+        subprocess.CalledProcessError: non zero exit
+    """
+    batches = _iter_line_batches(argv, cancel, queue_size)
+    try:
+        async for batch in batches:
+            for line in batch:
+                yield line
+    finally:
+        await batches.aclose()
+
+
+@contextmanager
+def _blocking_runner[T]() -> Iterator[Callable[[Coroutine[Any, Any, T]], T]]:
+    """Run coroutines to completion on a private loop, in the caller's context.
+
+    From a thread that runs an event loop already, the private loop lives on a
+    helper thread and the caller blocks until each coroutine is done.
+    """
+    context = contextvars.copy_context()
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        with asyncio.Runner() as runner:
+            yield partial(runner.run, context=context)
+        return
+    runner = asyncio.Runner()
+    with concurrent.futures.ThreadPoolExecutor(1, "ffmpeg_engine") as executor:
+        try:
+            yield lambda coroutine: executor.submit(
+                partial(runner.run, coroutine, context=context)
+            ).result()
+        finally:
+            executor.submit(runner.close).result()
+
+
+def run(
+    argv: Iterable[Any],
+    capture: bool = False,
+    progress: ProgressCallback | None = None,
+    cancel: CancelToken | None = None,
+) -> str:
+    """Blocking `run_async`."""
+    with _blocking_runner() as run_coroutine:
+        return run_coroutine(run_async(argv, capture, progress, cancel))
+
+
+async def _next[T](lines: AsyncGenerator[T, None]) -> T:
+    return await anext(lines)
+
+
+def iter_line_batches(
+    argv: Iterable[Any], cancel: CancelToken | None = None, queue_size: int = 16
+) -> Generator[list[tuple[int, str]], None, None]:
+    """Blocking `_iter_line_batches`, the child waits while the consumer is busy.
+
+    The private loop only runs while the next batch is fetched.
+    """
+    with _blocking_runner() as run_coroutine:
+        batches = _iter_line_batches(argv, cancel, queue_size)
+        try:
+            while True:
+                try:
+                    yield run_coroutine(_next(batches))
+                except StopAsyncIteration:
+                    return
+        finally:
+            run_coroutine(batches.aclose())
+
+
+def iter_lines(
+    argv: Iterable[Any], cancel: CancelToken | None = None, queue_size: int = 16
+) -> Generator[tuple[int, str], None, None]:
+    """Blocking `iter_lines_async`, the child waits while the consumer is busy.
+
+    The private loop runs once per batch of lines, not once per line.
+    """
+    for batch in iter_line_batches(argv, cancel, queue_size):
+        yield from batch
@@ -3,18 +3,47 @@ from typing import Sequence, Mapping
 from pathlib import Path
 from enum import StrEnum, auto
 from collections import deque
-from collections.abc import Generator
+from collections.abc import Callable, Generator, Iterable
+from functools import partial
+from typing import Any, BinaryIO
 import re
-import subprocess
+import threading
 from enum import Enum
 import tempfile
 import time
 import os
 import concurrent.futures
+import contextvars
+import csv
 import json
+import shutil
+from array import array
 from decimal import Decimal, ROUND_CEILING
-from .types import EncodeKwargs, VideoSuffix
-from app.common import logger
+import numpy as np
+from .types import (
+    EncodeKwargs,
+    VideoSuffix,
+    MediaAnalysis,
+    StreamInfo,
+    AnalysisMode,
+    KeepOn,
+    ValidityCheck,
+    AnalysisProfile,
+    LoudnessEnvelope,
+    ExtractBackend,
+    JobPriority,
+    RerenderGraph,
+    EncodeProfile,
+    CalibrationResult,
+)
+from . import analysis_cache
+from .scheduler import scheduler
+from . import engine
+from .command import FFmpegCommand
+from .keyframe_index import KeyframeIndex
+from .intervals import Intervals
+from .job_manifest import Job, open_job, scratch_dir
+from app.common import constants, logger, tracing
 from itertools import chain
 
 
@@ -29,22 +58,133 @@ class _methods(StrEnum):
     PROBE_DURATION = auto()
     probe_is_valid_video = auto()
     probe_non_silence = auto()
+    ANALYZE_MEDIA = auto()
+    PROBE_LOUDNESS_ENVELOPE = auto()
+    PROBE_KEYFRAME_INDEX = auto()
     CUT_SILENCE = auto()
     CUT_SILENCE_RERENDER = auto()
+    CUT_SILENCE_SPEEDUP = auto()
+    CALIBRATE_PROFILE = auto()
+    RERENDER_SEGMENTS = auto()
+    PROBE_MOTION = auto()
+    PROBE_VALID_VIDEOS = auto()
+    PROBE_STREAMS = auto()
+
+
+# Spans of the probes and operations, see app.common.tracing
+_traced = tracing.traced("ffmpeg_converter")
+
+
+ENVELOPE_WINDOW: float = 0.05
+ENVELOPE_SAMPLE_RATE: int = 16000
+SEGMENT_TIME_DELTA: float = 0.05
+# Above this speedup frames are dropped by select, below it setpts/atempo are used
+SPEEDUP_METHOD_THRESHOLD: int = 4
+DEFAULT_EXTRACT_BACKEND: ExtractBackend = ExtractBackend.CONCAT
+SMART_CUT_TOLERANCE: float = 0.001
+# Codecs whose re-encoded edges can sit next to stream copied GOPs, and their
+# encoders. The concat demuxer puts the H.264 parameter sets of every file in
+# band (auto_convert inserts h264_mp4toannexb), so the edges and the copied GOPs
+# each keep their own SPS/PPS. Other video codecs would decode every part with
+# the extradata of the first file. AAC LC headers only depend on the sample
+# rate and channels, which the edges match.
+SMART_CUT_VIDEO_ENCODERS: dict[str, str] = {"h264": "libx264"}
+SMART_CUT_AUDIO_ENCODERS: dict[str, str] = {"aac": "aac"}
+SMART_CUT_FORMATS: tuple[str, ...] = ("mov", "matroska")
+_X264_PROFILES: dict[str, str] = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+# x264 settings giving the reorder delay (has_b_frames) of the source, so the
+# DTS of the edges continue the DTS of the copied GOPs
+_X264_REORDER_ARGS: dict[int, dict[str, Any]] = {
+    0: {"bf": 0},
+    1: {"bf": 1},
+    2: {"bf": 3, "b-pyramid": "normal"},
+}
+# Scene scores are taken between every n-th frame
+MOTION_STEP_FRAMES: int = 20
+# Decode settings of the scene analysis. Scene scores only compare sampled
+# frames, so the reduced profiles skip or shrink the rest, and decode on one
+# thread so that many files can be analysed side by side.
+ANALYSIS_PROFILES: dict[AnalysisProfile, dict[str, int | float | bool]] = {
+    AnalysisProfile.FULL: {},
+    AnalysisProfile.LOWRES: {"width": 160, "threads": 1},
+    AnalysisProfile.DECIMATED: {"width": 160, "fps": 2, "threads": 1},
+    AnalysisProfile.KEYFRAMES: {"width": 160, "keyframes_only": True, "threads": 1},
+}
+RERENDER_BATCH_SIZE: int = 32
+# Below this many intervals one between() chain beats spawning batches
+RERENDER_BETWEEN_MAX_INTERVALS: int = 500
+
+# CPU encoder settings, "threads" left out falls back to the scheduler's share
+ENCODE_PROFILES: dict[EncodeProfile, dict[str, str | int]] = {
+    EncodeProfile.ARCHIVE: {
+        "c:v": "libx265",
+        "preset": "slow",
+        "crf": 22,
+        "x265-params": "log-level=error",
+    },
+    EncodeProfile.FAST: {"c:v": "libx264", "preset": "veryfast", "crf": 23},
+    EncodeProfile.PREVIEW: {
+        "c:v": "libx264",
+        "preset": "ultrafast",
+        "crf": 30,
+        "tune": "fastdecode",
+        "threads": 2,
+    },
+}
+# Fastest first, shared by x264 and x265
+ENCODER_PRESETS: tuple[str, ...] = (
+    "ultrafast",
+    "superfast",
+    "veryfast",
+    "faster",
+    "fast",
+    "medium",
+    "slow",
+)
+CALIBRATION_SAMPLE_SECONDS: float = 10
+CALIBRATION_PATH: Path = constants.AppPaths.APP_DATA / "encode_calibration.json"
+
+
+def _with_threads(command: FFmpegCommand, threads: int) -> FFmpegCommand:
+    """Give `-threads` to every output unless the caller set it.
+
+    Stream copies have no encoder to give the threads to.
+    """
+    if "threads" in command.global_options:
+        return command
+    for options, _ in command.outputs:
+        if options.get("c:v", options.get("vcodec")) != "copy":
+            options.setdefault("threads", threads)
+    return command
+
+
+def _ffmpeg(priority: JobPriority | None = None, **kwargs):
+    _run_ffmpeg(FFmpegCommand.from_kwargs({"hwaccel": "auto"} | kwargs), priority)
 
 
-def _dic_to_ffmpeg_args(kwargs: dict | None = None) -> str:
-    if kwargs is None:
-        return ""
-    return " ".join((f'-{k} "{v}"') if v != "" else f"-{k}" for k, v in kwargs.items())
+def _run_ffmpeg(command: FFmpegCommand, priority: JobPriority | None = None) -> None:
+    command.global_options.setdefault("loglevel", "warning")
+    with scheduler.slot(priority) as threads:
+        _with_threads(command, threads)
+        progress = engine.current_progress.get()
+        if progress is not None:
+            command.global_options |= {"progress": "pipe:1", "nostats": ""}
+        logger.info(f"Executing FFmpeg with {command = }")
+        engine.run(command.argv, progress=progress)
 
 
-def _ffmpeg(**kwargs):
-    default_kwargs = {"loglevel": "warning"}
-    output_kwargs: dict = {"hwaccel": "auto"} | kwargs | default_kwargs
-    logger.info(f"Executing FFmpeg with {output_kwargs = }")
-    command = "ffmpeg " + _dic_to_ffmpeg_args(output_kwargs)
-    subprocess.run(command, check=True, encoding="utf-8")
+def _run_ffprobe(command: FFmpegCommand, capture: bool = True) -> str:
+    """Run ffprobe in a scheduler slot, like every ffmpeg run."""
+    with scheduler.slot():
+        return engine.run(command.argv, capture=capture)
 
 
 def _gen_filter(
@@ -64,10 +204,10 @@ def _ffprobe(**kwargs):
     default_kwargs = {}
     output_kwargs: dict = kwargs | default_kwargs
     logger.info(f"Executing ffprobe with {output_kwargs = }")
-    command = "ffprobe " + _dic_to_ffmpeg_args(output_kwargs)
-    subprocess.run(command, shell=True, check=True, encoding="utf-8")
+    _run_ffprobe(FFmpegCommand.from_kwargs(output_kwargs, "ffprobe"), capture=False)
 
 
+@_traced
 def probe_duration(input_file: Path, **othertags) -> float:  # command
     output_kwargs: dict = {
         "v": "error",
@@ -75,17 +215,26 @@ def probe_duration(input_file: Path, **othertags) -> float:  # command
         "of": "default=noprint_wrappers=1:nokey=1",
         "i": input_file,
     } | othertags
+    if not othertags:
+        cached: float | None = analysis_cache.load_json(
+            input_file, _methods.PROBE_DURATION
+        )
+        if cached is not None:
+            return cached
     logger.info(f"Probing {input_file.name} duration with {output_kwargs = }")
-    command = "ffprobe " + _dic_to_ffmpeg_args(output_kwargs)
-    result = subprocess.run(
-        command, capture_output=True, text=True, check=True, encoding="utf-8"
-    )
-    probe_duration = result.stdout.strip()
+    probe_duration = _run_ffprobe(
+        FFmpegCommand.from_kwargs(output_kwargs, "ffprobe")
+    ).strip()
     logger.info(f"{input_file.name} duration probed: {probe_duration}")
+    if not othertags:
+        analysis_cache.store_json(
+            input_file, _methods.PROBE_DURATION, float(probe_duration or 0)
+        )
 
     return float(probe_duration or 0)
 
 
+@_traced
 def probe_encoding(input_file: Path, **othertags) -> EncodeKwargs:  # command
     output_kwargs: dict = {
         "v": "error",
@@ -94,13 +243,19 @@ def probe_encoding(input_file: Path, **othertags) -> EncodeKwargs:  # command
         "show_streams": "",
         "i": input_file,
     } | othertags
+    if not othertags:
+        cached: EncodeKwargs | None = analysis_cache.load_json(
+            input_file, _methods.PROBE_ENCODING
+        )
+        if cached is not None:
+            return cached
     logger.info(f"Probing {input_file.name} encoding with {output_kwargs = }")
     # Probe the video file to get metadata
-    command = "ffprobe " + _dic_to_ffmpeg_args(output_kwargs)
-    result = subprocess.run(
-        command, capture_output=True, text=True, check=True, encoding="utf-8"
+    probe = json.loads(
+        _run_ffprobe(
+            FFmpegCommand.from_kwargs(output_kwargs, "ffprobe")
+        )
     )
-    probe = json.loads(result.stdout)
 
     # Initialize the dictionary with default values
     encoding_info: EncodeKwargs = {}
@@ -114,7 +269,10 @@ def probe_encoding(input_file: Path, **othertags) -> EncodeKwargs:  # command
             video_stream.get("time_base").split("/")[1]
         )
         encoding_info["vcodec"] = video_stream.get("codec_name")
-        encoding_info["video_bitrate"] = int(video_stream.get("bit_rate", 0))
+        # Matroska streams have no bit_rate, the container one is the closest
+        encoding_info["video_bitrate"] = int(
+            video_stream.get("bit_rate") or probe.get("format", {}).get("bit_rate") or 0
+        )
 
     # Extract audio stream information
     audio_stream = next(
@@ -129,10 +287,159 @@ def probe_encoding(input_file: Path, **othertags) -> EncodeKwargs:  # command
     encoding_info["f"] = format_info.get("format_name").split(",")[0]
     cleaned_None = {k: v for k, v in encoding_info.items() if v is not None and v != 0}
     logger.info(f"{input_file.name} probed: {cleaned_None}")
+    if not othertags:
+        analysis_cache.store_json(input_file, _methods.PROBE_ENCODING, cleaned_None)
 
     return cleaned_None  # type: ignore
 
 
+def _probe_streams(input_file: Path) -> dict[str, Any]:  # command
+    """The ffprobe streams and format of input_file, cached."""
+    cached: dict[str, Any] | None = analysis_cache.load_json(
+        input_file, _methods.PROBE_STREAMS
+    )
+    if cached is not None:
+        return cached
+    output_kwargs: dict = {
+        "v": "error",
+        "print_format": "json",
+        "show_format": "",
+        "show_streams": "",
+        "i": input_file,
+    }
+    logger.info(f"Probing {input_file.name} streams with {output_kwargs = }")
+    probe: dict[str, Any] = json.loads(
+        _run_ffprobe(
+            FFmpegCommand.from_kwargs(output_kwargs, "ffprobe")
+        )
+    )
+    analysis_cache.store_json(input_file, _methods.PROBE_STREAMS, probe)
+    return probe
+
+
+def _iter_process_lines(
+    command: list[str], queue_size: int = 16
+) -> Generator[tuple[int, str], None, None]:
+    """Run `command` and yield (fd, line) of stdout (1) and stderr (2) as they arrive.
+
+    Both pipes are drained into a bounded queue of line batches, so memory stays
+    constant whatever the length of the output. The process is killed if the
+    consumer stops early, a non zero exit raises CalledProcessError.
+    """
+    batches = engine.iter_line_batches(command, queue_size=queue_size)
+    try:
+        while True:
+            # The slot is only held while the child writes, a consumer that
+            # starts ffmpeg runs of its own waits for a slot like any caller
+            with scheduler.slot():
+                batch: list[tuple[int, str]] | None = next(batches, None)
+            if batch is None:
+                return
+            yield from batch
+    finally:
+        batches.close()
+
+
+_DURATION_PATTERN = re.compile(r"Duration: (.+?),")
+_STREAM_PATTERN = re.compile(
+    r"Stream #0:(\d+)[^:]*: (Video|Audio|Subtitle|Data): (\w+)"
+)
+_SILENCE_PATTERN = re.compile(
+    r"silence_(start|end): (-?[0-9.]+)(?:.*?silence_duration: ([0-9.]+))?"
+)
+_KEYFRAME_PATTERN = re.compile(
+    r"\[Parsed_showinfo[^\]]*\].*?pts_time:\s*(-?[0-9.]+).*?iskey:1"
+)
+_ENVELOPE_PEAK = "lavfi.astats.Overall.Peak_level="
+_ENVELOPE_RMS = "lavfi.astats.Overall.RMS_level="
+_SCENE_SCORE = "lavfi.scene_score="
+
+
+def _iter_media_events(
+    lines: Iterable[str],
+) -> Generator[tuple[str, Any], None, None]:
+    """Turn ffmpeg log lines into analysis events.
+
+    Yields:
+        tuple[str, Any]: ("duration", float), ("stream", StreamInfo),
+            ("silence_start" | "silence_end" | "silence_duration", float),
+            ("keyframe", float), ("envelope_start" | "peak" | "rms", float)
+    """
+    in_input: bool = True
+    duration_seen: bool = False
+    envelope_started: bool = False
+    for line in lines:
+        if line.startswith(_ENVELOPE_PEAK):
+            yield "peak", float(line[len(_ENVELOPE_PEAK) :])
+        elif line.startswith(_ENVELOPE_RMS):
+            yield "rms", float(line[len(_ENVELOPE_RMS) :])
+        elif line.startswith("frame:"):
+            if not envelope_started:
+                envelope_started = True
+                yield "envelope_start", max(float(line.rsplit("pts_time:", 1)[1]), 0.0)
+        elif match := _KEYFRAME_PATTERN.search(line):
+            yield "keyframe", float(match[1])
+        elif match := _SILENCE_PATTERN.search(line):
+            yield f"silence_{match[1]}", max(float(match[2]), 0.0)
+            if match[3]:
+                yield "silence_duration", float(match[3])
+        elif in_input:
+            if "Output #0" in line or "Stream mapping:" in line:
+                in_input = False
+            elif not duration_seen and (match := _DURATION_PATTERN.search(line)):
+                duration_seen = True
+                yield "duration", (
+                    0.0
+                    if match[1] == "N/A"
+                    else _convert_timestamp_to_seconds(match[1])
+                )
+            elif match := _STREAM_PATTERN.search(line):
+                yield "stream", {
+                    "index": int(match[1]),
+                    "codec_type": match[2].lower(),
+                    "codec_name": match[3],
+                }
+
+
+def _iter_ffmpeg_events(command: list[str]) -> Generator[tuple[str, Any], None, None]:
+    progress = engine.current_progress.get()
+    if progress is None:
+        return _iter_media_events(line for _, line in _iter_process_lines(command))
+    # Envelope levels share stdout with the progress blocks, route_progress keeps them
+    return _iter_media_events(
+        engine.route_progress(
+            _iter_process_lines([command[0], "-progress", "pipe:1", *command[1:]]),
+            progress,
+        )
+    )
+
+
+def _collect_non_silence(
+    events: Iterable[tuple[str, Any]], total_duration: float = 0.0
+) -> tuple[deque[float], float, float]:
+    """Fold silence events into flat non silence segments.
+
+    Returns:
+        tuple[deque[float], float, float]: (non_silence_segs, total_duration, total_silence_duration)
+    """
+    non_silence_segs: deque[float] = deque([0.0])
+    total_silence_duration: float = 0.0
+    for event, value in events:
+        if event == "duration":
+            total_duration = value
+        elif event in ("silence_start", "silence_end"):
+            non_silence_segs.append(value)
+        elif event == "silence_duration":
+            total_silence_duration += value
+    # A silence lasting until EOF has no silence_end
+    if len(non_silence_segs) % 2 == 0:
+        non_silence_segs.append(total_duration)
+    # Handle silence start and end to represent non silence
+    non_silence_segs.append(total_duration)
+    return (non_silence_segs, total_duration, total_silence_duration)
+
+
+@_traced
 def probe_non_silence(  # command
     input_file: Path, dB: int = -35, sl_duration: float = 1, **othertags
 ) -> tuple[Sequence[float], float, float]:
@@ -162,42 +469,606 @@ def probe_non_silence(  # command
         f"Detecting silences of {input_file.name} by {dB = } and {output_kwargs = }"
     )
 
-    command = "ffmpeg " + _dic_to_ffmpeg_args(output_kwargs)
-    result = subprocess.run(
-        command, capture_output=True, text=True, check=True, encoding="utf-8"
+    command = FFmpegCommand.from_kwargs(output_kwargs, nostats="").argv
+
+    return _collect_non_silence(_iter_ffmpeg_events(command))
+
+
+def iter_silences(  # command
+    input_file: Path, dB: int = -35, sl_duration: float = 1, **othertags
+) -> Generator[tuple[float, float], None, None]:
+    """Yield (silence_start, silence_end) pairs while ffmpeg is still decoding."""
+    output_kwargs: dict = (
+        {
+            "i": input_file,
+            "af": f"silencedetect=n={dB}dB:d={sl_duration}",
+            "vn": "",
+            "f": "null",
+        }
+        | othertags
+        | {"": ""}
     )
-    output = result.stdout + result.stderr
+    logger.info(f"Streaming silences of {input_file.name} with {output_kwargs = }")
+    command = FFmpegCommand.from_kwargs(output_kwargs, nostats="").argv
+
+    total_duration: float = 0.0
+    silence_start: float | None = None
+    for event, value in _iter_ffmpeg_events(command):
+        if event == "duration":
+            total_duration = value
+        elif event == "silence_start":
+            silence_start = value
+        elif event == "silence_end" and silence_start is not None:
+            yield (silence_start, value)
+            silence_start = None
+    if silence_start is not None:
+        yield (silence_start, total_duration)
+
+
+def _parse_silencedetect(
+    output: str, total_duration: float
+) -> tuple[deque[float], float]:
+    """Parse silencedetect logs into flat non silence segments.
 
-    # Total duration
-    total_duration_pattern = r"Duration: (.+?),"
-    total_duration_match: str | None = re.findall(total_duration_pattern, output)[0]
-    total_duration: float = _convert_timestamp_to_seconds(
-        total_duration_match if total_duration_match else "0.0"
+    Returns:
+        tuple[deque[float], float]: (non_silence_segs, total_silence_duration)
+    """
+    non_silence_segs, _, total_silence_duration = _collect_non_silence(
+        _iter_media_events(output.splitlines()), total_duration
     )
+    return (non_silence_segs, total_silence_duration)
+
 
-    # Regular expression to find all floats after "silence_start or end: "
-    silence_seg_pattern = r"silence_(?:start|end): ([0-9.]+)"
-    # Find all matches in the log data
-    silence_seg_matches: list[str] = re.findall(silence_seg_pattern, output)
-    # Convert matches to a list of floats
-    non_silence_segs: deque[float] = deque(
-        float(match) for match in silence_seg_matches
+def _create_envelope_filter(window: float = ENVELOPE_WINDOW) -> str:
+    nsamples: int = max(1, round(ENVELOPE_SAMPLE_RATE * window))
+    return (
+        f"aresample={ENVELOPE_SAMPLE_RATE},asetnsamples=n={nsamples}:p=0,"
+        "astats=metadata=1:reset=1:measure_perchannel=none:measure_overall=Peak_level+RMS_level,"
+        "ametadata=mode=print:file=-"
     )
-    # Handle silence start and end to represent non silence
-    non_silence_segs.appendleft(0.0)
+
+
+def _envelope_cache_name(window: float) -> str:
+    return f"{_methods.PROBE_LOUDNESS_ENVELOPE}={window}"
+
+
+def load_loudness_envelope(
+    input_file: Path, window: float = ENVELOPE_WINDOW
+) -> LoudnessEnvelope | None:
+    """Return the cached loudness envelope of `input_file` without decoding."""
+    name: str = _envelope_cache_name(window)
+    meta: dict | None = analysis_cache.load_json(input_file, name)
+    levels: bytes | None = analysis_cache.load(input_file, name + ":levels")
+    if meta is None or levels is None:
+        return None
+    peak: array = array("f")
+    peak.frombytes(levels[: meta["count"] * peak.itemsize])
+    rms: array = array("f")
+    rms.frombytes(levels[meta["count"] * rms.itemsize :])
+    return {
+        "window": window,
+        "start": meta["start"],
+        "total_duration": meta["total_duration"],
+        "peak": peak,
+        "rms": rms,
+    }
+
+
+def _store_loudness_envelope(
+    input_file: Path, envelope: LoudnessEnvelope, has_audio: bool
+) -> None:
+    if has_audio and not envelope["peak"]:
+        # Lost levels, cached they would turn off silence cutting of the file for good
+        logger.warning(f"Not caching the empty loudness envelope of {input_file.name}")
+        return
+    name: str = _envelope_cache_name(envelope["window"])
+    analysis_cache.store_json(
+        input_file,
+        name,
+        {
+            "start": envelope["start"],
+            "total_duration": envelope["total_duration"],
+            "count": len(envelope["peak"]),
+        },
+    )
+    analysis_cache.store(
+        input_file,
+        name + ":levels",
+        envelope["peak"].tobytes() + envelope["rms"].tobytes(),
+    )
+
+
+@_traced
+def probe_loudness_envelope(  # command
+    input_file: Path,
+    window: float = ENVELOPE_WINDOW,
+    use_cache: bool = True,
+    **othertags,
+) -> LoudnessEnvelope:
+    """Extract per window peak and RMS levels of the audio in one decode.
+
+    The envelope does not depend on any silence threshold, see
+    `non_silence_from_envelope` to evaluate a (dB, sl_duration) pair on it.
+    """
+    use_cache = use_cache and not othertags
+    if use_cache:
+        envelope: LoudnessEnvelope | None = load_loudness_envelope(input_file, window)
+        if envelope is not None:
+            return envelope
+
+    output_kwargs: dict = (
+        {
+            "i": input_file,
+            "vn": "",
+            "af": _create_envelope_filter(window),
+            "f": "null",
+        }
+        | othertags
+        | {"": ""}
+    )
+    logger.info(
+        f"{_methods.PROBE_LOUDNESS_ENVELOPE} {input_file.name} with {output_kwargs = }"
+    )
+    command = FFmpegCommand.from_kwargs(output_kwargs, nostats="").argv
+    envelope = _new_envelope(window)
+    has_audio: bool = False
+    for event, value in _iter_ffmpeg_events(command):
+        _fold_envelope_event(envelope, event, value)
+        if event == "stream" and value["codec_type"] == "audio":
+            has_audio = True
+    if use_cache:
+        _store_loudness_envelope(input_file, envelope, has_audio)
+
+    return envelope
+
+
+def _new_envelope(window: float = ENVELOPE_WINDOW) -> LoudnessEnvelope:
+    return {
+        "window": window,
+        "start": 0.0,
+        "total_duration": 0.0,
+        "peak": array("f"),
+        "rms": array("f"),
+    }
+
+
+def _fold_envelope_event(envelope: LoudnessEnvelope, event: str, value: Any) -> None:
+    match event:
+        case "peak":
+            envelope["peak"].append(value)
+        case "rms":
+            envelope["rms"].append(value)
+        case "envelope_start":
+            envelope["start"] = value
+        case "duration":
+            envelope["total_duration"] = value
+
+
+def non_silence_from_envelope(
+    envelope: LoudnessEnvelope, dB: float = -35, sl_duration: float = 1
+) -> tuple[Sequence[float], float, float]:
+    """Vectorized silencedetect over a loudness envelope.
+
+    A window is silent when its peak level is below `dB`, silences are runs of
+    silent windows lasting at least `sl_duration`.
+
+    Returns:
+        tuple[Sequence[float], float, float]: (non_silence_segs, total_duration, total_silence_duration)
+    """
+    total_duration: float = envelope["total_duration"]
+    peak = np.frombuffer(envelope["peak"], dtype=np.float32)
+    silent = np.concatenate(([0], (peak < float(dB)).astype(np.int8), [0]))
+    edges = np.diff(silent)
+    window: float = envelope["window"]
+    starts = envelope["start"] + np.flatnonzero(edges == 1) * window
+    ends = np.minimum(
+        envelope["start"] + np.flatnonzero(edges == -1) * window, total_duration
+    )
+    keep = (ends - starts) >= sl_duration
+    starts, ends = starts[keep], ends[keep]
+
+    non_silence_segs: list[float] = [0.0]
+    non_silence_segs.extend(np.column_stack((starts, ends)).ravel().tolist())
     non_silence_segs.append(total_duration)
 
-    # Regular expression to find all floats after silence_duration: "
-    silence_duration_pattern = r"silence_duration: ([0-9.]+)"
-    silence_duration_matches: list[str] | Generator[float] = re.findall(
-        silence_duration_pattern, output
+    return (non_silence_segs, total_duration, float(np.sum(ends - starts)))
+
+
+def _motion_cache_name(step_frames: int, profile: AnalysisProfile) -> str:
+    name: str = f"{_methods.PROBE_MOTION}={step_frames}"
+    return name if profile == AnalysisProfile.FULL else f"{name}:{profile}"
+
+
+def _analysis_decode_args(
+    profile: AnalysisProfile | str, step_frames: int = MOTION_STEP_FRAMES
+) -> tuple[dict[str, str | int], list[str]]:
+    """Input options and the filters picking and shrinking the analysed frames.
+
+    Without fps decimation or keyframe-only decoding every `step_frames`-th
+    frame is picked.
+    """
+    settings = ANALYSIS_PROFILES[AnalysisProfile(profile)]
+    input_options: dict[str, str | int] = {"hwaccel": "auto"}
+    filters: list[str] = []
+    if settings.get("keyframes_only"):
+        input_options["skip_frame:v"] = "nokey"
+    elif settings.get("fps"):
+        filters.append(f"fps={settings['fps']}")
+    else:
+        filters.append(f"select='not(mod(n,{step_frames}))'")
+    if settings.get("width"):
+        filters.append(f"scale={settings['width']}:-2:flags=fast_bilinear")
+    if settings.get("threads"):
+        input_options["threads"] = settings["threads"]  # type: ignore
+    return input_options, filters
+
+
+def _iter_scene_scores(  # command
+    input_file: Path,
+    step_frames: int = MOTION_STEP_FRAMES,
+    profile: AnalysisProfile = AnalysisProfile.FULL,
+    **othertags,
+) -> Generator[tuple[str, float], None, None]:
+    """Stream ("duration", seconds), then ("time", pts_time) and ("score", scene_score)
+    for each sampled frame.
+
+    Every sampled frame gets a scene score against the previous sampled one,
+    `metadata=print` writes them to stdout while ffmpeg logs to stderr.
+    """
+    input_options, filters = _analysis_decode_args(profile, step_frames)
+    output_kwargs: dict = (
+        input_options
+        | {
+            "i": input_file,
+            "vf": ",".join(
+                [*filters, "select='gte(scene,0)'", "metadata=print:file='pipe\\:1'"]
+            ),
+            "an": "",
+            "f": "null",
+        }
+        | othertags
+        | {"": ""}
+    )
+    if "threads" in input_options:
+        output_kwargs["filter_threads"] = input_options["threads"]
+    logger.info(f"{_methods.PROBE_MOTION} {input_file.name} with {output_kwargs = }")
+    command = FFmpegCommand.from_kwargs(output_kwargs, nostats="").argv
+    pts_time: float | None = None
+    duration_seen: bool = False
+    for fd, line in _iter_process_lines(command):
+        if fd == 2:
+            if not duration_seen and (match := _DURATION_PATTERN.search(line)):
+                duration_seen = True
+                if match[1] != "N/A":
+                    yield "duration", _convert_timestamp_to_seconds(match[1])
+        elif line.startswith("frame:"):
+            pts_time = float(line.rsplit("pts_time:", 1)[1])
+        elif line.startswith(_SCENE_SCORE) and pts_time is not None:
+            yield "time", pts_time
+            yield "score", float(line[len(_SCENE_SCORE) :])
+
+
+def _probe_scene_scores(  # command
+    input_file: Path,
+    step_frames: int = MOTION_STEP_FRAMES,
+    use_cache: bool = True,
+    profile: AnalysisProfile = AnalysisProfile.FULL,
+    **othertags,
+) -> tuple[np.ndarray, np.ndarray, float]:
+    """(times, scene scores, total_duration), from the analysis cache if possible."""
+    use_cache = use_cache and not othertags
+    name: str = _motion_cache_name(step_frames, profile)
+    if use_cache:
+        meta: dict | None = analysis_cache.load_json(input_file, name)
+        scores: bytes | None = analysis_cache.load(input_file, name + ":scores")
+        if meta is not None and scores is not None:
+            samples = np.frombuffer(scores, dtype=np.float64).reshape(2, -1)
+            return samples[0], samples[1], meta["total_duration"]
+
+    times: array = array("d")
+    scene_scores: array = array("d")
+    total_duration: float = 0.0
+    for event, value in _iter_scene_scores(
+        input_file, step_frames, profile, **othertags
+    ):
+        if event == "time":
+            times.append(value)
+        elif event == "score":
+            scene_scores.append(value)
+        else:
+            total_duration = value
+    if not total_duration and times:
+        total_duration = times[-1]
+    if use_cache:
+        analysis_cache.store_json(input_file, name, {"total_duration": total_duration})
+        analysis_cache.store(
+            input_file, name + ":scores", times.tobytes() + scene_scores.tobytes()
+        )
+    return (
+        np.frombuffer(times, dtype=np.float64),
+        np.frombuffer(scene_scores, dtype=np.float64),
+        total_duration,
     )
-    silence_duration_matches = (float(s) for s in silence_duration_matches)
-    total_silence_duration: float = sum(silence_duration_matches)
 
-    return (non_silence_segs, total_duration, total_silence_duration)
 
+def _rolling_median(scores: np.ndarray, radius: int) -> np.ndarray:
+    """Median of every score and `radius` neighbours on each side, truncated at the ends."""
+    if radius <= 0 or len(scores) == 0:
+        return scores
+    padded = np.pad(scores, radius, constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1)
+    return np.nanmedian(windows, axis=1)
+
+
+def _longest_still_run(times: np.ndarray, motion: np.ndarray) -> float:
+    """Longest still stretch that ends in motion, stretches running into EOF don't count."""
+    moving = np.flatnonzero(motion)
+    if len(moving) == 0:
+        return 0.0
+    previous_motion = np.concatenate(([0.0], times[moving[:-1]]))
+    # Only a still sample right before the motion closes a stretch
+    closes = moving > 0
+    closes[closes] = ~motion[moving[closes] - 1]
+    runs = times[moving[closes] - 1] - previous_motion[closes]
+    return float(runs.max(initial=0.0))
+
+
+def _search_motion_threshold(
+    times: np.ndarray,
+    scores: np.ndarray,
+    min_threshold: float,
+    max_threshold: float,
+    test_duration: float,
+) -> float:
+    """Raise the threshold in min_threshold steps until a still stretch longer than
+    test_duration shows up, min_threshold if none up to max_threshold does."""
+    steps: int = int(max_threshold / min_threshold + 1e-9)
+    for threshold in min_threshold * np.arange(1, steps + 1):
+        if _longest_still_run(times, scores >= threshold) > test_duration:
+            return float(threshold)
+    return min_threshold
+
+
+def motion_segments(
+    times: np.ndarray,
+    scores: np.ndarray,
+    total_duration: float,
+    min_threshold: float = 0.0095,
+    max_threshold: float = 0.04,
+    test_duration: float = 7,
+    smooth: int = 0,
+    samples_to_start: int = 2,
+    samples_to_end: int = 10,
+    before: float = 2.5,
+    after: float = 2,
+    min_break: float = 5.9,
+    ignore_start: float = 2,
+    ignore_end: float = 2,
+) -> list[float]:
+    """Flat (start, end) motion segments from sampled scene scores.
+
+    Motion starts after `samples_to_start` samples in a row above the threshold
+    and ends after `samples_to_end` samples below it, unless motion starts again
+    within `min_break` seconds. Segments are padded by `before` and `after`.
+    """
+    n: int = len(scores)
+    last_sample: int = n - max(samples_to_start, samples_to_end)
+    if last_sample <= 0:
+        return []
+    scores = _rolling_median(scores, smooth)
+    threshold: float = _search_motion_threshold(
+        times, scores, min_threshold, max_threshold, test_duration
+    )
+
+    # Samples above the threshold in the next samples_to_start / samples_to_end
+    above = np.concatenate(([0], np.cumsum(scores > threshold)))
+    sample = np.arange(last_sample)
+    starts_motion = above[sample + samples_to_start] - above[sample] == samples_to_start
+    ends_motion = ~starts_motion & (above[sample + samples_to_end] == above[sample])
 
+    # A motion end only counts if no start follows within min_break seconds
+    start_samples = np.flatnonzero(starts_motion)
+    next_start = np.append(start_samples, last_sample)[
+        np.searchsorted(start_samples, sample, side="right")
+    ]
+    restarts = (next_start < last_sample) & (
+        (next_start == sample + 1)
+        | (times[np.maximum(next_start - 1, 0)] - times[sample] <= min_break)
+    )
+    end_samples = np.flatnonzero(ends_motion & ~restarts)
+
+    first: int = int(np.searchsorted(times, ignore_start))
+    cutoff: int = max(
+        min(last_sample, int(np.searchsorted(times, times[-1] - ignore_end, "right"))),
+        first,
+    )
+    if first >= n:
+        return []
+    start_samples = start_samples[(start_samples >= first) & (start_samples < cutoff)]
+    end_samples = end_samples[end_samples < cutoff]
+
+    segments: list[tuple[int, int]] = []
+    position: int = first
+    while (i := int(np.searchsorted(start_samples, position))) < len(start_samples):
+        start: int = int(start_samples[i])
+        j: int = int(np.searchsorted(end_samples, start + 1))
+        end: int = int(end_samples[j]) if j < len(end_samples) else min(cutoff, n - 1)
+        segments.append((start, end))
+        position = end + 1
+    return (
+        Intervals(times[np.array(segments, dtype=np.int64).reshape(-1, 2)])
+        .pad(before, after, 0.0, total_duration)
+        .union()
+        .to_flat()
+    )
+
+
+@_traced
+def probe_motion(  # command
+    input_file: Path,
+    step_frames: int = MOTION_STEP_FRAMES,
+    use_cache: bool = True,
+    profile: AnalysisProfile = AnalysisProfile.FULL,
+    **motion_kwargs,
+) -> tuple[Sequence[float], float, float]:
+    """Detect motion with ffmpeg scene scores, for camera footage.
+
+    Scores of every `step_frames`-th frame are streamed from ffmpeg and cached,
+    the smoothing, threshold search and segmenting are done in NumPy, so trying
+    other `motion_kwargs` (see `motion_segments`) does not decode again.
+
+    Args:
+        profile (AnalysisProfile, optional): Decode cost of the analysis, see
+            ANALYSIS_PROFILES. Scores of scaled down frames run slightly lower,
+            the default thresholds are tuned on FULL. Defaults to AnalysisProfile.FULL.
+
+    Returns:
+        tuple[Sequence[float], float, float]: (motion_segs, total_duration, total_still_duration)
+    """
+    times, scores, total_duration = _probe_scene_scores(
+        input_file, step_frames, use_cache, profile
+    )
+    segments: list[float] = motion_segments(
+        times, scores, total_duration, **motion_kwargs
+    )
+    kept: float = sum(segments[i + 1] - segments[i] for i in range(0, len(segments), 2))
+    logger.info(f"{input_file.name} motion probed: {len(segments) // 2} segments")
+    return (segments, total_duration, total_duration - kept)
+
+
+@_traced
+def analyze_media(  # command
+    input_file: Path,
+    dB: int = -35,
+    sl_duration: float = 1,
+    keyframes: bool = True,
+    use_cache: bool = True,
+    mode: AnalysisMode = AnalysisMode.SILENCEDETECT,
+    **othertags,
+) -> MediaAnalysis:
+    """Probe silences, keyframes, duration and streams in one ffmpeg decode.
+
+    Audio is fully decoded for silencedetect while video decoding is limited to
+    keyframes (`-skip_frame:v nokey`) which are reported by `showinfo`. Results
+    are kept in the analysis cache, so a later run with other silence parameters
+    only decodes the audio again, or nothing at all in `AnalysisMode.ENVELOPE`.
+
+    Args:
+        input_file (Path): Video to analyze.
+        dB (int, optional): Silence threshold. Defaults to -35.
+        sl_duration (float, optional): Minimum silence duration. Defaults to 1.
+        keyframes (bool, optional): Also collect keyframe timestamps. Defaults to True.
+        use_cache (bool, optional): Read and write the analysis cache. Defaults to True.
+        mode (AnalysisMode, optional): Detect silences with silencedetect or on a
+            threshold independent loudness envelope. Defaults to SILENCEDETECT.
+
+    Returns:
+        MediaAnalysis: non silence segments, durations, keyframes and streams
+    """
+    silence_name: str = f"silencedetect=n={dB}dB:d={sl_duration}"
+    use_cache = use_cache and not othertags
+    media: dict | None = None
+    silence_log: bytes | None = None
+    envelope: LoudnessEnvelope | None = None
+    keyframe_index: KeyframeIndex | None = None
+    if use_cache:
+        media = analysis_cache.load_json(input_file, _methods.ANALYZE_MEDIA)
+        if keyframes:
+            keyframe_index = load_keyframe_index(input_file)
+        if mode == AnalysisMode.ENVELOPE:
+            envelope = load_loudness_envelope(input_file)
+        else:
+            silence_log = analysis_cache.load(input_file, silence_name)
+    audio_cached: bool = (
+        envelope is not None if mode == AnalysisMode.ENVELOPE else silence_log is not None
+    )
+    probe_keyframes: bool = keyframes and keyframe_index is None
+
+    if media is None or not audio_cached or probe_keyframes:
+        output_kwargs: dict = (
+            ({"skip_frame:v": "nokey"} if probe_keyframes else {})
+            | {
+                "hwaccel": "auto",
+                "i": input_file,
+                "af": (
+                    _create_envelope_filter()
+                    if mode == AnalysisMode.ENVELOPE
+                    else silence_name
+                ),
+            }
+            | ({"vf": "showinfo"} if probe_keyframes else {"c:v": "copy"})
+            | {"f": "null"}
+            | othertags
+            | {"": ""}
+        )
+
+        logger.info(
+            f"{_methods.ANALYZE_MEDIA} {input_file.name} by {dB = }, {mode = } and {output_kwargs = }"
+        )
+
+        command = FFmpegCommand.from_kwargs(output_kwargs, nostats="").argv
+        media = {"total_duration": 0.0, "streams": []}
+        keyframe_times: array = array("d")
+        silence_lines: list[str] = []
+        if mode == AnalysisMode.ENVELOPE:
+            envelope = _new_envelope()
+        for event, value in _iter_ffmpeg_events(command):
+            match event:
+                case "duration":
+                    media["total_duration"] = value
+                case "stream":
+                    media["streams"].append(value)
+                case "keyframe":
+                    keyframe_times.append(value)
+                case "silence_start" | "silence_end":
+                    silence_lines.append(f"{event}: {value}")
+                case "silence_duration":
+                    silence_lines[-1] += f" | {event}: {value}"
+            if envelope is not None:
+                _fold_envelope_event(envelope, event, value)
+        if envelope is None:
+            silence_log = "\n".join(silence_lines).encode("utf-8")
+        if probe_keyframes:
+            keyframe_index = KeyframeIndex(keyframe_times)
+        if use_cache:
+            analysis_cache.store_json(input_file, _methods.ANALYZE_MEDIA, media)
+            if probe_keyframes:
+                _store_keyframe_index(input_file, keyframe_index)  # type: ignore
+            if envelope is not None:
+                _store_loudness_envelope(
+                    input_file,
+                    envelope,
+                    any(stream["codec_type"] == "audio" for stream in media["streams"]),
+                )
+            if silence_log is not None:
+                analysis_cache.store(input_file, silence_name, silence_log)
+
+    total_duration: float = media["total_duration"]
+    non_silence_segs: Sequence[float]
+    total_silence_duration: float
+    if envelope is not None:
+        non_silence_segs, _, total_silence_duration = non_silence_from_envelope(
+            envelope, dB, sl_duration
+        )
+    else:
+        non_silence_segs, total_silence_duration = _parse_silencedetect(
+            (silence_log or b"").decode("utf-8"), total_duration
+        )
+    analysis: MediaAnalysis = {
+        "non_silence_segs": non_silence_segs,
+        "total_duration": total_duration,
+        "total_silence_duration": total_silence_duration,
+        "keyframes": keyframe_index or KeyframeIndex(),
+        "streams": media["streams"],
+    }
+    logger.info(
+        f"{input_file.name} analyzed: {total_duration = }, {total_silence_duration = }, {len(analysis['keyframes'])} keyframes"
+    )
+
+    return analysis
+
+
+@_traced
 def probe_is_valid_video(input_file: Path, **othertags) -> bool:  # command
     """Function to check if a video file is valid using ffprobe."""
     output_kwargs: dict = {
@@ -208,10 +1079,9 @@ def probe_is_valid_video(input_file: Path, **othertags) -> bool:  # command
     } | othertags
     logger.info(f"Validating {input_file.name} with {output_kwargs = }")
     try:
-        command = "ffprobe " + _dic_to_ffmpeg_args(output_kwargs)
-        result = subprocess.run(
-            command, capture_output=True, text=True, check=True, encoding="utf-8"
-        ).stdout.strip()
+        result = _run_ffprobe(
+            FFmpegCommand.from_kwargs(output_kwargs, "ffprobe")
+        ).strip()
         if result:
             message = f"Validated file: {input_file}, Status: Valid"
             logger.info(message)
@@ -226,58 +1096,481 @@ def probe_is_valid_video(input_file: Path, **othertags) -> bool:  # command
         return False
 
 
-def _probe_keyframe(input_file: Path, **othertags) -> list[float]:  # command
+# Top level boxes an MP4/MOV file may start with
+_MP4_BOXES: frozenset[bytes] = frozenset(
+    (b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot")
+)
+_EBML_MAGIC: bytes = b"\x1a\x45\xdf\xa3"  # Matroska, WebM
+
+
+def _mp4_has_moov(f: BinaryIO, size: int) -> bool:
+    """Walk the top level boxes, a recording cut short has no moov box."""
+    offset: int = 0
+    while offset + 8 <= size:
+        f.seek(offset)
+        header: bytes = f.read(16)
+        box_size: int = int.from_bytes(header[:4])
+        if box_size == 1:
+            box_size = int.from_bytes(header[8:16])
+        elif box_size == 0:
+            box_size = size - offset
+        if header[4:8] == b"moov":
+            return offset + box_size <= size
+        if box_size < 8:
+            return False
+        offset += box_size
+    return False
+
+
+def _probe_header(input_file: Path) -> bool | None:
+    """Check the container header without ffprobe, None for unknown containers."""
+    try:
+        size: int = input_file.stat().st_size
+        with open(input_file, "rb") as f:
+            head: bytes = f.read(12)
+            if head[:4] == _EBML_MAGIC:
+                return True
+            if head[4:8] in _MP4_BOXES:
+                return _mp4_has_moov(f, size)
+            if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+                return True
+            if head[:3] == b"FLV":
+                return True
+            if head[:1] == b"\x47" and size >= 189:
+                # MPEG-TS packets of 188 bytes start with a sync byte
+                f.seek(188)
+                return f.read(1) == b"\x47"
+    except OSError:
+        return False
+    return None
+
+
+def _validate_clip(input_file: Path, check: ValidityCheck) -> bool:
+    if check == ValidityCheck.HEADER:
+        valid: bool | None = _probe_header(input_file)
+        if valid is not None:
+            return valid
+    return probe_is_valid_video(input_file)
+
+
+@_traced
+def probe_valid_videos(
+    input_files: Iterable[Path],
+    check: ValidityCheck = ValidityCheck.DURATION,
+    max_workers: int | None = None,
+    use_cache: bool = True,
+) -> dict[Path, bool]:
+    """Validate many files at once, on a pool of max_workers threads.
+
+    Results are cached by path, size and mtime, so the files validated by a
+    previous run are not checked again.
+
+    Args:
+        input_files (Iterable[Path]): Files to validate.
+        check (ValidityCheck, optional): HEADER only reads the container header
+            and falls back to ffprobe for unknown containers, DURATION runs
+            probe_is_valid_video. Defaults to ValidityCheck.DURATION.
+        max_workers (int | None, optional): Files checked at once. Defaults to
+            the number of CPU threads of the scheduler.
+        use_cache (bool, optional): Read and store cached results. Defaults to True.
+
+    Returns:
+        dict[Path, bool]: Validity of every file, in the order of input_files.
+    """
+    input_files = list(input_files)
+    validity: dict[Path, bool] = (
+        analysis_cache.load_validity(input_files, check) if use_cache else {}
+    )
+    pending: list[Path] = [f for f in dict.fromkeys(input_files) if f not in validity]
+    probed: dict[Path, bool] = dict(
+        zip(
+            pending,
+            _run_in_order(
+                [partial(_validate_clip, f, check) for f in pending],
+                max_workers or scheduler.total_threads,
+            ),
+        )
+    )
+    if use_cache:
+        analysis_cache.store_validity(probed, check)
+    validity |= probed
+    invalid: int = sum(not validity[f] for f in input_files)
+    logger.info(
+        f"{_methods.PROBE_VALID_VIDEOS} {len(input_files)} files with {check = }: "
+        f"{len(pending)} checked, {invalid} invalid"
+    )
+    return {f: validity[f] for f in input_files}
+
+
+def iter_keyframes(  # command
+    input_file: Path, **othertags
+) -> Generator[float, None, None]:
+    """Yield keyframe timestamps of the first video stream as ffprobe reads them.
+
+    `-skip_frame nokey` makes the decoder drop every frame but the keyframes,
+    so only those are decoded and printed.
+    """
     output_kwargs: dict = {
         "v": "error",
+        "skip_frame": "nokey",
         "select_streams": "v:0",
-        "show_entries": "packet=pts_time,flags",
-        "of": "json",
+        "show_entries": "frame=pts_time",
+        "of": "csv=p=0",
         "i": input_file,
     } | othertags
     logger.info(f"Getting keyframe for {input_file.name} with {output_kwargs = }")
-    command = "ffprobe " + _dic_to_ffmpeg_args(output_kwargs)
-    result = subprocess.run(
-        command, capture_output=True, text=True, check=True, encoding="utf-8"
-    )
-    probe = json.loads(result.stdout)
-    keyframe_pts: list[float] = [
-        float(packet["pts_time"])
-        for packet in probe["packets"]
-        if "K" in packet["flags"]
+    command = FFmpegCommand.from_kwargs(output_kwargs, "ffprobe").argv
+    for fd, line in _iter_process_lines(command):
+        if fd != 1:
+            continue
+        pts_time: str = line.strip().rstrip(",")
+        if pts_time not in ("", "N/A"):
+            yield float(pts_time)
+
+
+def _iter_keyframe_packets(  # command
+    input_file: Path, **othertags
+) -> Generator[tuple[int, float], None, None]:
+    """Yield (packet ordinal, timestamp) of the keyframes of the first video stream.
+
+    The ordinal counts every packet before the keyframe, which is the frame
+    number `n` of the keyframe in a select filter. Counting needs every packet
+    listed, use `iter_keyframes` when only the timestamps matter.
+    """
+    output_kwargs: dict = {
+        "v": "error",
+        "select_streams": "v:0",
+        "show_entries": "packet=pts_time,flags",
+        "of": "csv=p=0",
+        "i": input_file,
+    } | othertags
+    logger.info(f"Counting packets of {input_file.name} with {output_kwargs = }")
+    command = FFmpegCommand.from_kwargs(output_kwargs, "ffprobe").argv
+    ordinal: int = 0
+    for fd, line in _iter_process_lines(command):
+        if fd != 1:
+            continue
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            yield ordinal, float(pts_time)
+        ordinal += 1
+
+
+def _probe_packet_times(  # command
+    input_file: Path, select_streams: str = "a:0", **othertags
+) -> np.ndarray:
+    """Timestamps of every packet of a stream of input_file, in decode order."""
+    output_kwargs: dict = {
+        "v": "error",
+        "select_streams": select_streams,
+        "show_entries": "packet=pts_time",
+        "of": "csv=p=0",
+        "i": input_file,
+    } | othertags
+    logger.info(f"Listing packets of {input_file.name} with {output_kwargs = }")
+    command = FFmpegCommand.from_kwargs(output_kwargs, "ffprobe").argv
+    return np.array(
+        [
+            float(line.strip(","))
+            for fd, line in _iter_process_lines(command)
+            if fd == 1 and line.strip(",") not in ("", "N/A")
+        ],
+        dtype=np.float64,
+    )
+
+
+def _probe_keyframe(input_file: Path, **othertags) -> list[float]:  # command
+    return list(iter_keyframes(input_file, **othertags))
+
+
+def load_keyframe_index(input_file: Path) -> KeyframeIndex | None:
+    """Return the cached keyframe index of `input_file` without probing."""
+    data: bytes | None = analysis_cache.load(input_file, _methods.PROBE_KEYFRAME_INDEX)
+    return None if data is None else KeyframeIndex.frombytes(data)
+
+
+def _store_keyframe_index(input_file: Path, keyframe_index: KeyframeIndex) -> None:
+    analysis_cache.store(
+        input_file, _methods.PROBE_KEYFRAME_INDEX, keyframe_index.tobytes()
+    )
+
+
+@_traced
+def probe_keyframe_index(  # command
+    input_file: Path, use_cache: bool = True, **othertags
+) -> KeyframeIndex:
+    """Build the keyframe index of the first video stream.
+
+    Only the keyframes are decoded and listed by ffprobe, see `iter_keyframes`.
+    The index is persisted in the analysis cache.
+    """
+    use_cache = use_cache and not othertags
+    if use_cache:
+        keyframe_index: KeyframeIndex | None = load_keyframe_index(input_file)
+        if keyframe_index is not None:
+            return keyframe_index
+    keyframe_index = KeyframeIndex(iter_keyframes(input_file, **othertags))
+    logger.info(f"{input_file.name} {keyframe_index} indexed")
+    if use_cache:
+        _store_keyframe_index(input_file, keyframe_index)
+    return keyframe_index
+
+
+def _create_force_keyframes_args(keyframe_times: int = 2) -> dict[str, str]:
+    return {"force_key_frames": f"expr:gte(t,n_forced*{keyframe_times})"}
+
+
+def encode_profile_args(
+    profile: EncodeProfile | str, calibrated: bool = False, input_file: Path | None = None
+) -> dict[str, str | int]:
+    """ffmpeg output args of an encode profile.
+
+    Args:
+        calibrated (bool, optional): Use the preset calibrate_profile picked for
+            the encoding of input_file. Defaults to False.
+    """
+    args: dict[str, str | int] = dict(ENCODE_PROFILES[EncodeProfile(profile)])
+    if calibrated and input_file is not None:
+        try:
+            args["preset"] = calibrate_profile(input_file, profile)["preset"]
+        except ValueError as e:
+            logger.warning(f"Keeping the {profile} preset: {e}")
+    return args
+
+
+_SSIM_PATTERN = re.compile(r"SSIM .*All:([0-9.]+)")
+_calibration_lock = threading.Lock()
+
+
+def _load_calibrations() -> dict[str, CalibrationResult]:
+    try:
+        return json.loads(CALIBRATION_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_calibration(key: str, result: CalibrationResult) -> None:
+    with _calibration_lock:
+        calibrations: dict[str, CalibrationResult] = _load_calibrations()
+        calibrations[key] = result
+        try:
+            CALIBRATION_PATH.parent.mkdir(parents=True, exist_ok=True)
+            CALIBRATION_PATH.write_text(
+                json.dumps(calibrations, indent=2), encoding="utf-8"
+            )
+        except OSError as e:
+            logger.warning(f"Failed to store encode calibration: {e}")
+
+
+def _measure_ssim(
+    encoded_file: Path, input_file: Path, start: float, duration: float
+) -> float:  # command
+    command = (
+        FFmpegCommand(nostats="")
+        .input(encoded_file)
+        .input(input_file, ss=start, t=duration)
+        .filter_complex(
+            "[0:v]setpts=PTS-STARTPTS[encoded];"
+            "[1:v]setpts=PTS-STARTPTS[source];[encoded][source]ssim"
+        )
+        .output("-", f="null")
+    )
+    ssim: float = 0.0
+    for _, line in _iter_process_lines(command.argv):
+        if match := _SSIM_PATTERN.search(line):
+            ssim = float(match[1])
+    return ssim
+
+
+@_traced
+def calibrate_profile(  # command
+    input_file: Path,
+    profile: EncodeProfile | str = EncodeProfile.FAST,
+    target_bitrate: int | None = None,
+    target_ssim: float | None = None,
+    sample_duration: float = CALIBRATION_SAMPLE_SECONDS,
+) -> CalibrationResult:
+    """Pick the fastest preset of profile meeting the targets on a sample of input_file.
+
+    A sample from the middle of the file is encoded with every preset from the
+    fastest on, until the video bitrate is at most target_bitrate and the SSIM to
+    the source is at least target_ssim. Without targets the bitrate of the
+    source is the target, or its average bitrate when ffprobe reports none.
+    The slowest preset is picked if none meets them. Results are cached per
+    source encoding, so files of the same camera are calibrated once.
+
+    Raises:
+        ValueError: Without targets when the source bitrate is unknown.
+    """
+    profile = EncodeProfile(profile)
+    encoding: EncodeKwargs = probe_encoding(input_file)
+    if target_bitrate is None and target_ssim is None:
+        duration: float = probe_duration(input_file)
+        target_bitrate = encoding.get("video_bitrate") or (
+            int(input_file.stat().st_size * 8 / duration) if duration > 0 else None
+        )
+        if not target_bitrate:
+            # Any preset would meet no target, the fastest one would be cached
+            raise ValueError(f"No bitrate of {input_file.name} to calibrate against")
+    key: str = json.dumps(
+        {
+            "encoding": encoding,
+            "profile": profile,
+            "target_bitrate": target_bitrate,
+            "target_ssim": target_ssim,
+            "sample_duration": sample_duration,
+        },
+        sort_keys=True,
+    )
+    cached: CalibrationResult | None = _load_calibrations().get(key)
+    if cached is not None:
+        return cached
+
+    start: float = max(probe_duration(input_file) / 2 - sample_duration / 2, 0.0)
+    result: CalibrationResult | None = None
+    with scratch_dir() as temp_dir:
+        for preset in ENCODER_PRESETS:
+            sample: Path = temp_dir / f"{preset}{input_file.suffix}"
+            started: float = time.perf_counter()
+            _ffmpeg(
+                **(
+                    {"ss": start, "t": sample_duration, "i": input_file, "an": ""}
+                    | ENCODE_PROFILES[profile]
+                    | {"preset": preset, "y": sample}
+                )
+            )
+            result = {
+                "preset": preset,
+                "bitrate": int(sample.stat().st_size * 8 / sample_duration),
+                "ssim": _measure_ssim(sample, input_file, start, sample_duration),
+                "seconds": time.perf_counter() - started,
+            }
+            logger.info(f"{_methods.CALIBRATE_PROFILE} {input_file.name}: {result}")
+            if (target_bitrate is None or result["bitrate"] <= target_bitrate) and (
+                target_ssim is None or result["ssim"] >= target_ssim
+            ):
+                break
+
+    _store_calibration(key, result)  # type: ignore
+    return result  # type: ignore
+
+
+def _create_speedup_args(
+    multiple: float, frame_offset: int = 0, audio_frame_offset: int = 0
+) -> dict[str, str]:
+    vf: str
+    af: str
+    if multiple > SPEEDUP_METHOD_THRESHOLD:
+        n: str = f"n+{frame_offset}" if frame_offset else "n"
+        an: str = f"n+{audio_frame_offset}" if audio_frame_offset else "n"
+        vf = f"select='not(mod({n},{multiple}))',setpts=N/FRAME_RATE/TB"
+        af = f"aselect='not(mod({an},{multiple}))',asetpts=N/SR/TB"
+    else:
+        vf = f"setpts={1/multiple}*PTS"
+        af = f"atempo={multiple}"
+    return (
+        {"vf": vf, "af": af}
+        | {
+            "map": 0,
+            "shortest": "",
+            "fps_mode": "vfr",
+            "async": 1,
+        }
+        | _create_force_keyframes_args()
+    )
+
+
+def _plan_chunks(input_file: Path, chunks: int) -> list[tuple[float, float | None, int]]:
+    """Split input_file at the keyframes closest to even shares of its duration.
+
+    Returns:
+        list[tuple[float, float | None, int]]: (start, end, frame offset) of every
+            chunk, the end of the last one is None
+    """
+    keyframe_packets: dict[float, int] = {
+        pts_time: ordinal for ordinal, pts_time in _iter_keyframe_packets(input_file)
+    }
+    keyframes: KeyframeIndex = KeyframeIndex(keyframe_packets)
+    if not keyframes:
+        return [(0.0, None, 0)]
+    duration: float = probe_duration(input_file)
+    boundaries: list[float] = sorted(
+        {
+            keyframes.nearest(keyframes[0] + duration * i / chunks)  # type: ignore
+            for i in range(1, chunks)
+        }
+        - {keyframes[0]}
+    )
+    starts: list[float] = [keyframes[0], *boundaries]
+    return [
+        (start, end, keyframe_packets[start] - keyframe_packets[keyframes[0]])
+        for start, end in zip(starts, [*boundaries, None])
     ]
-    return keyframe_pts
 
 
-def _create_force_keyframes_args(keyframe_times: int = 2) -> dict[str, str]:
-    return {"force_key_frames": f'"expr:gte(t,n_forced*{keyframe_times})"'}
+def _encode_chunk(
+    input_file: Path,
+    output_file: Path,
+    start: float,
+    end: float | None,
+    output_kwargs: dict,
+) -> Path:
+    _ffmpeg(
+        **(
+            {"ss": start}
+            | ({"to": end} if end is not None else {})
+            | {"i": input_file}
+            | output_kwargs
+            | {"y": output_file}
+        )
+    )
+    return output_file
+
+
+@_traced
+def encode_in_chunks(  # command
+    input_file: Path,
+    output_file: Path,
+    create_args: Callable[[float, int], dict],
+    chunks: int,
+) -> None:
+    """Encode input_file as keyframe aligned chunks in parallel and join them losslessly.
+
+    Every chunk is seeked to its keyframe and encoded with the same parameters.
+    create_args receives the start time and the frame offset of the chunk in the
+    input, so `t` and `n` based video expressions stay continuous across chunks.
+    The encoded chunks are joined by stream copy.
+    """
+    plan: list[tuple[float, float | None, int]] = _plan_chunks(input_file, chunks)
+    logger.info(f"Encode {input_file.name} in {len(plan)} chunks")
+    with scratch_dir() as temp_dir:
+        chunk_files: list[Path] = _run_in_order(
+            [
+                partial(
+                    _encode_chunk,
+                    input_file,
+                    temp_dir / f"{i}{output_file.suffix}",
+                    start,
+                    end,
+                    create_args(start, frame_offset),
+                )
+                for i, (start, end, frame_offset) in enumerate(plan)
+            ]
+        )
+        merge(create_merge_txt(chunk_files, temp_dir / "input.txt"), output_file)
 
 
-def _create_speedup_args(multiple: float) -> dict[str, str]:
-    SPEEDUP_METHOD_THRESHOLD: int = 4
-    vf: str
-    af: str
-    if multiple > SPEEDUP_METHOD_THRESHOLD:
-        vf = f"select='not(mod(n,{multiple}))',setpts=N/FRAME_RATE/TB"
-        af = f"aselect='not(mod(n,{multiple}))',asetpts=N/SR/TB"
-    else:
-        vf = f"setpts={1/multiple}*PTS"
-        af = f"atempo={multiple}"
-    return (
-        {"vf": vf, "af": af}
-        | {
-            "map": 0,
-            "shortest": "",
-            "fps_mode": "vfr",
-            "async": 1,
-        }
-        | _create_force_keyframes_args()
-    )
+def _audio_frame_at(packet_times: np.ndarray, start: float) -> int:
+    """Index of the audio frame an input seek to start lands in, `n` of aselect."""
+    return max(int(np.searchsorted(packet_times, start, side="right")) - 1, 0)
 
 
+@_traced
 def speedup(  # command
     input_file: Path,
     output_file: Path | None,
     multiple: float | int,
+    chunks: int | None = None,  # encode as parallel keyframe aligned chunks
     **othertags,
 ) -> int:
     """_summary_
@@ -324,7 +1617,24 @@ def speedup(  # command
     )
 
     try:
-        _ffmpeg(**output_kwargs)
+        if chunks and chunks > 1:
+            # Audio frames are numbered apart from video frames
+            audio_packets: np.ndarray = (
+                _probe_packet_times(input_file)
+                if multiple > SPEEDUP_METHOD_THRESHOLD
+                else np.empty(0)
+            )
+            encode_in_chunks(
+                input_file,
+                temp_output_file,
+                lambda start, frame_offset: _create_speedup_args(
+                    multiple, frame_offset, _audio_frame_at(audio_packets, start)
+                )
+                | othertags,
+                chunks,
+            )
+        else:
+            _ffmpeg(**output_kwargs)
         temp_output_file.replace(output_file)
     except Exception as e:
         logger.error(
@@ -339,24 +1649,28 @@ def _create_jumpcut_args(
     lasting: float,
     interval_multiple: int = 0,  # 0 means unwanted cut out
     lasting_multiple: int = 1,  # 0 means unwanted cut out
+    time_offset: float = 0,  # where the input starts in the original, for chunks
+    frame_offset: int = 0,
 ) -> dict[str, str]:
+    n: str = f"n+{frame_offset}" if frame_offset else "n"
+    t: str = f"t+{time_offset}" if time_offset else "t"
     interval_multiple_expr: str = (
         str(interval_multiple)
         if interval_multiple == 0
-        else f"not(mod(n,{interval_multiple}))"
+        else f"not(mod({n},{interval_multiple}))"
     )
     lasting_multiple_expr: str = (
         str(lasting_multiple)
         if lasting_multiple == 0
-        else f"not(mod(n,{lasting_multiple}))"
+        else f"not(mod({n},{lasting_multiple}))"
     )
     frame_select_expr: str = (
-        f"if(lte(mod(t, {interval + lasting}),{interval}), {interval_multiple_expr}, {lasting_multiple_expr})"
+        f"if(lte(mod({t}, {interval + lasting}),{interval}), {interval_multiple_expr}, {lasting_multiple_expr})"
     )
     args: dict[str, str] = (
         {
-            "vf": f"\"select='{frame_select_expr}',setpts=N/FRAME_RATE/TB\"",
-            "af": f"\"aselect='{frame_select_expr}',asetpts=N/SR/TB\"",
+            "vf": f"select='{frame_select_expr}',setpts=N/FRAME_RATE/TB",
+            "af": f"aselect='{frame_select_expr}',asetpts=N/SR/TB",
         }
         | {
             "map": 0,
@@ -370,6 +1684,7 @@ def _create_jumpcut_args(
     return args
 
 
+@_traced
 def jumpcut(  # command
     input_file: Path,
     output_file: Path | None,
@@ -377,6 +1692,7 @@ def jumpcut(  # command
     lasting: float,
     interval_multiple: int = 0,  # 0 means unwanted cut out
     lasting_multiple: int = 1,  # 0 means unwanted cut out
+    chunks: int | None = None,  # encode as parallel keyframe aligned chunks
     **othertags,
 ) -> int:
     if any((interval <= 0, lasting <= 0)):
@@ -408,7 +1724,23 @@ def jumpcut(  # command
         f"{_methods.JUMPCUT} {input_file.name} to {output_file.name} with {output_kwargs = }"
     )
     try:
-        _ffmpeg(**output_kwargs)
+        if chunks and chunks > 1:
+            encode_in_chunks(
+                input_file,
+                temp_output_file,
+                lambda time_offset, frame_offset: _create_jumpcut_args(
+                    interval,
+                    lasting,
+                    interval_multiple,
+                    lasting_multiple,
+                    time_offset,
+                    frame_offset,
+                )
+                | othertags,
+                chunks,
+            )
+        else:
+            _ffmpeg(**output_kwargs)
         temp_output_file.replace(output_file)
     except Exception as e:
         logger.error(
@@ -418,7 +1750,13 @@ def jumpcut(  # command
     return 0
 
 
-def convert(input_file: Path, output_file: Path | None, **othertags) -> int:  # command
+@_traced
+def convert(  # command
+    input_file: Path,
+    output_file: Path | None,
+    chunks: int | None = None,  # encode as parallel keyframe aligned chunks
+    **othertags,
+) -> int:
     if output_file is None:
         output_file = input_file.parent / (
             input_file.stem + "_" + _methods.CONVERT + input_file.suffix
@@ -439,7 +1777,12 @@ def convert(input_file: Path, output_file: Path | None, **othertags) -> int:  #
         f"{_methods.CONVERT} {input_file.name} to {output_file.name} with {output_kwargs = }"
     )
     try:
-        _ffmpeg(**output_kwargs)
+        if chunks and chunks > 1:
+            encode_in_chunks(
+                input_file, temp_output_file, lambda *_: dict(othertags), chunks
+            )
+        else:
+            _ffmpeg(**output_kwargs)
         temp_output_file.replace(output_file)
     except Exception as e:
         logger.error(f"Failed to convert videos for {input_file}. Error: {e}")
@@ -467,8 +1810,29 @@ def create_merge_txt(
     # Step 5: Create input.txt for FFmpeg concatenation
     with open(output_txt, "w") as f:
         for video_path in video_files:
-            f.write(f"file '{video_path}'\n")
+            f.write(f"file {_quote_concat_path(video_path)}\n")
+
+    return output_txt
 
+
+def _quote_concat_path(path: Path) -> str:
+    return "'" + str(path).replace("'", "'\\''") + "'"
+
+
+def create_inpoint_txt(
+    input_file: Path, video_segments: Sequence[float], output_txt: Path
+) -> Path:
+    """Write a concat script that reads every (start, end) pair straight from input_file."""
+    quoted_input: str = _quote_concat_path(input_file.resolve())
+    with open(output_txt, "w", encoding="utf-8") as f:
+        for i in range(0, len(video_segments), 2):
+            start_time, end_time = video_segments[i], video_segments[i + 1]
+            if end_time <= start_time:
+                continue
+            f.write(f"file {quoted_input}\n")
+            if start_time > 0:
+                f.write(f"inpoint {start_time}\n")
+            f.write(f"outpoint {end_time}\n")
     return output_txt
 
 
@@ -488,7 +1852,10 @@ def merge(input_txt: Path, output_file: Path, **othertags) -> int:  # command
         f"{_methods.MERGE} {input_txt.name} to {output_file.name} with {output_kwargs = }"
     )
     try:
-        _ffmpeg(**output_kwargs)
+        with tracing.span(_methods.MERGE, "ffmpeg_converter") as merge_span:
+            _ffmpeg(**output_kwargs)
+            if merge_span:
+                merge_span.set(bytes=output_file.stat().st_size)
         return 0
     except Exception as e:
         logger.error(f"Failed merging {input_txt}. Error: {str(e)}")
@@ -521,38 +1888,15 @@ def _convert_timestamp_to_seconds(timestamp: str) -> float:
 
 
 def _adjust_segments_to_keyframes(
-    video_segments: Sequence[float], keyframe_times: Sequence[float]
+    video_segments: Sequence[float],
+    keyframe_times: KeyframeIndex | Sequence[float],
 ) -> Sequence[float]:
-    adjusted_segments = []
-    keyframe_index = 0
-
-    for i, time in enumerate(video_segments):
-        if i % 2 == 0:  # start time
-            # 找到不大於當前時間的最大關鍵幀時間
-            while (
-                keyframe_index < len(keyframe_times)
-                and keyframe_times[keyframe_index] <= time
-            ):
-                keyframe_index += 1
-            adjusted_time = (
-                keyframe_times[keyframe_index - 1] if keyframe_index > 0 else time
-            )
-            adjusted_segments.append(adjusted_time)
-        else:  # end time
-            # 找到不小於當前時間的最小關鍵幀時間
-            while (
-                keyframe_index < len(keyframe_times)
-                and keyframe_times[keyframe_index] < time
-            ):
-                keyframe_index += 1
-            adjusted_time = (
-                keyframe_times[keyframe_index]
-                if keyframe_index < len(keyframe_times)
-                else time
-            )
-            adjusted_segments.append(adjusted_time)
-
-    return adjusted_segments
+    # Starts move back and ends forward to the nearest keyframe
+    return (
+        Intervals.from_flat(video_segments)
+        .snap_to_keyframes(keyframe_times)
+        .to_flat()
+    )
 
 
 def _ensure_minimum_segment_length(
@@ -584,70 +1928,23 @@ def _ensure_minimum_segment_length(
     if len(video_segments) % 2 != 0:
         raise ValueError("video_segments must contain pairs of start and end times.")
 
-    if total_duration is None:
-        total_duration = video_segments[-1]
-
-    updated_segments = []
-    for i in range(0, len(video_segments), 2):
-        start_time = video_segments[i]
-        end_time = video_segments[i + 1]
-        duration = end_time - start_time
-
-        if duration >= seg_min_duration or len(video_segments) == 2:
-            updated_segments.extend([start_time, end_time])
-            continue
-
-        if i == len(video_segments) - 2:
-            # This is the last segment
-            start_time = max(0, end_time - seg_min_duration)
-        else:
-            # Calculate the difference between the minimum duration and the current duration
-            diff = seg_min_duration - duration
-            # Adjust the start and end times to increase the duration to the minimum
-            start_time = max(0, start_time - diff / 2)
-            end_time = min(start_time + seg_min_duration, total_duration)
-
-        updated_segments.extend([start_time, end_time])
-
-    # Ensure the hole video is long enough
-    if updated_segments[-1] - updated_segments[0] < seg_min_duration:
-        return []
-
-    return updated_segments
+    return (
+        Intervals.from_flat(video_segments)
+        .expand_to_minimum(seg_min_duration, total_duration)
+        .to_flat()
+    )
 
 
 def _merge_overlapping_segments(segments: Sequence[float]) -> Sequence[float]:
-    """_summary_
+    """Sort the segments and merge the overlapping and touching ones.
 
     Args:
-        segments (Sequence[float]): _description_
+        segments (Sequence[float]): Flat list of start and end times.
 
     Returns:
-        Sequence[float]: _description_
+        Sequence[float]: Flat list of disjoint segments in order.
     """
-    # Sort segments by start time
-    sorted_segments = sorted(
-        (segments[i], segments[i + 1]) for i in range(0, len(segments), 2)
-    )
-    if len(sorted_segments) == 0:
-        return []
-
-    merged_segments = []
-    current_start, current_end = sorted_segments[0]
-
-    for start, end in sorted_segments[1:]:
-        if start <= current_end:
-            # Overlapping segments, merge them
-            current_end = max(current_end, end)
-        else:
-            # No overlap, add the current segment and move to the next
-            merged_segments.extend([current_start, current_end])
-            current_start, current_end = start, end
-
-    # Add the last segment
-    merged_segments.extend([current_start, current_end])
-
-    return merged_segments
+    return Intervals.from_flat(segments).union().to_flat()
 
 
 def _create_full_args(
@@ -668,12 +1965,14 @@ def _create_cut_args(start_time: str, end_time: str) -> dict[str, str]:
     }
 
 
+@_traced
 def cut(  # command
     input_file: Path,
     output_file: Path | None,
     start_time: str,
     end_time: str,
     rerender: bool = False,
+    smart: bool = False,  # frame accurate, re-encodes only the edge GOPs
     **othertags: EncodeKwargs,
 ) -> int:
     """Cut a video file using ffmpeg-python.
@@ -692,6 +1991,16 @@ def cut(  # command
         output_file.stem + "_processing" + output_file.suffix
     )
 
+    if smart:
+        if rerender or othertags:
+            raise ValueError(
+                "A smart cut copies the stream between its edges, it takes no rerender or encoding args."
+            )
+        logger.info(f"{_methods.CUT} {input_file.name} to {output_file.name} smartly")
+        return _keep_by_inpoints(
+            input_file, output_file, temp_output_file, [start_time, end_time], True
+        )
+
     output_kwargs: dict = (
         {
             "i": input_file,
@@ -739,69 +2048,537 @@ def _split_segments_cut(
     Raises:
         ValueError: _description_
 
-    Returns:
-        tuple[Sequence[Path], Path]: (cut_videos, input_txt_path)
-    """
+    Returns:
+        tuple[Sequence[Path], Path]: (cut_videos, input_txt_path)
+    """
+
+    # Step 1: Validate input
+    if len(video_segments) % 2 != 0:
+        raise ValueError(
+            "video_segments must contain an even number of elements (start and end times)."
+        )
+
+    # Step 2: Create a temporary folder for storing cut videos
+    if output_dir is None:
+        output_dir = input_file.parent / f"{input_file.stem}_segments"
+    cut_videos: list[Path] = []  # List to store paths of cut video segments
+
+    # Step 3: Use threading to process video segments
+    # Get the number of CPU cores
+    num_cores = os.cpu_count()
+
+    # Use ThreadPoolExecutor to manage the threads
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_cores) as executor:
+        futures = []
+        for i in range(0, len(video_segments), 2):
+            if isinstance(video_segments[i], float):
+                start_time = _convert_seconds_to_timestamp(
+                    video_segments[i]  # type:ignore
+                )
+                end_time = _convert_seconds_to_timestamp(
+                    video_segments[i + 1]  # type:ignore
+                )
+            else:
+                start_time: str = video_segments[i]  # type:ignore
+                end_time: str = video_segments[i + 1]  # type:ignore
+            if start_time == end_time:
+                continue
+            output_file: Path = output_dir / f"{i // 2}{input_file.suffix}"
+            cut_videos.append(output_file)
+
+            # Submit the cut task to the executor
+            future = executor.submit(
+                cut, input_file, output_file, start_time, end_time, **othertags
+            )
+            futures.append(future)
+
+        # Optionally, wait for all futures to complete
+        concurrent.futures.wait(futures)
+
+    # Step 4: Sort the cut video paths by filename (index order)
+    cut_videos.sort(key=lambda video_file: int(video_file.stem))
+
+    # Step 5: Create input.txt for FFmpeg concatenation
+    input_txt_path: Path = create_merge_txt(cut_videos, output_dir / "input.txt")
+    return (cut_videos, input_txt_path)
+
+
+def _piece_owners(
+    pairs: Sequence[tuple[float, float]], piece_starts: Sequence[float]
+) -> list[list[int]]:
+    """Indexes of the pairs each piece starts in, pairs widened by SEGMENT_TIME_DELTA.
+
+    Empty pairs own nothing. The pairs are searched by start, so each piece only
+    walks the pairs overlapping it.
+    """
+    order: np.ndarray = np.array(
+        sorted(
+            (i for i, (start, end) in enumerate(pairs) if end > start),
+            key=lambda i: pairs[i][0],
+        ),
+        dtype=np.int64,
+    )
+    starts: np.ndarray = np.array(
+        [pairs[i][0] - SEGMENT_TIME_DELTA for i in order], dtype=np.float64
+    )
+    ends: np.ndarray = np.array(
+        [pairs[i][1] - SEGMENT_TIME_DELTA for i in order], dtype=np.float64
+    )
+    # Every pair before the first one reaching past a piece ends before it
+    reach: np.ndarray = np.maximum.accumulate(ends)
+    owners_of: list[list[int]] = []
+    for piece_start in piece_starts:
+        owners: list[int] = []
+        k: int = int(np.searchsorted(reach, piece_start, side="right"))
+        while k < len(order) and starts[k] <= piece_start:
+            if piece_start < ends[k]:
+                owners.append(int(order[k]))
+            k += 1
+        owners_of.append(sorted(owners))
+    return owners_of
+
+
+def _split_segments_single_pass(  # command
+    input_file: Path,
+    video_segments: Sequence[float],
+    output_dir: Path,
+    **othertags,
+) -> list[list[Path]]:
+    """Extract every (start, end) pair of video_segments with one segment muxer run.
+
+    The muxer can only split at keyframes, so the pairs are first widened to the
+    keyframes around them, like a stream copy of the pair would be. The input is
+    split at every boundary, pieces are mapped back to the pairs by their start
+    time and pieces outside of any pair are deleted.
+
+    Raises:
+        ValueError: If a non empty pair gets no piece.
+
+    Returns:
+        list[list[Path]]: the pieces of each pair in order
+    """
+    requested: list[tuple[float, float]] = [
+        (video_segments[i], video_segments[i + 1])
+        for i in range(0, len(video_segments), 2)
+    ]
+    segment_files: list[list[Path]] = [[] for _ in requested]
+    if not any(end > start for start, end in requested):
+        return segment_files
+
+    # Pairs within one GOP would fall between two split points and get nothing.
+    # The tolerance keeps times truncated to milliseconds on their keyframe.
+    snapped: Intervals = (
+        Intervals(requested)
+        .pad(-SMART_CUT_TOLERANCE, -SMART_CUT_TOLERANCE)
+        .snap_to_keyframes(probe_keyframe_index(input_file))
+    )
+    pairs: list[tuple[float, float]] = [
+        snapped_pair if end > start else (start, end)
+        for (start, end), snapped_pair in zip(requested, snapped)
+    ]
+    boundaries: list[float] = sorted({t for pair in pairs for t in pair if t > 0})
+    segment_list: Path = output_dir / "segments.csv"
+    output_kwargs: dict = (
+        {
+            "i": input_file,
+            "map": 0,
+            "c:v": "copy",
+            "c:a": "copy",
+            "f": "segment",
+            "segment_times": ",".join(map(str, boundaries)),
+            "segment_time_delta": SEGMENT_TIME_DELTA,
+            "segment_list": segment_list,
+            "segment_list_type": "csv",
+            "reset_timestamps": 1,
+        }
+        | othertags
+        | {"y": output_dir / f"piece_%05d{input_file.suffix}"}
+    )
+    logger.info(
+        f"Split {input_file.name} into {len(pairs)} segments with {output_kwargs = }"
+    )
+    _ffmpeg(**output_kwargs)
+
+    with open(segment_list, newline="", encoding="utf-8") as f:
+        pieces: list[list[str]] = list(csv.reader(f))
+    os.remove(segment_list)
+
+    owners_of: list[list[int]] = _piece_owners(
+        pairs, [float(start) for _, start, _ in pieces]
+    )
+    for (name, _, _), owners in zip(pieces, owners_of):
+        piece: Path = output_dir / name
+        if not owners:
+            os.remove(piece)
+            continue
+        segment_files[owners[0]].append(piece)
+        # Widened pairs can share a GOP, every pair gets a file it may re-encode
+        for i in owners[1:]:
+            shared: Path = piece.with_stem(f"{piece.stem}_{i}")
+            shutil.copyfile(piece, shared)
+            segment_files[i].append(shared)
+
+    for i, (start, end) in enumerate(requested):
+        if end > start and not segment_files[i]:
+            raise ValueError(
+                f"No piece of {input_file.name} covers the segment from {start} to {end}."
+            )
+    return segment_files
+
+
+@_traced
+def _extract_segments(
+    input_file: Path,
+    video_segments: Sequence[float] | Sequence[str],
+    output_dir: Path,
+    backend: ExtractBackend | None = None,
+    **othertags,
+) -> list[list[Path]]:
+    """Stream copy every (start, end) pair of video_segments into output_dir.
+
+    Args:
+        backend (ExtractBackend | None, optional): Defaults to DEFAULT_EXTRACT_BACKEND.
+
+    Returns:
+        list[list[Path]]: the files of each pair in order, empty for empty pairs
+    """
+    if len(video_segments) % 2 != 0:
+        raise ValueError(
+            "video_segments must contain an even number of elements (start and end times)."
+        )
+    backend = backend or DEFAULT_EXTRACT_BACKEND
+
+    if backend == ExtractBackend.SEGMENT_MUXER:
+        return _split_segments_single_pass(
+            input_file,
+            [
+                _convert_timestamp_to_seconds(s) if isinstance(s, str) else s
+                for s in video_segments
+            ],
+            output_dir,
+            **othertags,
+        )
+
+    cut_videos, input_txt_path = _split_segments_cut(
+        input_file, video_segments, output_dir, **othertags
+    )
+    os.remove(input_txt_path)
+    segment_files: list[list[Path]] = [[] for _ in range(len(video_segments) // 2)]
+    for video_path in cut_videos:
+        segment_files[int(video_path.stem)].append(video_path)
+    return segment_files
+
+
+def _plan_smart_cut(
+    start_time: float, end_time: float, keyframes: KeyframeIndex
+) -> list[tuple[float, float, bool]]:
+    """Split (start, end) into re-encoded edges and a stream copied GOP interior.
+
+    Returns:
+        list[tuple[float, float, bool]]: (start, end, copy) parts in order
+    """
+    first: float | None = keyframes.ceil(start_time - SMART_CUT_TOLERANCE)
+    last: float | None = keyframes.floor(end_time + SMART_CUT_TOLERANCE)
+    if first is None or last is None or first >= last:
+        return [(start_time, end_time, False)]
+    parts: list[tuple[float, float, bool]] = []
+    # Nothing precedes the first keyframe, so there is no head to re-encode
+    if first > start_time + SMART_CUT_TOLERANCE and first != keyframes[0]:
+        parts.append((start_time, first, False))
+    parts.append((first, last, True))
+    if end_time > last + SMART_CUT_TOLERANCE:
+        parts.append((last, end_time, False))
+    return parts
+
+
+def _create_smart_cut_encode_args(probe: dict[str, Any]) -> tuple[dict[str, Any], bool]:
+    """Encoder args matching the source so edges concat with copied packets.
+
+    The edges take the profile, level, pixel format, size, time base and reorder
+    delay of the video, and the sample rate, format and channels of the audio.
+    Audio is re-encoded too, a stream copied edge would start at the packet of
+    the keyframe before the cut.
+
+    Args:
+        probe (dict[str, Any]): the ffprobe streams and format of the source
+
+    Returns:
+        tuple[dict[str, Any], bool]: the args, and whether the codecs and
+            container are checked for stream copied GOPs between the edges
+    """
+    streams: list[dict[str, Any]] = probe["streams"]
+    video: dict[str, Any] | None = next(
+        (stream for stream in streams if stream["codec_type"] == "video"), None
+    )
+    audio: dict[str, Any] | None = next(
+        (stream for stream in streams if stream["codec_type"] == "audio"), None
+    )
+    container: str = probe["format"]["format_name"].split(",")[0]
+    args: dict[str, Any] = {}
+    copyable: bool = container in SMART_CUT_FORMATS
+    if video is not None:
+        if video["codec_name"] in SMART_CUT_VIDEO_ENCODERS:
+            args["c:v"] = SMART_CUT_VIDEO_ENCODERS[video["codec_name"]]
+        if int(video.get("bit_rate", 0)):
+            args["b:v"] = video["bit_rate"]
+        profile: str | None = _X264_PROFILES.get(video.get("profile", ""))
+        reorder_args: dict[str, Any] | None = _X264_REORDER_ARGS.get(
+            video.get("has_b_frames", 0)
+        )
+        copyable = (
+            copyable
+            and video["codec_name"] in SMART_CUT_VIDEO_ENCODERS
+            and profile is not None
+            and reorder_args is not None
+        )
+        if copyable:
+            args |= {
+                "profile:v": profile,
+                "pix_fmt": video["pix_fmt"],
+                "s": f"{video['width']}x{video['height']}",
+            } | reorder_args  # type: ignore
+            if video.get("level", 0) > 0:
+                args["level:v"] = f"{video['level'] / 10:g}"
+            if container == "mov":
+                args["video_track_timescale"] = video["time_base"].split("/")[1]
+    if audio is not None:
+        if audio["codec_name"] in SMART_CUT_AUDIO_ENCODERS:
+            args["c:a"] = SMART_CUT_AUDIO_ENCODERS[audio["codec_name"]]
+        args |= {
+            "ar": audio["sample_rate"],
+            "ac": audio["channels"],
+        }
+        if "sample_fmt" in audio:
+            args["sample_fmt"] = audio["sample_fmt"]
+        copyable = (
+            copyable
+            and audio["codec_name"] in SMART_CUT_AUDIO_ENCODERS
+            and audio.get("profile", "LC") == "LC"
+        )
+    return args, copyable
+
+
+def _reorder_delay(probe: dict[str, Any]) -> float:
+    """Seconds the DTS of the video run behind its PTS."""
+    video: dict[str, Any] | None = next(
+        (stream for stream in probe["streams"] if stream["codec_type"] == "video"),
+        None,
+    )
+    if video is None or not video.get("has_b_frames"):
+        return 0.0
+    numerator, denominator = video["r_frame_rate"].split("/")
+    return video["has_b_frames"] * int(denominator) / int(numerator)
+
+
+def _render_smart_cut_edge(
+    input_file: Path,
+    output_file: Path,
+    start_time: float,
+    end_time: float,
+    encode_args: dict[str, Any],
+) -> Path:
+    # Stop short of the keyframe at end_time, the copied GOPs start with it
+    _ffmpeg(
+        **(
+            {
+                "ss": start_time,
+                "to": end_time - SMART_CUT_TOLERANCE,
+                "i": input_file,
+            }
+            | encode_args
+            | {"y": output_file}
+        )
+    )
+    return output_file
+
+
+def create_smart_cut_txt(
+    input_file: Path,
+    video_segments: Sequence[float],
+    output_dir: Path,
+    keyframes: KeyframeIndex | None = None,
+    **othertags,
+) -> Path:
+    """Write a concat script for frame accurate cuts at near copy speed.
+
+    Only the partial GOPs at the edges of every (start, end) pair are re-encoded
+    with the stream parameters of the source, the GOPs in between are read from
+    input_file through inpoint/outpoint. Sources whose codecs or container are
+    not in SMART_CUT_VIDEO_ENCODERS, SMART_CUT_AUDIO_ENCODERS and
+    SMART_CUT_FORMATS have every pair re-encoded instead.
+    """
+    probe: dict[str, Any] = _probe_streams(input_file)
+    encode_args, copyable = _create_smart_cut_encode_args(probe)
+    encode_args |= othertags
+    reorder_delay: float = _reorder_delay(probe)
+    if not copyable:
+        logger.warning(
+            f"Smart cut of {input_file.name} re-encodes every segment, its codecs or container are not checked for stream copy"
+        )
+    elif keyframes is None:
+        keyframes = probe_keyframe_index(input_file)
+    plan: Callable[[float, float], list[tuple[float, float, bool]]] = (
+        partial(_plan_smart_cut, keyframes=keyframes)
+        if copyable
+        else lambda start_time, end_time: [(start_time, end_time, False)]
+    )
+
+    parts: list[tuple[float, float, bool]] = [
+        part
+        for i in range(0, len(video_segments), 2)
+        if video_segments[i + 1] > video_segments[i]
+        for part in plan(video_segments[i], video_segments[i + 1])
+    ]
+    edges: dict[int, Path] = {
+        i: output_dir / f"edge_{i}{input_file.suffix}"
+        for i, (_, _, copy) in enumerate(parts)
+        if not copy
+    }
+    logger.info(
+        f"Smart cut {input_file.name}: {len(parts) - len(edges)} copied, {len(edges)} re-encoded parts"
+    )
+    _run_in_order(
+        [
+            partial(
+                _render_smart_cut_edge,
+                input_file,
+                edge,
+                parts[i][0],
+                parts[i][1],
+                encode_args,
+            )
+            for i, edge in edges.items()
+        ]
+    )
+
+    output_txt: Path = output_dir / "input.txt"
+    quoted_input: str = _quote_concat_path(input_file.resolve())
+    with open(output_txt, "w", encoding="utf-8") as f:
+        for i, (start_time, end_time, copy) in enumerate(parts):
+            if not copy:
+                f.write(f"file {_quote_concat_path(edges[i])}\n")
+                continue
+            # The outpoint is compared with DTS, so the keyframe closing the
+            # GOPs would be copied too, duration keeps the next part in place
+            f.write(f"file {quoted_input}\n")
+            f.write(f"inpoint {start_time}\n")
+            f.write(f"outpoint {end_time - reorder_delay}\n")
+            f.write(f"duration {end_time - start_time}\n")
+    return output_txt
+
+
+def _keep_by_inpoints(
+    input_file: Path,
+    output_file: Path,
+    temp_output_file: Path,
+    video_segments: Sequence[float] | Sequence[str],
+    smart: bool = False,
+) -> int:
+    """Mux the (start, end) pairs of video_segments into output_file in one pass.
+
+    The concat demuxer reads the pairs from input_file through inpoint/outpoint,
+    so no segment file is written and peak disk usage is the output size. With
+    smart, the partial GOPs at the edges are re-encoded for frame accurate cuts.
+    """
+    seconds: list[float] = [
+        _convert_timestamp_to_seconds(s) if isinstance(s, str) else s
+        for s in video_segments
+    ]
+    try:
+        with scratch_dir() as temp_dir:
+            input_txt_path: Path = (
+                create_smart_cut_txt(input_file, seconds, temp_dir)
+                if smart
+                else create_inpoint_txt(input_file, seconds, temp_dir / "input.txt")
+            )
+            merge(input_txt_path, temp_output_file)
+            temp_output_file.replace(output_file)
+    except Exception as e:
+        logger.error(
+            f"Failed to {_methods.KEEP_OR_REMOVE} for {input_file}. Error: {e}"
+        )
+        return 1
+    return 0
+
+
+def _rerender_segment(
+    seg_output_file: Path, further_args: dict[str, str]
+) -> list[Path]:
+    """Re-encode a cut segment in place with further_args."""
+    temp_seg: Path = seg_output_file.parent / (
+        seg_output_file.stem + "_temp_seg" + seg_output_file.suffix
+    )
+    full_args = _create_full_args(
+        input_file=seg_output_file,
+        output_file=temp_seg,
+        **further_args,  # type:ignore
+    )
+    _ffmpeg(**full_args)
+    temp_seg.replace(seg_output_file)
+    return [seg_output_file]
+
 
-    # Step 1: Validate input
-    if len(video_segments) % 2 != 0:
-        raise ValueError(
-            "video_segments must contain an even number of elements (start and end times)."
-        )
+def _rerender_segment_files(
+    seg_output_files: list[Path], further_args: dict[str, str] | None
+) -> list[Path]:
+    """Re-encode the pieces of a segment in place if further_args are given."""
+    if further_args:
+        for seg_output_file in seg_output_files:
+            _rerender_segment(seg_output_file, further_args)
+    return seg_output_files
 
-    # Step 2: Create a temporary folder for storing cut videos
-    if output_dir is None:
-        output_dir = input_file.parent / f"{input_file.stem}_segments"
-    cut_videos: list[Path] = []  # List to store paths of cut video segments
 
-    # Step 3: Use threading to process video segments
-    # Get the number of CPU cores
-    num_cores = os.cpu_count()
+def _checkpoint_segment(
+    job: Job, idx: int, render: Callable[[], list[Path]]
+) -> list[Path]:
+    """Render segment idx of job and record its files in the job manifest."""
+    with tracing.span("segment", "ffmpeg_converter", index=idx) as segment_span:
+        files: list[Path] = job.complete(idx, render())
+        if segment_span:
+            segment_span.set(bytes=sum(file.stat().st_size for file in files))
+    return files
 
-    # Use ThreadPoolExecutor to manage the threads
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_cores) as executor:
-        futures = []
-        for i in range(0, len(video_segments), 2):
-            if isinstance(video_segments[i], float):
-                start_time = _convert_seconds_to_timestamp(
-                    video_segments[i]  # type:ignore
-                )
-                end_time = _convert_seconds_to_timestamp(
-                    video_segments[i + 1]  # type:ignore
-                )
-            else:
-                start_time: str = video_segments[i]  # type:ignore
-                end_time: str = video_segments[i + 1]  # type:ignore
-            if start_time == end_time:
-                continue
-            output_file: Path = output_dir / f"{i // 2}{input_file.suffix}"
-            cut_videos.append(output_file)
 
-            # Submit the cut task to the executor
-            future = executor.submit(
-                cut, input_file, output_file, start_time, end_time, **othertags
-            )
-            futures.append(future)
+def _cut_segment(
+    input_file: Path,
+    seg_output_file: Path,
+    start_time: str,
+    end_time: str,
+    further_args: dict[str, str] | None,
+) -> list[Path]:
+    """Cut one segment and re-encode it with further_args if given."""
+    cut(input_file, seg_output_file, start_time, end_time)
+    if further_args:
+        _rerender_segment(seg_output_file, further_args)
+    return [seg_output_file]
 
-        # Optionally, wait for all futures to complete
-        concurrent.futures.wait(futures)
 
-    # Step 4: Sort the cut video paths by filename (index order)
-    cut_videos.sort(key=lambda video_file: int(video_file.stem))
+def _run_in_order[T](
+    tasks: Sequence[Callable[[], T]], max_workers: int | None = None
+) -> list[T]:
+    """Run tasks concurrently and return their results in submission order.
 
-    # Step 5: Create input.txt for FFmpeg concatenation
-    input_txt_path: Path = output_dir / "input.txt"
-    with open(input_txt_path, "w") as f:
-        for video_path in cut_videos:
-            f.write(f"file '{video_path}'\n")
-    return (cut_videos, input_txt_path)
+    The first failing task re-raises its exception once the pool has shut down.
+    """
+    if not tasks:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers or os.cpu_count()
+    ) as executor:
+        # Keep the caller's job priority in the worker threads
+        futures: list[concurrent.futures.Future[T]] = [
+            executor.submit(contextvars.copy_context().run, task) for task in tasks
+        ]
+        return [future.result() for future in futures]
 
 
+@_traced
 def keep_or_remove_by_cuts(
     input_file: Path,
     output_file: Path | None,
     video_segments: Sequence[str] | Sequence[float],
     keep_handle: bool = True,  # True means keep, False means remove
+    backend: ExtractBackend | None = None,
 ):
     if output_file is None:
         output_file = input_file.parent / (
@@ -812,9 +2589,6 @@ def keep_or_remove_by_cuts(
     )
     logger.info(f"{_methods.KEEP_OR_REMOVE} {input_file.name} to {output_file.name}")
 
-    # Step 0: Create a temporary folder for storing cut videos
-    temp_dir: Path = Path(tempfile.mkdtemp())
-
     # Step 1:convert video segments if needed
     video_segments = deque(
         _convert_timestamp_to_seconds(s) if isinstance(s, str) else s
@@ -826,38 +2600,93 @@ def keep_or_remove_by_cuts(
         video_segments.appendleft(0.0)
         video_segments.append(probe_duration(input_file))
 
-    # Step 3: Cut the video into segments based on the provided start and end times
-    cut_videos: Sequence[Path]
-    input_txt_path: Path
-    cut_videos, input_txt_path = _split_segments_cut(
-        input_file,
-        video_segments,
-        temp_dir,
-    )
+    backend = backend or DEFAULT_EXTRACT_BACKEND
+    if backend in (ExtractBackend.CONCAT, ExtractBackend.SMART):
+        return _keep_by_inpoints(
+            input_file,
+            output_file,
+            temp_output_file,
+            list(video_segments),
+            smart=backend == ExtractBackend.SMART,
+        )
 
-    # Step 4: Merge the kept segments
-    try:
-        merge(input_txt_path, temp_output_file)
-        temp_output_file.replace(output_file)
-        # Step 5: Clean up temporary files
-        for video_path in cut_videos:
-            os.remove(video_path)
-        os.remove(input_txt_path)
-        os.rmdir(temp_dir)
-    except Exception as e:
-        logger.error(
-            f"Failed to {_methods.KEEP_OR_REMOVE} for {input_file}. Error: {e}"
+    # Step 0: Create a temporary folder for storing cut videos, removed on exit
+    with scratch_dir() as temp_dir:
+        # Step 3: Cut the video into segments based on the provided start and end times
+        segment_files: list[list[Path]] = _extract_segments(
+            input_file, list(video_segments), temp_dir, backend
         )
-        return 1
+        input_txt_path: Path = create_merge_txt(
+            list(chain.from_iterable(segment_files)), temp_dir / "input.txt"
+        )
+
+        # Step 4: Merge the kept segments
+        try:
+            merge(input_txt_path, temp_output_file)
+            temp_output_file.replace(output_file)
+        except Exception as e:
+            logger.error(
+                f"Failed to {_methods.KEEP_OR_REMOVE} for {input_file}. Error: {e}"
+            )
+            return 1
     return 0
 
 
+def _select_pieces(
+    video_segments: Sequence[str] | Sequence[float],
+    total_duration: float,
+    odd_args: None | dict[str, str],
+    even_args: None | dict[str, str] = None,
+) -> tuple[list[str], list[dict[str, str] | None]]:
+    """Split 0 to total_duration at the segments and keep the pieces with args.
+
+    Returns:
+        tuple[list[str], list[dict[str, str] | None]]: (flat timestamps of the kept pieces, their args)
+    """
+    # Step 1: pieces alternate between a gap and a segment, from 0 to the end
+    boundaries: list[float | str] = [0.0, *video_segments, total_duration]
+    given: list[int] = [i for i, b in enumerate(boundaries) if isinstance(b, str)]
+    seconds: np.ndarray = np.array(
+        [
+            _convert_timestamp_to_seconds(b) if isinstance(b, str) else b
+            for b in boundaries
+        ],
+        dtype=np.float64,
+    )
+    pieces: Intervals = Intervals(np.column_stack((seconds[:-1], seconds[1:])))
+
+    # Step 2: Select the pieces to keep and their further args
+    is_gap: np.ndarray = np.arange(len(pieces)) % 2 == 0
+    # Pieces within one second are too short to cut
+    selected: np.ndarray = np.floor(pieces.starts) != np.floor(pieces.ends)
+    if even_args is None:
+        selected &= ~is_gap
+    if odd_args is None:
+        selected &= is_gap
+    kept: np.ndarray = np.flatnonzero(selected)
+    segment_args: list[dict[str, str] | None] = [
+        even_args if gap else odd_args for gap in is_gap[kept].tolist()
+    ]
+
+    # Step 3: timestamps of the kept pieces, given timestamps are kept as they are
+    selected_segments: list[str] = Intervals(pieces.bounds[kept]).timestamps()
+    if given:
+        kept_boundaries: np.ndarray = (kept[:, None] + [0, 1]).ravel()
+        for k in np.flatnonzero(np.isin(kept_boundaries, given)).tolist():
+            selected_segments[k] = boundaries[kept_boundaries[k]]  # type: ignore
+    return selected_segments, segment_args
+
+
+@_traced
 def advanced_keep_or_remove_by_cuts(
     input_file: Path,
     output_file: Path | None,
     video_segments: Sequence[str] | Sequence[float],
     odd_args: None | dict[str, str],  # For segments
     even_args: None | dict[str, str] = None,  # For other segments
+    total_duration: float | None = None,
+    backend: ExtractBackend | None = None,
+    max_workers: int | None = None,  # Defaults to the number of CPU cores
 ):
     if output_file is None:
         output_file = input_file.parent / (
@@ -870,91 +2699,102 @@ def advanced_keep_or_remove_by_cuts(
         f"{_methods.KEEP_OR_REMOVE} {input_file.name} to {output_file.name} with {odd_args = } ,{even_args = }."
     )
 
-    # Step 1:convert video segments if needed and double them
-    video_segments = deque(
-        _convert_seconds_to_timestamp(s) if isinstance(s, (float, int)) else s
-        for o in video_segments
-        for s in (o, o)
-    )  # type: ignore
-
-    # Step 2: create a full segment list
-    video_segments.appendleft("00:00:00.000")  # type: ignore
-    video_segments.append(_convert_seconds_to_timestamp(probe_duration(input_file)))  # type: ignore
-
-    # Use ThreadPoolExecutor to manage the threads
-    temp_dir: Path = Path(tempfile.mkdtemp())
-    num_cores = os.cpu_count()
-    cut_videos = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_cores) as executor:
-        futures = []
-        for i in range(0, len(video_segments), 2):
-            if even_args is None and i % 4 == 0:
-                continue
-            if odd_args is None and i % 4 == 2:
-                continue
-            start_time: str = video_segments[i]  # type:ignore
-            end_time: str = video_segments[i + 1]  # type:ignore
-            if start_time[:8] == end_time[:8]:
-                continue
-            seg_output_file = temp_dir / f"{i}{input_file.suffix}"
-            cut_videos.append(seg_output_file)
-
-            # Submit the cut task to the executor
-            future = executor.submit(
-                cut, input_file, seg_output_file, start_time, end_time
-            )
-            futures.append(future)  # Store the future for tracking
-            future.result()  # Ensures `cut` completes before proceeding
-
-            further_args = even_args if i % 4 == 0 else odd_args
-
-            if not further_args:
-                continue
+    # Step 1 to 3: the gaps and segments to keep and their further args
+    if total_duration is None:
+        total_duration = probe_duration(input_file)
+    selected_segments, segment_args = _select_pieces(
+        video_segments, total_duration, odd_args, even_args
+    )
 
-            # Create full args for further editing
-            temp_seg = seg_output_file.parent / (
-                seg_output_file.stem + "_temp_seg" + seg_output_file.suffix
-            )
-            full_args = _create_full_args(
-                input_file=seg_output_file,
-                output_file=temp_seg,
-                **further_args,  # type:ignore
+    # Step 4: Cut the segments and apply further editing
+    backend = backend or DEFAULT_EXTRACT_BACKEND
+    if backend in (ExtractBackend.CONCAT, ExtractBackend.SMART):
+        if not any(segment_args):
+            return _keep_by_inpoints(
+                input_file,
+                output_file,
+                temp_output_file,
+                selected_segments,
+                smart=backend == ExtractBackend.SMART,
             )
-
-            future = executor.submit(_ffmpeg, **full_args)
-            futures.append(future)  # Store the future for tracking
-            future.result()  # Ensures `cut` completes before proceeding
-            temp_seg.replace(seg_output_file)
-
-        # Optionally, wait for all futures to complete
-        # concurrent.futures.wait(futures)
-
-    # Step 4: Sort the cut video paths by filename (index order)
-    cut_videos.sort(key=lambda video_file: int(video_file.stem))
-
-    # Step 5: Create input.txt for FFmpeg concatenation
-    input_txt_path: Path = temp_dir / "input.txt"
-    with open(input_txt_path, "w") as f:
-        for video_path in cut_videos:
-            f.write(f"file '{video_path}'\n")
-
-    # Step 4: Merge the kept segments
+        # Re-encoded segments need files of their own
+        backend = ExtractBackend.SEGMENT_MUXER
+    # Segments completed by an interrupted run of the same job are reused
+    job: Job = open_job(
+        input_file,
+        _methods.KEEP_OR_REMOVE,
+        {"segments": selected_segments, "args": segment_args, "backend": backend},
+    )
     try:
-        merge(input_txt_path, temp_output_file)
-        temp_output_file.replace(output_file)
-        # Step 5: Clean up temporary files
-        for video_path in cut_videos:
-            os.remove(video_path)
-        os.remove(input_txt_path)
-        os.rmdir(temp_dir)
-    except Exception as e:
-        logger.error(
-            f"Failed to {_methods.KEEP_OR_REMOVE} for {input_file}. Error: {e}"
+        missing: list[int] = [
+            j for j in range(len(segment_args)) if job.files(j) is None
+        ]
+        pending_dir: Path = job.dir / "pending"
+        shutil.rmtree(pending_dir, ignore_errors=True)
+        pending_dir.mkdir()
+        tasks: list[Callable[[], list[Path]]] = []
+        if backend == ExtractBackend.PER_SEGMENT:
+            # Cut and re-encode of a segment are chained in one task
+            for j in missing:
+                tasks.append(
+                    partial(
+                        _checkpoint_segment,
+                        job,
+                        j,
+                        partial(
+                            _cut_segment,
+                            input_file,
+                            pending_dir / f"{j}{input_file.suffix}",
+                            selected_segments[2 * j],
+                            selected_segments[2 * j + 1],
+                            segment_args[j],
+                        ),
+                    )
+                )
+        elif missing:
+            segment_files: list[list[Path]] = _extract_segments(
+                input_file,
+                [selected_segments[2 * j + k] for j in missing for k in (0, 1)],
+                pending_dir,
+                backend,
+            )
+            for j, seg_output_files in zip(missing, segment_files):
+                tasks.append(
+                    partial(
+                        _checkpoint_segment,
+                        job,
+                        j,
+                        partial(
+                            _rerender_segment_files, seg_output_files, segment_args[j]
+                        ),
+                    )
+                )
+        _run_in_order(tasks, max_workers)
+        cut_videos: list[Path] = list(
+            chain.from_iterable(job.files(j) or [] for j in range(len(segment_args)))
         )
-        return 1
+
+        # Step 5: Create input.txt for FFmpeg concatenation
+        input_txt_path: Path = create_merge_txt(cut_videos, job.dir / "input.txt")
+
+        # Step 6: Merge the kept segments
+        try:
+            merge(input_txt_path, temp_output_file)
+            temp_output_file.replace(output_file)
+            # Step 7: Clean up the job, a failed run keeps it to resume from
+            with tracing.span("cleanup", "ffmpeg_converter"):
+                job.finish()
+        except Exception as e:
+            logger.error(
+                f"Failed to {_methods.KEEP_OR_REMOVE} for {input_file}. Error: {e}"
+            )
+            return 1
+    finally:
+        job.close()
     return 0
 
 
+@_traced
 def cut_silence(
     input_file: Path,
     output_file: Path | None = None,
@@ -963,6 +2803,11 @@ def cut_silence(
     seg_min_duration: float = 0,
     odd_args: dict[str, str] | None = None,
     even_args: dict[str, str] | None = None,
+    analysis_mode: AnalysisMode = AnalysisMode.SILENCEDETECT,
+    backend: ExtractBackend | None = None,
+    max_workers: int | None = None,
+    keep_on: KeepOn = KeepOn.SOUND,
+    motion_kwargs: dict[str, Any] | None = None,
 ) -> int | Enum:
     class error_code(Enum):
         DURATION_LESS_THAN_ZERO = auto()
@@ -984,20 +2829,31 @@ def cut_silence(
         output_file.stem + "_processing" + output_file.suffix
     )
     logger.info(
-        f"{_methods.CUT_SILENCE} {input_file} to {output_file} with {dB = } ,{sl_duration = }, {seg_min_duration = }."
+        f"{_methods.CUT_SILENCE} {input_file} to {output_file} with {dB = } ,{sl_duration = }, {seg_min_duration = }, {keep_on = }."
     )
 
-    non_silence_segments: Sequence[float]
-    total_duration: float
-    non_silence_segments, total_duration, _ = probe_non_silence(
-        input_file, dB, sl_duration
+    analysis: MediaAnalysis = analyze_media(
+        input_file, dB, sl_duration, mode=analysis_mode
     )
+    total_duration: float = analysis["total_duration"]
+
+    kept_segments: Sequence[float] = analysis["non_silence_segs"]
+    if keep_on != KeepOn.SOUND:
+        motion_segments, _, _ = probe_motion(input_file, **(motion_kwargs or {}))
+        kept_segments = (
+            motion_segments
+            if keep_on == KeepOn.MOTION
+            else _merge_overlapping_segments([*kept_segments, *motion_segments])
+        )
 
-    adjusted_segments: Sequence[float] = _adjust_segments_to_keyframes(
-        _ensure_minimum_segment_length(
-            non_silence_segments, seg_min_duration, total_duration
-        ),
-        _probe_keyframe(input_file),
+    non_silence_segments: Sequence[float] = _ensure_minimum_segment_length(
+        kept_segments, seg_min_duration, total_duration
+    )
+    # Smart cuts are frame accurate, the others are bound to keyframes
+    adjusted_segments: Sequence[float] = (
+        non_silence_segments
+        if backend == ExtractBackend.SMART
+        else _adjust_segments_to_keyframes(non_silence_segments, analysis["keyframes"])
     )
 
     merged_overlapping_segments: Sequence[float] = _merge_overlapping_segments(
@@ -1014,6 +2870,9 @@ def cut_silence(
             video_segments=merged_overlapping_segments,
             odd_args=odd_args,
             even_args=even_args,
+            total_duration=total_duration,
+            backend=backend,
+            max_workers=max_workers,
         )
         temp_output_file.replace(output_file)
 
@@ -1036,11 +2895,203 @@ def _create_cut_sl_filter_tempfile(
     return path
 
 
+def _create_cut_sl_filter_scripts(
+    non_silence_segments: Sequence[float],
+    video_filters: str = "",
+    audio_filters: str = "",
+) -> tuple[Path, Path]:
+    """Write the select/aselect filter scripts keeping non_silence_segments.
+
+    video_filters and audio_filters are chained after the selection.
+    """
+    timestamp: str = time.strftime("%Y%m%d-%H%M%S")
+    video_filter_info: list[str] = [
+        "select='",
+        "', setpts=N/FRAME_RATE/TB" + (f",{video_filters}" if video_filters else ""),
+        f"temp_{timestamp}_video_filter_",
+    ]
+    audio_filter_info: list[str] = [
+        "aselect='",
+        "', asetpts=N/SR/TB" + (f",{audio_filters}" if audio_filters else ""),
+        f"temp_{timestamp}_audio_filter_",
+    ]
+    return (
+        _create_cut_sl_filter_tempfile(video_filter_info, non_silence_segments),
+        _create_cut_sl_filter_tempfile(audio_filter_info, non_silence_segments),
+    )
+
+
+def _create_trim_concat_graph(
+    video_segments: Sequence[float], offset: float = 0.0, has_audio: bool = True
+) -> str:
+    """Filter graph keeping the (start, end) pairs with trim/atrim + concat.
+
+    Every frame only meets the trims of its own batch, so the per-frame cost is
+    bounded by the batch size instead of the total number of intervals.
+    """
+    n: int = len(video_segments) // 2
+    streams: list[tuple[str, str, str]] = [("v", "", "split")]
+    if has_audio:
+        streams.append(("a", "a", "asplit"))
+
+    lines: list[str] = []
+    for kind, prefix, split in streams:
+        lines.append(
+            f"[0:{kind}]{split}={n}" + "".join(f"[{kind}{i}]" for i in range(n)) + ";"
+        )
+        for i in range(n):
+            start_time: float = max(video_segments[2 * i] - offset, 0.0)
+            end_time: float = video_segments[2 * i + 1] - offset
+            lines.append(
+                f"[{kind}{i}]{prefix}trim=start={start_time}:end={end_time},"
+                f"{prefix}setpts=PTS-STARTPTS[{kind}t{i}];"
+            )
+    lines.append(
+        "".join(
+            "".join(f"[{kind}t{i}]" for kind, _, _ in streams) for i in range(n)
+        )
+        + f"concat=n={n}:v=1:a={int(has_audio)}"
+        + ("[v][a]" if has_audio else "[v]")
+    )
+    return "\n".join(lines)
+
+
+def _rerender_by_trim_concat(
+    input_file: Path,
+    output_file: Path,
+    video_segments: Sequence[float],
+    has_audio: bool = True,
+    batch_size: int = RERENDER_BATCH_SIZE,
+    **othertags,
+) -> None:
+    """Render the kept pairs in seeked batches and stream copy them together.
+
+    Rendered batches are checkpointed, a rerun after a failure only renders the
+    missing ones.
+    """
+    pairs: list[tuple[float, float]] = [
+        (video_segments[i], video_segments[i + 1])
+        for i in range(0, len(video_segments), 2)
+        if video_segments[i + 1] > video_segments[i]
+    ]
+    job: Job = open_job(
+        input_file,
+        _methods.RERENDER_SEGMENTS,
+        {"segments": pairs, "batch_size": batch_size, "args": othertags},
+    )
+    temp_dir: Path = job.dir / "pending"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    temp_dir.mkdir()
+
+    def render_batch(index: int, batch: list[tuple[float, float]]) -> list[Path]:
+        batch_start: float = batch[0][0]
+        graph_script: Path = temp_dir / f"{index}.txt"
+        graph_script.write_text(
+            _create_trim_concat_graph(
+                [t for pair in batch for t in pair], batch_start, has_audio
+            ),
+            encoding="utf-8",
+        )
+        batch_file: Path = temp_dir / f"{index}{output_file.suffix}"
+        _run_ffmpeg(
+            FFmpegCommand(y="")
+            .input(input_file, hwaccel="auto", ss=batch_start, to=batch[-1][1])
+            .filter_complex(graph_script, script=True)
+            .output(
+                batch_file, {"map": ["[v]", "[a]"] if has_audio else ["[v]"]} | othertags
+            )
+        )
+        return [batch_file]
+
+    try:
+        batches: list[list[tuple[float, float]]] = [
+            pairs[i : i + batch_size] for i in range(0, len(pairs), batch_size)
+        ]
+        _run_in_order(
+            [
+                partial(
+                    _checkpoint_segment, job, j, partial(render_batch, j, batch)
+                )
+                for j, batch in enumerate(batches)
+                if job.files(j) is None
+            ]
+        )
+        batch_files: list[Path] = [
+            file for j in range(len(batches)) for file in job.files(j) or []
+        ]
+        merge(create_merge_txt(batch_files, job.dir / "input.txt"), output_file)
+        job.finish()
+    finally:
+        job.close()
+
+
+def _rerender_by_between(
+    input_file: Path,
+    output_file: Path,
+    video_segments: Sequence[float],
+    **othertags,
+) -> None:
+    video_filter_script, audio_filter_script = _create_cut_sl_filter_scripts(
+        video_segments
+    )
+    output_kwargs: dict = (
+        {
+            "i": input_file,
+            "filter_script:v": video_filter_script,
+            "filter_script:a": audio_filter_script,
+        }
+        | othertags
+        | {"y": output_file}
+    )
+    try:
+        _ffmpeg(**output_kwargs)
+    finally:
+        os.remove(video_filter_script)
+        os.remove(audio_filter_script)
+
+
+@_traced
+def rerender_segments(  # command
+    input_file: Path,
+    output_file: Path,
+    video_segments: Sequence[float],
+    graph: RerenderGraph | None = None,
+    has_audio: bool = True,
+    **othertags,
+) -> None:
+    """Re-encode the (start, end) pairs of video_segments into output_file.
+
+    Args:
+        graph (RerenderGraph | None, optional): Defaults to BETWEEN up to
+            RERENDER_BETWEEN_MAX_INTERVALS intervals, TRIM_CONCAT above.
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg failed
+    """
+    if graph is None:
+        graph = (
+            RerenderGraph.BETWEEN
+            if len(video_segments) // 2 <= RERENDER_BETWEEN_MAX_INTERVALS
+            else RerenderGraph.TRIM_CONCAT
+        )
+    logger.info(
+        f"Rerender {len(video_segments) // 2} segments of {input_file.name} to {output_file.name} with {graph = }"
+    )
+    if graph == RerenderGraph.BETWEEN:
+        _rerender_by_between(input_file, output_file, video_segments, **othertags)
+    else:
+        _rerender_by_trim_concat(
+            input_file, output_file, video_segments, has_audio, **othertags
+        )
+
+
+@_traced
 def cut_silence_rerender(  # command
     input_file: Path,
     output_file: Path | None = None,
     dB: int = -30,
     sl_duration: float = 0.2,
+    graph: RerenderGraph | None = None,
     **othertags: EncodeKwargs,
 ) -> int:
     if sl_duration <= 0:
@@ -1055,27 +3106,74 @@ def cut_silence_rerender(  # command
         output_file.stem + "_processing" + output_file.suffix
     )
 
-    non_silence_segments: Sequence[float] = probe_non_silence(
-        input_file, dB, sl_duration
-    )[0]
+    analysis: MediaAnalysis = analyze_media(
+        input_file, dB, sl_duration, keyframes=False
+    )
+    has_audio: bool = any(
+        stream["codec_type"] == "audio" for stream in analysis["streams"]
+    )
 
-    class CSFiltersInfo(Enum):
-        VIDEO = [
-            "select='",
-            "', setpts=N/FRAME_RATE/TB",
-            f"temp_{time.strftime("%Y%m%d-%H%M%S")}_video_filter_",
-        ]
-        AUDIO = [
-            "aselect='",
-            "', asetpts=N/SR/TB",
-            f"temp_{time.strftime("%Y%m%d-%H%M%S")}_audio_filter_",
-        ]
+    logger.info(
+        f"{_methods.CUT_SILENCE} {input_file.name} to {output_file.name} with {othertags = }"
+    )
+    try:
+        rerender_segments(
+            input_file,
+            temp_output_file,
+            analysis["non_silence_segs"],
+            graph,
+            has_audio,
+            **othertags,
+        )
+        temp_output_file.replace(output_file)
+    except Exception as e:
+        logger.error(f"Failed to cut silence for {input_file}. Error: {e}")
+        return 2
+    return 0
+
+
+@_traced
+def cut_silence_speedup(  # command
+    input_file: Path,
+    output_file: Path | None = None,
+    multiple: float = 2,
+    dB: int = -35,
+    sl_duration: float = 0.2,
+    seg_min_duration: float = 0,
+    analysis_mode: AnalysisMode = AnalysisMode.SILENCEDETECT,
+    **othertags: EncodeKwargs,
+) -> int:
+    """Cut silence and speed up in one filter graph, so the video is encoded once.
+
+    Returns:
+        int: 0 on success, 1 on invalid arguments, 2 if ffmpeg failed
+    """
+    if sl_duration <= 0 or multiple <= 0:
+        logger.error(f"Duration and speedup factor must be greater than 0.")
+        return 1
+
+    if output_file is None:
+        output_file = input_file.parent / (
+            input_file.stem + "_" + _methods.CUT_SILENCE_SPEEDUP + input_file.suffix
+        )
+    temp_output_file: Path = output_file.parent / (
+        output_file.stem + "_processing" + output_file.suffix
+    )
 
-    video_filter_script: Path = _create_cut_sl_filter_tempfile(
-        CSFiltersInfo.VIDEO.value, non_silence_segments
+    analysis: MediaAnalysis = analyze_media(
+        input_file, dB, sl_duration, keyframes=False, mode=analysis_mode
     )
-    audio_filter_script: Path = _create_cut_sl_filter_tempfile(
-        CSFiltersInfo.AUDIO.value, non_silence_segments
+    non_silence_segments: Sequence[float] = _ensure_minimum_segment_length(
+        analysis["non_silence_segs"], seg_min_duration, analysis["total_duration"]
+    )
+
+    speedup_args: dict[str, str] = (
+        _create_speedup_args(multiple) if multiple != 1 else {}
+    )
+    video_filter_script, audio_filter_script = _create_cut_sl_filter_scripts(
+        non_silence_segments,
+        speedup_args.pop("vf", ""),
+        speedup_args.pop("af", ""),
     )
 
     output_kwargs: dict = (
@@ -1084,20 +3182,24 @@ def cut_silence_rerender(  # command
             "filter_script:v": video_filter_script,
             "filter_script:a": audio_filter_script,
         }
+        | speedup_args
         | othertags
         | {"y": temp_output_file}
     )
     logger.info(
-        f"{_methods.CUT_SILENCE} {input_file.name} to {output_file.name} with {output_kwargs = }"
+        f"{_methods.CUT_SILENCE_SPEEDUP} {input_file.name} to {output_file.name} with {output_kwargs = }"
     )
     try:
         _ffmpeg(**output_kwargs)
-        os.remove(video_filter_script)
-        os.remove(audio_filter_script)
         temp_output_file.replace(output_file)
     except Exception as e:
-        logger.error(f"Failed to cut silence for {input_file}. Error: {e}")
+        logger.error(
+            f"Failed to cut silence and speed up {input_file}. Error: {e}"
+        )
         return 2
+    finally:
+        os.remove(video_filter_script)
+        os.remove(audio_filter_script)
     return 0
 
 
@@ -1144,11 +3246,13 @@ def _split_segments(  # command
     return cut_videos
 
 
+@_traced
 def keep_or_remove_by_split_segs(
     input_file: Path,
     output_file: Path | None,
     video_segments: Sequence[str] | Sequence[float],
     keep_handle: bool = True,  # True means keep, False means remove
+    backend: ExtractBackend | None = None,
 ) -> int:
     """remove a segment from a video
 
@@ -1167,49 +3271,57 @@ def keep_or_remove_by_split_segs(
     )
     logger.info(f"{_methods.KEEP_OR_REMOVE} {input_file.name} to {output_file.name}")
 
-    # Step 0: Create a temporary folder for storing cut videos
-    temp_dir: Path = Path(tempfile.mkdtemp())
-
-    # Step 1: Cut the video into segments based on the provided start and end times
-    cut_videos: Sequence[Path] = _split_segments(
-        input_file,
-        [
+    backend = backend or DEFAULT_EXTRACT_BACKEND
+    if backend in (ExtractBackend.CONCAT, ExtractBackend.SMART):
+        kept_segments: list[float] = [
             _convert_timestamp_to_seconds(s) if isinstance(s, str) else s
             for s in video_segments
-        ],
-        temp_dir,
-    )
-
-    # Step 2: Sort the cut videos into two lists(0 and 1) based on index % 2
-    cut_videos_dict: dict[int, list[Path]] = {}
-    for index, path in enumerate(cut_videos):
-        cut_videos_dict.setdefault(index % 2, []).append(path)
+        ]
+        if not keep_handle:
+            kept_segments = [0.0, *kept_segments, probe_duration(input_file)]
+        return _keep_by_inpoints(
+            input_file,
+            output_file,
+            temp_output_file,
+            kept_segments,
+            smart=backend == ExtractBackend.SMART,
+        )
 
-    # Step 3: Decide which segments to keep and which to remove
-    keep_key: int = int(keep_handle)
-    remove_key: int = abs(1 - keep_key)
+    # Step 0: Create a temporary folder for storing cut videos, removed on exit
+    with scratch_dir() as temp_dir:
+        # Step 1: Cut the video into segments based on the provided start and end times
+        cut_videos: Sequence[Path] = _split_segments(
+            input_file,
+            [
+                _convert_timestamp_to_seconds(s) if isinstance(s, str) else s
+                for s in video_segments
+            ],
+            temp_dir,
+        )
 
-    # Step 4: Remove the unwanted segments
-    for video_path in cut_videos_dict[remove_key]:
-        os.remove(video_path)
+        # Step 2: Sort the cut videos into two lists(0 and 1) based on index % 2
+        cut_videos_dict: dict[int, list[Path]] = {}
+        for index, path in enumerate(cut_videos):
+            cut_videos_dict.setdefault(index % 2, []).append(path)
 
-    # Step 5: Create input.txt for FFmpeg concatenation
-    temp_dir = cut_videos[0].parent
-    input_txt_path: Path = temp_dir / "input.txt"
-    with open(input_txt_path, "w") as f:
-        for video_path in cut_videos_dict[keep_key]:
-            f.write(f"file '{video_path}'\n")
+        # Step 3: Decide which segments to keep and which to remove
+        keep_key: int = int(keep_handle)
+        remove_key: int = abs(1 - keep_key)
 
-    # Step 6: Merge the kept segments
-    try:
-        merge(input_txt_path, temp_output_file)
-        temp_output_file.replace(output_file)
-        # Step 7: Clean up temporary files
-        for video_path in cut_videos_dict[keep_key]:
+        # Step 4: Remove the unwanted segments
+        for video_path in cut_videos_dict[remove_key]:
             os.remove(video_path)
-        os.remove(input_txt_path)
-        os.rmdir(temp_dir)
-    except Exception as e:
-        logger.error(f"Failed to cut silence for {input_file}. Error: {e}")
-        return 1
+
+        # Step 5: Create input.txt for FFmpeg concatenation
+        input_txt_path: Path = create_merge_txt(
+            cut_videos_dict[keep_key], temp_dir / "input.txt"
+        )
+
+        # Step 6: Merge the kept segments
+        try:
+            merge(input_txt_path, temp_output_file)
+            temp_output_file.replace(output_file)
+        except Exception as e:
+            logger.error(f"Failed to cut silence for {input_file}. Error: {e}")
+            return 1
     return 0
@@ -0,0 +1,190 @@
+"""Vectorized interval algebra on a NumPy (N, 2) float64 array.
+
+Segments are (start, end) rows in seconds. Only `union` sorts and merges,
+the other operations keep the rows in their order, so an `Intervals` can hold
+exactly what the flat `[start, end, start, end, ...]` lists of the converter
+hold. The operations that need disjoint sorted rows (`intersection`,
+`complement`) normalize with `union` first.
+"""
+
+from collections.abc import Iterable, Iterator, Sequence
+import numpy as np
+from .keyframe_index import KeyframeIndex
+
+
+class Intervals:
+    def __init__(self, bounds: np.ndarray | Iterable[Sequence[float]] = ()) -> None:
+        self.bounds: np.ndarray = np.asarray(bounds, dtype=np.float64).reshape(-1, 2)
+
+    @classmethod
+    def from_flat(cls, flat: Sequence[float] | np.ndarray) -> "Intervals":
+        """Read a flat [start, end, start, end, ...] sequence."""
+        values: np.ndarray = np.asarray(flat, dtype=np.float64)
+        if len(values) % 2 != 0:
+            raise ValueError("Segments must contain pairs of start and end times.")
+        return cls(values.reshape(-1, 2))
+
+    def to_flat(self) -> list[float]:
+        return self.bounds.ravel().tolist()
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.bounds[:, 0]
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self.bounds[:, 1]
+
+    @property
+    def durations(self) -> np.ndarray:
+        return self.ends - self.starts
+
+    @property
+    def total(self) -> float:
+        return float(self.durations.sum())
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def __iter__(self) -> Iterator[tuple[float, float]]:
+        return iter(map(tuple, self.bounds.tolist()))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Intervals):
+            return np.array_equal(self.bounds, other.bounds)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Intervals({len(self)} intervals, {self.total:.3f}s)"
+
+    def union(self, other: "Intervals | None" = None) -> "Intervals":
+        """Sorted rows with overlapping and touching ones merged."""
+        bounds: np.ndarray = self.bounds
+        if other is not None:
+            bounds = np.concatenate((bounds, other.bounds))
+        if len(bounds) == 0:
+            return Intervals()
+        bounds = bounds[np.argsort(bounds[:, 0], kind="stable")]
+        reach: np.ndarray = np.maximum.accumulate(bounds[:, 1])
+        # A row opens a new group when it starts after everything before ended
+        first: np.ndarray = np.flatnonzero(
+            np.concatenate(([True], bounds[1:, 0] > reach[:-1]))
+        )
+        last: np.ndarray = np.append(first[1:] - 1, len(bounds) - 1)
+        return Intervals(np.column_stack((bounds[first, 0], reach[last])))
+
+    def intersection(self, other: "Intervals") -> "Intervals":
+        """Time covered by both, zero length overlaps are dropped."""
+        a, b = self.union(), other.union()
+        points: np.ndarray = np.concatenate((a.starts, b.starts, a.ends, b.ends))
+        steps: np.ndarray = np.repeat([1, -1], len(a) + len(b))
+        # Ends sort before starts at the same time, touching rows do not overlap
+        order: np.ndarray = np.lexsort((steps, points))
+        points, coverage = points[order], np.cumsum(steps[order])
+        opened: np.ndarray = np.flatnonzero(coverage == 2)
+        return Intervals(np.column_stack((points[opened], points[opened + 1])))
+
+    def complement(self, start: float = 0.0, end: float | None = None) -> "Intervals":
+        """Gaps within [start, end], end defaults to the last end."""
+        merged: Intervals = self.union()
+        if end is None:
+            end = float(merged.ends[-1]) if len(merged) else start
+        edges: np.ndarray = np.concatenate(
+            ([start], np.clip(merged.bounds.ravel(), start, end), [end])
+        ).reshape(-1, 2)
+        return Intervals(edges[edges[:, 1] > edges[:, 0]])
+
+    def pad(
+        self,
+        before: float,
+        after: float,
+        lower: float = 0.0,
+        upper: float | None = None,
+    ) -> "Intervals":
+        """Widen every row and clip it to [lower, upper], rows are not merged."""
+        bounds: np.ndarray = self.bounds + np.array([-before, after])
+        return Intervals(np.clip(bounds, lower, np.inf if upper is None else upper))
+
+    def close_gaps(self, max_gap: float) -> "Intervals":
+        """Union with the gaps of at most max_gap seconds filled."""
+        merged: Intervals = self.union()
+        if len(merged) < 2:
+            return merged
+        keep_gap: np.ndarray = merged.starts[1:] - merged.ends[:-1] > max_gap
+        first: np.ndarray = np.flatnonzero(np.concatenate(([True], keep_gap)))
+        last: np.ndarray = np.append(first[1:] - 1, len(merged) - 1)
+        return Intervals(np.column_stack((merged.starts[first], merged.ends[last])))
+
+    def expand_to_minimum(
+        self, min_duration: float, total_duration: float | None = None
+    ) -> "Intervals":
+        """Stretch the rows shorter than min_duration, the rules of the converter:
+
+        A single row is kept as is. The last row grows backwards from its end,
+        the others grow by half the missing length backwards and then forwards
+        to min_duration, capped at total_duration. Nothing is kept if the rows
+        span less than min_duration altogether.
+        """
+        if min_duration < 0:
+            raise ValueError(
+                f"min_duration must greater than 0 but got {min_duration}."
+            )
+        if min_duration == 0 or len(self) == 0:
+            return self
+        if total_duration is None:
+            total_duration = float(self.ends[-1])
+        starts: np.ndarray = self.starts.copy()
+        ends: np.ndarray = self.ends.copy()
+        short: np.ndarray = self.durations < min_duration
+        if len(self) == 1:
+            short[:] = False
+        short_last: bool = bool(short[-1])
+        short[-1] = False
+
+        starts[short] = np.maximum(
+            0.0, starts[short] - (min_duration - self.durations[short]) / 2
+        )
+        ends[short] = np.minimum(starts[short] + min_duration, total_duration)
+        if short_last:
+            starts[-1] = max(0.0, ends[-1] - min_duration)
+        if ends[-1] - starts[0] < min_duration:
+            return Intervals()
+        return Intervals(np.column_stack((starts, ends)))
+
+    def snap_to_keyframes(
+        self, keyframes: KeyframeIndex | Sequence[float] | np.ndarray
+    ) -> "Intervals":
+        """Move starts back and ends forward to the nearest keyframe.
+
+        Times without a keyframe on their side stay where they are. An empty
+        segment on a keyframe ends on the next one, as the legacy scan did.
+        """
+        times: np.ndarray = (
+            np.frombuffer(keyframes.times, dtype=np.float64)
+            if isinstance(keyframes, KeyframeIndex)
+            else np.sort(np.asarray(keyframes, dtype=np.float64))
+        )
+        if len(times) == 0:
+            return self
+        floor: np.ndarray = np.searchsorted(times, self.starts, side="right") - 1
+        ceil: np.ndarray = np.maximum(
+            np.searchsorted(times, self.ends, side="left"),
+            floor + 1,
+        )
+        starts: np.ndarray = np.where(
+            floor >= 0, times[np.maximum(floor, 0)], self.starts
+        )
+        ends: np.ndarray = np.where(
+            ceil < len(times), times[np.minimum(ceil, len(times) - 1)], self.ends
+        )
+        return Intervals(np.column_stack((starts, ends)))
+
+    def timestamps(self) -> list[str]:
+        """Flat HH:MM:SS.mmm strings, truncated like _convert_seconds_to_timestamp."""
+        timestamps: list[str] = []
+        for seconds in self.bounds.ravel().tolist():
+            hours, remainder = divmod(int(seconds), 3600)
+            minutes, secs = divmod(remainder, 60)
+            milliseconds = int((seconds - int(seconds)) * 1000)
+            timestamps.append(f"{hours:02}:{minutes:02}:{secs:02}.{milliseconds:03}")
+        return timestamps
@@ -0,0 +1,253 @@
+"""Resumable segment jobs.
+
+A job is identified by its input file and its plan (operation, segments and
+arguments), so running the same job again finds the segments the previous run
+completed. Completed segment files live in a deterministic directory under
+`JOBS_DIR` and are recorded with a checksum in a SQLite manifest; files that
+went missing or changed are rendered again. Jobs untouched for
+`JOB_MAX_AGE` seconds and directories without a manifest are removed by
+`collect_garbage`. Operations without resumable segments work in a
+`scratch_dir` under `JOBS_DIR` too, so a crash leaves nothing outside of it.
+"""
+
+from collections.abc import Generator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+import hashlib
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from app.common import constants, logger
+from ..db_manager import DatabaseManager
+from . import analysis_cache
+
+JOBS_DIR: Path = constants.AppPaths.APP_DATA / "jobs"
+MANIFEST_PATH: Path = JOBS_DIR / "manifest.sqlite"
+JOB_MAX_AGE: float = 7 * 24 * 60 * 60
+SCRATCH_PREFIX: str = "scratch_"
+# Scratch dirs of other processes look orphaned, they are left alone this long
+SCRATCH_MAX_AGE: float = 24 * 60 * 60
+
+_lock = threading.Lock()
+_initialized: set[Path] = set()
+_open_jobs: set[str] = set()
+
+
+def _connect(db_path: Path) -> DatabaseManager:
+    db = DatabaseManager(db_path)
+    db.sqlite = "connect"
+    with _lock:
+        if db_path not in _initialized:
+            db.execute_query(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    input_path TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    plan TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+            db.execute_query(
+                """
+                CREATE TABLE IF NOT EXISTS segments (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    files TEXT NOT NULL,
+                    checksums TEXT NOT NULL,
+                    PRIMARY KEY (job_id, idx)
+                )
+                """
+            )
+            _initialized.add(db_path)
+    return db
+
+
+def checksum(file: Path) -> str:
+    """Hash of the size, the head and the tail of `file`."""
+    return analysis_cache._fingerprint(file, file.stat().st_size)
+
+
+class Job:
+    def __init__(
+        self,
+        input_file: Path,
+        operation: str,
+        plan: Any,
+        jobs_dir: Path | None = None,
+    ) -> None:
+        self.jobs_dir: Path = jobs_dir or JOBS_DIR
+        self.db_path: Path = self.jobs_dir / MANIFEST_PATH.name
+        identity = analysis_cache.file_identity(input_file)
+        self.plan: str = json.dumps(plan, sort_keys=True, default=str)
+        self.job_id: str = hashlib.blake2b(
+            json.dumps([identity, operation, self.plan]).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+        self.dir: Path = self.jobs_dir / self.job_id
+        self._segments: dict[int, list[Path]] = {}
+
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        with _lock:
+            _open_jobs.add(self.job_id)
+        db = _connect(self.db_path)
+        try:
+            db.write_db(
+                "jobs",
+                ["job_id", "input_path", "operation", "plan", "updated"],
+                [[self.job_id, identity[0], operation, self.plan, time.time()]],
+            )
+            rows = db.execute_query(
+                "SELECT idx, files, checksums FROM segments WHERE job_id = ?",
+                (self.job_id,),
+            )
+        finally:
+            db.sqlite = "close"
+        self.dir.mkdir(exist_ok=True)
+
+        for idx, files, checksums in rows:
+            paths: list[Path] = [self.dir / name for name in json.loads(files)]
+            try:
+                valid: bool = [checksum(path) for path in paths] == json.loads(
+                    checksums
+                )
+            except OSError:
+                valid = False
+            if valid:
+                self._segments[idx] = paths
+        if self._segments:
+            logger.info(
+                f"Resuming job {self.job_id} with {len(self._segments)} completed segments"
+            )
+
+    def files(self, idx: int) -> list[Path] | None:
+        """Files of a completed segment, None if it still has to be rendered."""
+        return self._segments.get(idx)
+
+    def complete(self, idx: int, files: Sequence[Path]) -> list[Path]:
+        """Move the files of segment idx into the job dir and record them."""
+        kept: list[Path] = []
+        for k, file in enumerate(files):
+            target: Path = self.dir / f"{idx}_{k}{file.suffix}"
+            if file != target:
+                file.replace(target)
+            kept.append(target)
+        db = _connect(self.db_path)
+        try:
+            db.write_db(
+                "segments",
+                ["job_id", "idx", "files", "checksums"],
+                [
+                    [
+                        self.job_id,
+                        idx,
+                        json.dumps([file.name for file in kept]),
+                        json.dumps([checksum(file) for file in kept]),
+                    ]
+                ],
+            )
+            db.execute_query(
+                "UPDATE jobs SET updated = ? WHERE job_id = ?",
+                (time.time(), self.job_id),
+            )
+        finally:
+            db.sqlite = "close"
+        self._segments[idx] = kept
+        return kept
+
+    def finish(self) -> None:
+        """Drop the job once its output is written."""
+        _remove_job(self.db_path, self.job_id)
+        with _lock:
+            _open_jobs.discard(self.job_id)
+
+    def close(self) -> None:
+        """Keep the job for a later run to resume."""
+        with _lock:
+            _open_jobs.discard(self.job_id)
+
+
+def _remove_job(db_path: Path, job_id: str) -> None:
+    shutil.rmtree(db_path.parent / job_id, ignore_errors=True)
+    db = _connect(db_path)
+    try:
+        db.execute_query("DELETE FROM segments WHERE job_id = ?", (job_id,))
+        db.execute_query("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+    finally:
+        db.sqlite = "close"
+
+
+def open_job(
+    input_file: Path, operation: str, plan: Any, jobs_dir: Path | None = None
+) -> Job:
+    """Open the job of `plan` on `input_file`, resuming its completed segments."""
+    collect_garbage(jobs_dir)
+    return Job(input_file, operation, plan, jobs_dir)
+
+
+@contextmanager
+def scratch_dir(jobs_dir: Path | None = None) -> Generator[Path, None, None]:
+    """A temporary directory under jobs_dir, removed with its content on exit."""
+    jobs_dir = jobs_dir or JOBS_DIR
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    path: Path = Path(tempfile.mkdtemp(prefix=SCRATCH_PREFIX, dir=jobs_dir))
+    with _lock:
+        _open_jobs.add(path.name)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+        with _lock:
+            _open_jobs.discard(path.name)
+
+
+def _is_orphan(path: Path, known: set[str], open_jobs: set[str]) -> bool:
+    if not path.is_dir() or path.name in known or path.name in open_jobs:
+        return False
+    if path.name.startswith(SCRATCH_PREFIX):
+        return time.time() - path.stat().st_mtime > SCRATCH_MAX_AGE
+    return True
+
+
+def collect_garbage(jobs_dir: Path | None = None, max_age: float = JOB_MAX_AGE) -> int:
+    """Remove stale jobs, and job and scratch dirs left behind by a crash.
+
+    Returns:
+        int: number of removed jobs
+    """
+    jobs_dir = jobs_dir or JOBS_DIR
+    if not jobs_dir.is_dir():
+        return 0
+    db_path: Path = jobs_dir / MANIFEST_PATH.name
+    try:
+        db = _connect(db_path)
+        try:
+            rows = db.execute_query("SELECT job_id, updated FROM jobs")
+        finally:
+            db.sqlite = "close"
+        with _lock:
+            open_jobs: set[str] = set(_open_jobs)
+        known: set[str] = {job_id for job_id, _ in rows}
+        stale: list[str] = [
+            job_id
+            for job_id, updated in rows
+            if job_id not in open_jobs and time.time() - updated > max_age
+        ]
+        orphans: list[str] = [
+            path.name
+            for path in jobs_dir.iterdir()
+            if _is_orphan(path, known, open_jobs)
+        ]
+        for job_id in stale + orphans:
+            _remove_job(db_path, job_id)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Failed to collect job garbage in {jobs_dir}: {e}")
+        return 0
+    if stale or orphans:
+        logger.info(f"Removed {len(stale)} stale and {len(orphans)} orphan jobs")
+    return len(stale) + len(orphans)
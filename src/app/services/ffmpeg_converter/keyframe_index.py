@@ -0,0 +1,54 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+
+
+class KeyframeIndex:
+    """Sorted keyframe timestamps in a compact array('d') with bisect lookups."""
+
+    def __init__(self, times: Iterable[float] = ()) -> None:
+        self.times: array = array("d", sorted(times))
+
+    @classmethod
+    def frombytes(cls, data: bytes) -> "KeyframeIndex":
+        index = cls()
+        index.times.frombytes(data)
+        return index
+
+    def tobytes(self) -> bytes:
+        return self.times.tobytes()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.times)
+
+    def __getitem__(self, i: int) -> float:
+        return self.times[i]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, KeyframeIndex):
+            return self.times == other.times
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"KeyframeIndex({len(self)} keyframes)"
+
+    def floor(self, time: float) -> float | None:
+        """The latest keyframe at or before `time`."""
+        i = bisect_right(self.times, time)
+        return self.times[i - 1] if i > 0 else None
+
+    def ceil(self, time: float) -> float | None:
+        """The earliest keyframe at or after `time`."""
+        i = bisect_left(self.times, time)
+        return self.times[i] if i < len(self.times) else None
+
+    def nearest(self, time: float) -> float | None:
+        candidates = [
+            keyframe
+            for keyframe in (self.floor(time), self.ceil(time))
+            if keyframe is not None
+        ]
+        return min(candidates, key=lambda keyframe: abs(keyframe - time), default=None)
@@ -0,0 +1,114 @@
+"""Global ffmpeg process budget.
+
+Every ffmpeg run of the package waits here for a slot, so parallel segments,
+parallel files and the TUI queue share one concurrency limit instead of each
+spawning `os.cpu_count()` multi-threaded encoders. Waiting jobs start by
+priority, then in arrival order, and every job gets an even share of the
+thread budget for its `-threads`.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import heapq
+import itertools
+import os
+import threading
+import time
+from .types import JobPriority, SchedulerStats
+
+current_priority: ContextVar[JobPriority] = ContextVar(
+    "current_priority", default=JobPriority.NORMAL
+)
+
+
+class FFmpegScheduler:
+    def __init__(self, max_jobs: int | None = None, total_threads: int | None = None):
+        self._condition = threading.Condition()
+        self._waiting: list[tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._held = threading.local()
+        self._running: int = 0
+        self._peak_queued: int = 0
+        self._completed: int = 0
+        self._total_wait: float = 0.0
+        self.configure(max_jobs, total_threads)
+
+    def configure(
+        self, max_jobs: int | None = None, total_threads: int | None = None
+    ) -> None:
+        """Set the limits, None picks half the cores as jobs and all cores as threads."""
+        with self._condition:
+            self.total_threads: int = total_threads or os.cpu_count() or 1
+            self.max_jobs: int = max_jobs or max(1, self.total_threads // 2)
+            self._condition.notify_all()
+
+    @property
+    def threads_per_job(self) -> int:
+        return max(1, self.total_threads // self.max_jobs)
+
+    @contextmanager
+    def slot(self, priority: JobPriority | None = None) -> Iterator[int]:
+        """Hold one of the `max_jobs` slots and yield the threads of the job.
+
+        A thread that already holds a slot does not take a second one, so a
+        job that nests ffmpeg runs cannot deadlock the scheduler.
+        """
+        if getattr(self._held, "depth", 0):
+            self._held.depth += 1
+            try:
+                yield self.threads_per_job
+            finally:
+                self._held.depth -= 1
+            return
+
+        if priority is None:
+            priority = current_priority.get()
+        ticket: tuple[int, int] = (priority, next(self._tickets))
+        queued_at: float = time.perf_counter()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            self._peak_queued = max(self._peak_queued, len(self._waiting))
+            self._condition.wait_for(
+                lambda: self._running < self.max_jobs and self._waiting[0] == ticket
+            )
+            heapq.heappop(self._waiting)
+            self._running += 1
+            self._total_wait += time.perf_counter() - queued_at
+            # The next waiter may fit in a slot too
+            self._condition.notify_all()
+
+        self._held.depth = 1
+        try:
+            yield self.threads_per_job
+        finally:
+            self._held.depth = 0
+            with self._condition:
+                self._running -= 1
+                self._completed += 1
+                self._condition.notify_all()
+
+    def stats(self) -> SchedulerStats:
+        with self._condition:
+            return {
+                "max_jobs": self.max_jobs,
+                "threads_per_job": self.threads_per_job,
+                "running": self._running,
+                "queued": len(self._waiting),
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "total_wait": self._total_wait,
+            }
+
+
+scheduler = FFmpegScheduler()
+
+
+@contextmanager
+def priority(level: JobPriority) -> Iterator[None]:
+    """Run the ffmpeg jobs started in this context with `level`."""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
@@ -1,5 +1,7 @@
-from typing import TypedDict, NotRequired
-from enum import StrEnum, auto
+from typing import TypedDict, NotRequired, Sequence
+from array import array
+from .keyframe_index import KeyframeIndex
+from enum import IntEnum, StrEnum, auto
 
 
 class EncodeKwargs(TypedDict):
@@ -15,3 +17,101 @@ class VideoSuffix(StrEnum):
     MP4 = auto()
     MKV = auto()
     AVI = auto()
+
+
+class StreamInfo(TypedDict):
+    index: int
+    codec_type: str
+    codec_name: str
+
+
+class MediaAnalysis(TypedDict):
+    non_silence_segs: Sequence[float]
+    total_duration: float
+    total_silence_duration: float
+    keyframes: KeyframeIndex
+    streams: list[StreamInfo]
+
+
+class AnalysisMode(StrEnum):
+    SILENCEDETECT = auto()
+    ENVELOPE = auto()
+
+
+class AnalysisProfile(StrEnum):
+    FULL = auto()  # every frame at full resolution
+    LOWRES = auto()  # every frame, scaled down
+    DECIMATED = auto()  # a few frames per second, scaled down
+    KEYFRAMES = auto()  # keyframes only, scaled down
+
+
+class KeepOn(StrEnum):
+    """What cut_silence keeps: sound, motion, or where either is present."""
+
+    SOUND = auto()
+    MOTION = auto()
+    BOTH = auto()
+
+
+class ValidityCheck(StrEnum):
+    """How probe_valid_videos checks a clip."""
+
+    HEADER = auto()  # container header read in Python, no ffprobe
+    DURATION = auto()  # ffprobe reports a duration, like probe_is_valid_video
+
+
+class LoudnessEnvelope(TypedDict):
+    window: float
+    start: float
+    total_duration: float
+    peak: array  # array('f') of per window peak level in dB
+    rms: array  # array('f') of per window RMS level in dB
+
+
+class ExtractBackend(StrEnum):
+    PER_SEGMENT = auto()  # one ffmpeg `cut` per segment
+    SEGMENT_MUXER = auto()  # every segment from one ffmpeg run of the segment muxer
+    CONCAT = auto()  # concat demuxer inpoint/outpoint, no segment files at all
+    SMART = auto()  # CONCAT with re-encoded partial GOPs at the edges, frame accurate
+
+
+class JobPriority(IntEnum):
+    HIGH = 0  # interactive previews and probes the UI waits on
+    NORMAL = 1
+    LOW = 2  # background batches
+
+
+class SchedulerStats(TypedDict):
+    max_jobs: int
+    threads_per_job: int
+    running: int
+    queued: int
+    peak_queued: int
+    completed: int
+    total_wait: float
+
+
+class RerenderGraph(StrEnum):
+    BETWEEN = auto()  # select/aselect over a between() chain, cost grows with intervals
+    TRIM_CONCAT = auto()  # seeked batches of trim/atrim + concat
+
+
+class EncodeProfile(StrEnum):
+    ARCHIVE = auto()  # small files, slow
+    FAST = auto()
+    PREVIEW = auto()  # quick drafts, large files
+
+
+class CalibrationResult(TypedDict):
+    preset: str
+    bitrate: int
+    ssim: float
+    seconds: float
+
+
+class ProgressEvent(TypedDict):
+    frame: int
+    fps: float | None
+    out_time: float  # seconds of output written
+    speed: float | None  # multiple of real time, None until ffmpeg knows it
+    done: bool  # the last event of the run
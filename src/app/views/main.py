@@ -1,6 +1,7 @@
 from enum import StrEnum
 from rich.markdown import Markdown
-from textual import on
+from textual import on, work
+from textual.worker import get_current_worker
 from textual.app import App, ComposeResult
 from textual.screen import Screen, ModalScreen
 from textual.containers import (
@@ -27,6 +28,7 @@ from textual.widgets import (
     ListItem,
     ListView,
     HelpPanel,
+    ProgressBar,
 )
 from textual_fspicker import SelectDirectory
 from rich.cells import cell_len
@@ -34,16 +36,25 @@ from typing import Optional
 import sys
 from pathlib import Path
 from app import constants, logger
+from app.common import tracing
 import app.services.ffmpeg_converter.ffmpeg_converter as ffmpeg_converter
-import threading
-import time
+from app.services.ffmpeg_converter.engine import on_progress
+from app.services.ffmpeg_converter.types import AnalysisMode
 import re
 from .src import CSS, LICENSE_TEXT, ABOUT_TEXT
+from .progress import JobStats, RenderProgress
+from .render_queue import RenderQueue, RenderStatus, default_concurrency
 
 # LICENSE_TEXT = Path("LICENSE").read_text(encoding="utf-8")
 # ABOUT_TEXT = Path("ABOUT.md").read_text(encoding="utf-8")
 
+# In-process memo, probes themselves are persisted by ffmpeg_converter.analysis_cache
 probed_cache: dict[str, str] = {}
+SL_DURATION: float = 0.2
+# Render threads only record progress, the UI reads it at this interval
+PROGRESS_REFRESH_INTERVAL: float = 0.5
+PROGRESS_LINE_WIDTH: int = 64
+render_progress = RenderProgress()
 # Define the About text using Markdown
 
 
@@ -51,6 +62,29 @@ def sanitize_string(s: str) -> str:
     return re.sub(r"[^a-zA-Z0-9_-]", "", s)
 
 
+def format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def render_file(job_id: str, video: Path, output_path: Path, threshold: str) -> int:
+    """Cut the silences of a queued video, reporting its ffmpeg progress."""
+    with tracing.span("render", "views", job=job_id, input_file=video.name), on_progress(
+        render_progress.start(job_id)
+    ):
+        try:
+            return ffmpeg_converter.cut_silence(  # type: ignore
+                video,
+                output_path,
+                threshold,  # type: ignore
+                SL_DURATION,
+                analysis_mode=AnalysisMode.ENVELOPE,
+            )
+        finally:
+            render_progress.finish(job_id)
+
+
 class AllIds(StrEnum):
     MyStores = "MyStores"
     VideoFilePicker = "VideoFilePicker"
@@ -66,11 +100,11 @@ class AllIds(StrEnum):
     all_files = "all_files"
     rendered_file_list_view = "rendered_file_list_view"
     rendered_video_status = "rendered_video_status"
+    queue_progress = "queue_progress"
+    concurrency = "concurrency"
 
 
 class MyStores(Widget):
-    threads: list[tuple[threading.Thread, str]] = []
-
     def on_mount(self) -> None:
         # Assign values to the reactive list
         pass
@@ -158,6 +192,8 @@ class LayoutApp(App):
     # CSS_PATH = "style.css"
     CSS = CSS
     _batch_counter = reactive(0)
+    # put_in_queue batches still being estimated by queue_renders
+    _queueing: int = 0
     TITLE = constants.APP_NAME
     SUB_TITLE = "Auto Silence Remover"
     ENABLE_COMMAND_PALETTE = False
@@ -166,7 +202,86 @@ class LayoutApp(App):
         self.push_screen(MainScreen())
 
     def on_mount(self) -> None:
-        pass
+        self.render_queue = RenderQueue(
+            render_file,
+            on_change=lambda job_id, status: self.call_from_thread(
+                self.show_render_status, job_id, status
+            ),
+            on_idle=lambda: self.call_from_thread(self.render_finished),
+        )
+        self.set_interval(PROGRESS_REFRESH_INTERVAL, self.refresh_progress)
+
+    def show_render_status(self, job_id: str, status: RenderStatus) -> None:
+        if status == RenderStatus.CANCELLED:
+            render_progress.remove(job_id)
+        try:
+            self.query_one("#" + job_id, RenderedFile).set_status(status)
+        except NoMatches:
+            pass
+
+    def render_finished(self) -> None:
+        logger.info(f"All selected videos rendered")
+        self.update_start_button()
+
+    def update_start_button(self) -> None:
+        """Disabled while rendering, and while queued videos are still estimated."""
+        button: Button = self.query_one("#" + AllIds.start_button)  # type: ignore
+        button.disabled = self.render_queue.running or self._queueing > 0
+        if self.render_queue.running:
+            button.label = "Rendering..."
+        elif self._queueing:
+            button.label = "Queueing..."
+        else:
+            button.label = "Render"
+
+    def highlighted_render(self) -> "RenderedFile | None":
+        file_list_view: ListView = self.query_one("#" + AllIds.rendered_file_list_view)  # type: ignore
+        item = file_list_view.highlighted_child
+        return item if isinstance(item, RenderedFile) else None
+
+    def action_move_render(self, offset: int) -> None:
+        """Move the highlighted waiting render up or down the queue."""
+        item = self.highlighted_render()
+        if item is None or (other := self.render_queue.move(item.id, offset)) is None:  # type: ignore
+            return
+        file_list_view: ListView = self.query_one("#" + AllIds.rendered_file_list_view)  # type: ignore
+        if offset < 0:
+            file_list_view.move_child(item, before=self.query_one("#" + other))
+        else:
+            file_list_view.move_child(item, after=self.query_one("#" + other))
+        file_list_view.index = file_list_view.children.index(item)
+
+    def action_pause_render(self) -> None:
+        item = self.highlighted_render()
+        if item is not None and (status := self.render_queue.toggle_pause(item.id)):  # type: ignore
+            item.set_status(status)
+
+    def action_cancel_render(self) -> None:
+        item = self.highlighted_render()
+        if item is not None and (status := self.render_queue.cancel(item.id)):  # type: ignore
+            if status == RenderStatus.CANCELLED:
+                render_progress.remove(item.id)  # type: ignore
+            item.set_status(status)
+
+    def refresh_progress(self) -> None:
+        stats = render_progress.snapshot()
+        if not stats["total"]:
+            return
+        for job_id, job in stats["jobs"].items():
+            try:
+                self.query_one("#" + job_id, RenderedFile).show_progress(job)
+            except NoMatches:
+                continue
+        summary: str = (
+            f"{stats['done']}/{stats['total']} done  {stats['fraction']:.0%}"
+            f"  {stats['throughput']:.1f} media s/s"
+        )
+        if stats["eta"] is not None and stats["done"] < stats["total"]:
+            summary += "  ETA " + format_seconds(stats["eta"])
+        try:
+            self.query_one("#" + AllIds.queue_progress, Static).update(summary)
+        except NoMatches:
+            pass
 
     def set_input_path(self, selected_path: Path | None) -> None:
         """Set the input path to the selected directory.
@@ -179,6 +294,13 @@ class LayoutApp(App):
         self.query_one("#" + AllIds.input_path).value = str(selected_path)  # type: ignore
 
     def set_video_info(self, video_file: Path) -> None:
+        self.query_one(AllIds.MyStores).set_value(AllIds.video_path, video_file)  # type: ignore
+        threshold = self.query_one(AllIds.MyStores).get_value(AllIds.threshold)  # type: ignore
+        self.probe_video_info(video_file, threshold)
+
+    @work(thread=True, exclusive=True, group="video_info")
+    def probe_video_info(self, video_file: Path, threshold: str | None) -> None:
+        """Probe off the UI thread, a cache miss runs ffprobe."""
         if probed_cache.get(video_file) is None:
             probed_cache[video_file] = {
                 "Video Path": str(video_file),
@@ -187,10 +309,52 @@ class LayoutApp(App):
                 ),
                 "Encode": ffmpeg_converter.probe_encoding(video_file),
             }
-        video_info = probed_cache.get(video_file)
+        video_info = probed_cache.get(video_file) | self.estimate_kept(video_file, threshold)  # type: ignore
+        # A newer selection replaced this one meanwhile
+        if not get_current_worker().is_cancelled:
+            self.call_from_thread(self.show_video_info, video_info)
+
+    def show_video_info(self, video_info: dict) -> None:
         formatted_info = "  \n".join(f"**{key}**: `{value}`" for key, value in video_info.items())  # type: ignore
         self.query_one("#" + AllIds.video_info).update(Markdown(formatted_info))  # type: ignore
 
+    def estimate_media_seconds(self, video_file: Path, threshold: str) -> float:
+        """Media seconds ffmpeg will go through to render video_file.
+
+        The analysis decodes the whole file unless the loudness envelope is
+        cached, the render goes through the kept part.
+        """
+        total_duration: float = ffmpeg_converter.probe_duration(video_file)
+        envelope = ffmpeg_converter.load_loudness_envelope(video_file)
+        if envelope is None:
+            return total_duration * 2
+        try:
+            dB = float(threshold)
+        except (TypeError, ValueError):
+            return total_duration
+        _, total_duration, silence_duration = ffmpeg_converter.non_silence_from_envelope(
+            envelope, dB, SL_DURATION
+        )
+        return total_duration - silence_duration
+
+    def estimate_kept(self, video_file: Path, threshold: str | None) -> dict[str, str]:
+        """Estimate the kept duration from a cached loudness envelope, no decode."""
+        try:
+            dB = float(threshold)  # type: ignore
+        except (TypeError, ValueError):
+            return {}
+        envelope = ffmpeg_converter.load_loudness_envelope(video_file)
+        if envelope is None:
+            return {}
+        _, total_duration, silence_duration = ffmpeg_converter.non_silence_from_envelope(
+            envelope, dB, SL_DURATION
+        )
+        kept = total_duration - silence_duration
+        return {
+            "Estimated Kept": ffmpeg_converter._convert_seconds_to_timestamp(kept)
+            + f" ({kept / (total_duration or 1):.0%}) at {threshold} dB"
+        }
+
     @on(Input.Changed, "*")
     def on_input_changed(
         self, event: Input.Changed, selected_id=AllIds.output_path
@@ -219,6 +383,10 @@ class LayoutApp(App):
             if len(video_files) > 0:
                 self.query_one("#" + AllIds.output_path).value = value + r"\Rendered"  # type: ignore
                 self.set_video_info(video_files[0])
+        if selected_id == AllIds.threshold and my_stores.get_value(AllIds.video_path):  # type: ignore
+            self.set_video_info(my_stores.get_value(AllIds.video_path))  # type: ignore
+        if selected_id == AllIds.concurrency and value.isdigit() and int(value) > 0:
+            self.render_queue.set_concurrency(int(value))
 
     @on(SelectionList.SelectedChanged, "#" + AllIds.VideoFilePicker)
     def update_selected_videos(self) -> None:
@@ -266,6 +434,7 @@ class LayoutApp(App):
         if videos is None or len(videos) == 0:
             logger.error("No video selected")
             return
+        renders: list[tuple[str, Path, Path, str]] = []
         for video in videos:
             video = Path(video)
             threshold: str = my_stores.get_value(AllIds.threshold)  # type: ignore
@@ -289,47 +458,32 @@ class LayoutApp(App):
             if not file_list_view.is_vertical_scrollbar_grabbed:
                 file_list_view.scroll_end(animate=False)
             self._batch_counter += 1
-            # Run without blocking the main thread
-            my_stores.threads.append(
-                (
-                    threading.Thread(
-                        target=ffmpeg_converter.cut_silence,
-                        args=(video, output_path, threshold),
-                        daemon=True,
-                    ),
-                    _id,
-                )
-            )
+            renders.append((_id, video, output_path, threshold))
+        self._queueing += 1
+        self.update_start_button()
+        self.queue_renders(renders)
+
+    @work(thread=True, group="queue")
+    def queue_renders(self, renders: list[tuple[str, Path, Path, str]]) -> None:
+        """Estimate off the UI thread, a cache miss runs ffprobe."""
+        try:
+            for _id, video, output_path, threshold in renders:
+                render_progress.add(_id, self.estimate_media_seconds(video, threshold))
+                # Starts right away when the queue is rendering and a slot is free
+                self.render_queue.add(_id, video, output_path, threshold)
+        finally:
+            self.call_from_thread(self.renders_queued)
+
+    def renders_queued(self) -> None:
+        self._queueing -= 1
+        self.update_start_button()
 
     @on(Button.Pressed, "#" + AllIds.start_button)
     def start_render(self, event: Button.Pressed) -> None:
-        def start_all():
-            my_stores: MyStores = self.query_one(AllIds.MyStores)  # type: ignore
-            button: Button = self.query_one("#" + AllIds.start_button)  # type: ignore
-            button.disabled = True
-            button.label = "Rendering..."
-
-            for thread in my_stores.threads:
-                _label = self.query_one("#" + thread[1])  # type: ignore
-                if _label.status == "Done":  # type: ignore
-                    continue
-                _label.status = "Rendering"  # type: ignore
-                _label.add_class("Rendering")
-                _label.query_one(Static).update(_label.status + " : " + _label.file_name + " to " + _label.output_path)  # type: ignore
-                thread[0].start()
-                while thread[0].is_alive():
-                    time.sleep(2)
-                _label.status = "Done"  # type: ignore
-                _label.remove_class("Rendering")
-                _label.add_class("Done")
-                _label.query_one(Static).update(_label.status + " : " + _label.file_name + " to " + _label.output_path)  # type: ignore
-
-            logger.info(f"All selected videos rendered")
-            button.disabled = False
-            button.label = "Render"
-
-        start_render_thread = threading.Thread(target=start_all, daemon=True)
-        start_render_thread.start()
+        if not self.render_queue.start():
+            logger.error("Nothing to render")
+            return
+        self.update_start_button()
 
 
 class MainScreen(Screen):
@@ -431,7 +585,10 @@ class ParameterPanel(Container):
             Parameter_Output(
                 id=f"Parameter_Output", classes="Height_Three Margin_One_Down"
             ),
-            Parameter_Threshold(id="Parameter_Threshold", classes="Height_Three"),
+            Parameter_Threshold(
+                id="Parameter_Threshold", classes="Height_Three Margin_One_Down"
+            ),
+            Parameter_Concurrency(id="Parameter_Concurrency", classes="Height_Three"),
         )
 
 
@@ -452,6 +609,24 @@ class Parameter_Output(Container):
         )
 
 
+class Parameter_Concurrency(Container):
+    def compose(self) -> ComposeResult:
+        yield Horizontal(
+            Static(
+                "Parallel Jobs",
+                classes="Parameter_Label H_One_FR V_One_FR Center_All",
+            ),
+            Input(
+                placeholder="Renders at once",
+                value=str(default_concurrency()),
+                id=AllIds.concurrency,
+                classes="Parameter_detail H_Three_FR Center_All",
+                type="integer",
+                tooltip="Videos rendered at the same time, defaults to the cores divided by the threads of one ffmpeg job",
+            ),
+        )
+
+
 class Parameter_Threshold(Container):
 
     def compose(self) -> ComposeResult:
@@ -507,10 +682,11 @@ class ProgressPanel(Container):
                     id=AllIds.start_button,
                     classes="H_One_FR ButtonB",
                 ),
+                Static(id=AllIds.queue_progress, classes="H_Two_FR Center_All"),
                 classes="Height_Three Margin_One_Down",
             )
             yield HorizontalScroll(
-                ListView(
+                RenderQueueList(
                     id=AllIds.rendered_file_list_view,
                     classes="H_One_FR V_One_FR HoverBorder ScrollAuto",
                 ),
@@ -519,6 +695,15 @@ class ProgressPanel(Container):
             )
 
 
+class RenderQueueList(ListView):
+    BINDINGS = [
+        ("shift+up", "app.move_render(-1)", "Move Up"),
+        ("shift+down", "app.move_render(1)", "Move Down"),
+        ("p", "app.pause_render", "Pause"),
+        ("delete", "app.cancel_render", "Cancel"),
+    ]
+
+
 class RenderedFile(ListItem):
     """List item with a reactive counter."""
 
@@ -547,10 +732,35 @@ class RenderedFile(ListItem):
         )
 
     def on_mount(self):
-        self.styles.width = cell_len(self.shown_content)
+        self.styles.width = max(cell_len(self.shown_content), PROGRESS_LINE_WIDTH)
 
     def compose(self) -> ComposeResult:
-        yield Static(self.shown_content)
+        yield Static(self.shown_content, classes="RenderedFile_Label")
+        yield Horizontal(
+            ProgressBar(total=100, show_eta=False),
+            Static(classes="RenderedFile_Stats"),
+            classes="RenderedFile_Progress",
+        )
+
+    def set_status(self, status: RenderStatus) -> None:
+        self.remove_class(*RenderStatus)
+        self.add_class(status)
+        self.status = status
+        self.shown_content = (
+            self.status + " : " + self.file_name + " to " + self.output_path
+        )
+        self.query_one(".RenderedFile_Label", Static).update(self.shown_content)
+
+    def show_progress(self, job: JobStats) -> None:
+        self.query_one(ProgressBar).update(progress=job["fraction"] * 100)
+        details: list[str] = []
+        if job["speed"]:
+            details.append(f"{job['speed']:.1f}x")
+        if job["fps"]:
+            details.append(f"{job['fps']:.0f} fps")
+        if job["eta"] is not None:
+            details.append("ETA " + format_seconds(job["eta"]))
+        self.query_one(".RenderedFile_Stats", Static).update("  ".join(details))
 
 
 class LogView(Container):
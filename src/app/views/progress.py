@@ -0,0 +1,155 @@
+"""Render queue progress.
+
+Render threads feed the `-progress` events of their ffmpeg runs into a
+`RenderProgress`, the UI reads a snapshot of it on a timer. Nothing is pushed to
+Textual from the render threads, so a fast encode cannot flood the UI.
+
+Progress is counted in media seconds: a job expects to decode its input once
+for the analysis (skipped when the loudness envelope is cached) and once more
+for the kept part when rendering. Throughput is the media seconds processed by
+the whole queue per wall second while it renders, the queue ETA divides the
+media seconds left by it.
+"""
+
+from typing import TypedDict
+import threading
+import time
+from app.services.ffmpeg_converter.engine import ProgressCallback
+from app.services.ffmpeg_converter.types import ProgressEvent
+
+
+class JobStats(TypedDict):
+    fraction: float  # 0 to 1
+    processed: float  # media seconds
+    expected: float  # media seconds
+    speed: float | None  # of the running ffmpeg, multiple of real time
+    fps: float | None
+    eta: float | None  # seconds
+    running: bool
+    done: bool
+
+
+class QueueStats(TypedDict):
+    jobs: dict[str, JobStats]
+    done: int
+    total: int
+    fraction: float
+    throughput: float  # media seconds per wall second
+    eta: float | None  # seconds
+
+
+class JobProgress:
+    def __init__(self, expected: float) -> None:
+        self.expected: float = max(expected, 0.0)
+        self.finished_runs: float = 0.0  # media seconds of the finished ffmpeg runs
+        self.out_time: float = 0.0  # of the running ffmpeg
+        self.speed: float | None = None
+        self.fps: float | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    @property
+    def processed(self) -> float:
+        if self.finished_at is not None:
+            return self.expected
+        # Estimates can be short, keep the bar below 100% until the job ends
+        return min(self.finished_runs + self.out_time, self.expected * 0.99)
+
+    def update(self, event: ProgressEvent) -> None:
+        if event["done"]:
+            self.finished_runs += event["out_time"]
+            self.out_time = 0.0
+        else:
+            self.out_time = event["out_time"]
+        self.speed = event["speed"]
+        self.fps = event["fps"]
+
+    def stats(self, now: float) -> JobStats:
+        processed: float = self.processed
+        eta: float | None = None
+        if self.started_at is not None and self.finished_at is None and processed:
+            rate: float = processed / max(now - self.started_at, 1e-6)
+            eta = (self.expected - processed) / rate
+        return {
+            "fraction": processed / self.expected if self.expected else 0.0,
+            "processed": processed,
+            "expected": self.expected,
+            "speed": self.speed if self.finished_at is None else None,
+            "fps": self.fps if self.finished_at is None else None,
+            "eta": eta,
+            "running": self.started_at is not None and self.finished_at is None,
+            "done": self.finished_at is not None,
+        }
+
+
+class RenderProgress:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._jobs: dict[str, JobProgress] = {}
+        self._running: int = 0
+        self._busy_since: float | None = None
+        self._busy_seconds: float = 0.0
+
+    def add(self, job_id: str, expected: float) -> None:
+        with self._lock:
+            self._jobs[job_id] = JobProgress(expected)
+
+    def start(self, job_id: str) -> ProgressCallback:
+        """Mark the job as running and return the callback for its ffmpeg runs."""
+        with self._lock:
+            job: JobProgress = self._jobs[job_id]
+            job.started_at = time.perf_counter()
+            if self._running == 0:
+                self._busy_since = job.started_at
+            self._running += 1
+
+        def callback(event: ProgressEvent) -> None:
+            with self._lock:
+                job.update(event)
+
+        return callback
+
+    def finish(self, job_id: str) -> None:
+        with self._lock:
+            job: JobProgress | None = self._jobs.get(job_id)
+            if job is None or job.finished_at is not None:
+                return
+            job.finished_at = time.perf_counter()
+            # Count what was really processed from now on
+            job.expected = job.finished_runs or job.expected
+            self._running -= 1
+            if self._running == 0 and self._busy_since is not None:
+                self._busy_seconds += job.finished_at - self._busy_since
+                self._busy_since = None
+
+    def remove(self, job_id: str) -> None:
+        """Drop a cancelled job, its seconds leave the queue totals."""
+        with self._lock:
+            job: JobProgress | None = self._jobs.pop(job_id, None)
+            if job is None or job.started_at is None or job.finished_at is not None:
+                return
+            self._running -= 1
+            if self._running == 0 and self._busy_since is not None:
+                self._busy_seconds += time.perf_counter() - self._busy_since
+                self._busy_since = None
+
+    def snapshot(self) -> QueueStats:
+        with self._lock:
+            now: float = time.perf_counter()
+            jobs: dict[str, JobStats] = {
+                job_id: job.stats(now) for job_id, job in self._jobs.items()
+            }
+            busy: float = self._busy_seconds + (
+                now - self._busy_since if self._busy_since is not None else 0.0
+            )
+        processed: float = sum(job["processed"] for job in jobs.values())
+        expected: float = sum(job["expected"] for job in jobs.values())
+        throughput: float = processed / busy if busy > 0 else 0.0
+        return {
+            "jobs": jobs,
+            "done": sum(job["done"] for job in jobs.values()),
+            "total": len(jobs),
+            "fraction": processed / expected if expected else 0.0,
+            "throughput": throughput,
+            "eta": (expected - processed) / throughput if throughput > 0 else None,
+        }
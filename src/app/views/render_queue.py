@@ -0,0 +1,195 @@
+"""Render queue worker pool.
+
+Queued renders wait in order until the queue is started, then up to
+`concurrency` of them run at once, each on its own thread. A render that ends
+starts the next one right away from its thread, nothing polls. Waiting renders
+can be moved, paused and cancelled, a running render is cancelled through the
+`CancelToken` of its ffmpeg runs.
+
+`on_change` and `on_idle` are called from the render threads, never from the
+thread calling the queue methods, which get their result returned instead.
+"""
+
+from collections.abc import Callable
+from enum import StrEnum
+from typing import Any
+import os
+import threading
+from app import logger
+from app.services.ffmpeg_converter.engine import (
+    CancelToken,
+    FFmpegCancelled,
+    cancellation,
+)
+from app.services.ffmpeg_converter.scheduler import scheduler
+
+
+class RenderStatus(StrEnum):
+    # Values are shown in the queue and used as CSS classes
+    READY = "Ready"
+    PAUSED = "Paused"
+    RENDERING = "Rendering"
+    DONE = "Done"
+    FAILED = "Failed"
+    CANCELLED = "Cancelled"
+
+
+type StatusCallback = Callable[[str, RenderStatus], None]
+
+
+def default_concurrency() -> int:
+    """As many renders as the cores give threads to each ffmpeg job."""
+    return max(1, (os.cpu_count() or 1) // scheduler.threads_per_job)
+
+
+class RenderQueue:
+    def __init__(
+        self,
+        render: Callable[..., Any],
+        on_change: StatusCallback | None = None,
+        on_idle: Callable[[], None] | None = None,
+        concurrency: int | None = None,
+    ) -> None:
+        """
+        Args:
+            render (Callable[..., Any]): called as render(job_id, *args) on a render
+                thread, a result other than 0 or an exception marks the job failed.
+            on_change (StatusCallback | None, optional): a job started or ended.
+            on_idle (Callable[[], None] | None, optional): the last running job
+                ended and nothing is left to start.
+            concurrency (int | None, optional): Defaults to default_concurrency().
+        """
+        self._render = render
+        self.on_change: StatusCallback = on_change or (lambda job_id, status: None)
+        self.on_idle: Callable[[], None] = on_idle or (lambda: None)
+        self._lock = threading.Lock()
+        self._pending: list[str] = []
+        self._args: dict[str, tuple] = {}
+        self._status: dict[str, RenderStatus] = {}
+        self._tokens: dict[str, CancelToken] = {}
+        self.concurrency: int = concurrency or default_concurrency()
+        self.running: bool = False
+
+    def status(self, job_id: str) -> RenderStatus | None:
+        with self._lock:
+            return self._status.get(job_id)
+
+    def add(self, job_id: str, *args: Any) -> None:
+        """Queue a render, it starts right away if the queue runs and a slot is free."""
+        with self._lock:
+            self._args[job_id] = args
+            self._status[job_id] = RenderStatus.READY
+            self._pending.append(job_id)
+            self._dispatch()
+
+    def start(self) -> bool:
+        """Start rendering, False if nothing is waiting."""
+        with self._lock:
+            self.running = any(
+                self._status[job_id] == RenderStatus.READY for job_id in self._pending
+            ) or bool(self._tokens)
+            self._dispatch()
+            return self.running
+
+    def set_concurrency(self, concurrency: int) -> None:
+        """Change the number of parallel renders, running ones are never stopped."""
+        with self._lock:
+            self.concurrency = max(1, concurrency)
+            self._dispatch()
+        logger.info(f"Render queue concurrency set to {self.concurrency}")
+
+    def move(self, job_id: str, offset: int) -> str | None:
+        """Swap a waiting job with the waiting job `offset` places away.
+
+        Returns:
+            str | None: the job swapped with, None if the job cannot move
+        """
+        with self._lock:
+            if job_id not in self._pending:
+                return None
+            index: int = self._pending.index(job_id)
+            target: int = index + offset
+            if not 0 <= target < len(self._pending):
+                return None
+            other: str = self._pending[target]
+            self._pending[index], self._pending[target] = other, job_id
+            return other
+
+    def toggle_pause(self, job_id: str) -> RenderStatus | None:
+        """Hold a waiting job back or release it again.
+
+        Returns:
+            RenderStatus | None: the new status, None if the job is not waiting
+        """
+        with self._lock:
+            if job_id not in self._pending:
+                return None
+            status: RenderStatus = (
+                RenderStatus.READY
+                if self._status[job_id] == RenderStatus.PAUSED
+                else RenderStatus.PAUSED
+            )
+            self._status[job_id] = status
+            self._dispatch()
+            # A released job may have been started already
+            return self._status[job_id]
+
+    def cancel(self, job_id: str) -> RenderStatus | None:
+        """Drop a waiting job or kill a running one.
+
+        Returns:
+            RenderStatus | None: CANCELLED for a waiting job, RENDERING for a running
+                one until its thread reports CANCELLED, None for an unknown or ended job
+        """
+        with self._lock:
+            if job_id in self._pending:
+                self._pending.remove(job_id)
+                self._status[job_id] = RenderStatus.CANCELLED
+                return RenderStatus.CANCELLED
+            token: CancelToken | None = self._tokens.get(job_id)
+        if token is None:
+            return None
+        logger.info(f"Cancelling render {job_id}")
+        token.cancel()
+        return RenderStatus.RENDERING
+
+    def _dispatch(self) -> None:
+        """Start waiting jobs while slots are free, the lock is held by the caller."""
+        while self.running and len(self._tokens) < self.concurrency:
+            job_id: str | None = next(
+                (job for job in self._pending if self._status[job] == RenderStatus.READY),
+                None,
+            )
+            if job_id is None:
+                return
+            self._pending.remove(job_id)
+            self._status[job_id] = RenderStatus.RENDERING
+            self._tokens[job_id] = CancelToken()
+            threading.Thread(
+                target=self._run, args=(job_id, self._tokens[job_id]), daemon=True
+            ).start()
+
+    def _run(self, job_id: str, token: CancelToken) -> None:
+        self.on_change(job_id, RenderStatus.RENDERING)
+        status: RenderStatus = RenderStatus.FAILED
+        try:
+            with cancellation(token):
+                if self._render(job_id, *self._args[job_id]) in (0, None):
+                    status = RenderStatus.DONE
+        except FFmpegCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Render {job_id} failed. Error: {e}")
+        if token.cancelled:
+            status = RenderStatus.CANCELLED
+
+        with self._lock:
+            del self._tokens[job_id]
+            self._status[job_id] = status
+            self._dispatch()
+            idle: bool = not self._tokens
+            if idle:
+                self.running = False
+        self.on_change(job_id, status)
+        if idle:
+            self.on_idle()
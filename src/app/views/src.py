@@ -197,6 +197,25 @@ MyModal{
     text-style: bold; 
 }
 
+.Paused {
+    background: $panel;
+    text-style: italic;
+}
+
+.Failed, .Cancelled {
+    background: darkred;
+    text-style: bold;
+}
+
+.RenderedFile_Progress {
+    height: 1;
+}
+
+.RenderedFile_Stats {
+    width: 1fr;
+    padding: 0 1;
+}
+
 
 
 ListItem.--highlight {
@@ -0,0 +1,106 @@
+"""Benchmark the scene analysis decode profiles.
+
+Run from src/:
+    python -m tests.benchmarks.bench_analysis_profile --duration 120 --files 1 4
+
+Throughput is media hours analysed per wall minute. With several files they
+are analysed side by side, where the single threaded reduced profiles should
+scale with the cores while the full decode already uses all of them.
+"""
+
+from pathlib import Path
+import argparse
+import concurrent.futures
+import shutil
+import subprocess
+import tempfile
+import time
+from app.services.ffmpeg_converter import ffmpeg_converter
+from app.services.ffmpeg_converter.types import AnalysisProfile
+
+
+def make_media(output_file: Path, duration: float) -> Path:
+    """1080p camera-like footage with a keyframe every 2 seconds."""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size=1920x1080:rate=30:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            "60",
+            "-y",
+            str(output_file),
+        ],
+        check=True,
+    )
+    return output_file
+
+
+def run(duration: float, file_counts: list[int]) -> list[dict]:
+    results: list[dict] = []
+    temp_dir: Path = Path(tempfile.mkdtemp())
+    try:
+        media: Path = make_media(temp_dir / "camera.mkv", duration)
+        for files in file_counts:
+            # One copy per file, so the analyses do not share a page cache entry
+            copies: list[Path] = [
+                Path(shutil.copy(media, temp_dir / f"camera_{i}.mkv"))
+                for i in range(files)
+            ]
+            for profile in AnalysisProfile:
+                started: float = time.perf_counter()
+                with concurrent.futures.ThreadPoolExecutor(files) as executor:
+                    samples: list[int] = [
+                        len(times)
+                        for times, _, _ in executor.map(
+                            lambda file: ffmpeg_converter._probe_scene_scores(
+                                file, use_cache=False, profile=profile
+                            ),
+                            copies,
+                        )
+                    ]
+                seconds: float = time.perf_counter() - started
+                results.append(
+                    {
+                        "files": files,
+                        "profile": str(profile),
+                        "seconds": seconds,
+                        "samples": samples[0],
+                        "media_hours_per_minute": files * duration / 3600 / (seconds / 60),
+                    }
+                )
+                print(
+                    f"{files:>3} files  {profile:<10} {seconds:8.2f}s"
+                    f"  {samples[0]:>6} samples"
+                    f"  {results[-1]['media_hours_per_minute']:7.3f} media h/min"
+                )
+            for copy in copies:
+                copy.unlink()
+    finally:
+        shutil.rmtree(temp_dir)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=120)
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found, skipping.")
+        return 0
+    run(args.duration, args.files)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""Benchmark Intervals against the flat-list segment helpers it replaced.
+
+Run from src/:
+    python -m tests.benchmarks.bench_intervals --sizes 1000 10000 100000 1000000
+
+Both sides get the same flat list and return one, so the conversions at the
+boundary are part of the Intervals timings. Times are the best of --repeat runs.
+The legacy select_pieces indexes a deque, which is quadratic, so it takes
+minutes at 1e6 intervals.
+"""
+
+from collections.abc import Callable
+import argparse
+import time
+import numpy as np
+from app.services.ffmpeg_converter import ffmpeg_converter
+from tests import legacy_segments
+
+
+def make_segments(
+    size: int, seed: int = 0
+) -> tuple[list[float], list[float], list[float]]:
+    """Disjoint sorted segments in a shuffled copy, and keyframes every 2 seconds."""
+    rng = np.random.default_rng(seed)
+    flat: np.ndarray = np.cumsum(rng.integers(1, 4000, 2 * size)) / 1000
+    shuffled: np.ndarray = flat.reshape(-1, 2)[rng.permutation(size)].ravel()
+    keyframes: np.ndarray = np.arange(0, flat[-1] + 2, 2.0)
+    return flat.tolist(), shuffled.tolist(), keyframes.tolist()
+
+
+# name: (module, segments, shuffled segments, keyframes) -> result
+OPERATIONS: dict[str, Callable] = {
+    "merge": lambda module, flat, shuffled, keyframes: (
+        module._merge_overlapping_segments(shuffled)
+    ),
+    "minimum_length": lambda module, flat, shuffled, keyframes: (
+        module._ensure_minimum_segment_length(flat, 1.5)
+    ),
+    "keyframe_snapping": lambda module, flat, shuffled, keyframes: (
+        module._adjust_segments_to_keyframes(flat, keyframes)
+    ),
+    "select_pieces": lambda module, flat, shuffled, keyframes: module._select_pieces(
+        flat, flat[-1] + 1, {}, None
+    ),
+}
+
+
+def best_of(repeat: int, func: Callable[[], object]) -> float:
+    seconds: list[float] = []
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - started)
+    return min(seconds)
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    results: list[dict] = []
+    for size in sizes:
+        flat, shuffled, keyframes = make_segments(size)
+        for operation, func in OPERATIONS.items():
+            legacy: float = best_of(
+                repeat, lambda: func(legacy_segments, flat, shuffled, keyframes)
+            )
+            intervals: float = best_of(
+                repeat, lambda: func(ffmpeg_converter, flat, shuffled, keyframes)
+            )
+            results.append(
+                {
+                    "operation": operation,
+                    "size": size,
+                    "legacy_seconds": legacy,
+                    "intervals_seconds": intervals,
+                }
+            )
+            print(
+                f"{operation:<18} {size:>9} intervals"
+                f"  legacy {legacy * 1000:10.2f} ms"
+                f"  Intervals {intervals * 1000:10.2f} ms"
+                f"  {legacy / intervals:6.1f}x"
+            )
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,282 @@
+"""Benchmark the public ffmpeg_converter operations end to end.
+
+Run from src/:
+    python -m tests.benchmarks.bench_operations --durations 60 3600 --gops 25 250 \
+        --output results.json --compare previous.json
+
+Every operation runs in a fresh worker process on synthetic media (see
+media.py), so its CPU time, peak RSS and I/O are its own plus those of its
+ffmpeg children. Peak RSS is the largest single process. Bytes read and written
+count every read/write call, pipes included, and are only available on Linux;
+CPU time and peak RSS need the `resource` module, so they are missing on
+Windows. The analysis cache is kept in a temporary directory per run, so
+every operation analyses its input from scratch.
+"""
+
+from collections.abc import Callable
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from .media import SILENCE_PATTERNS, make_media
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+
+def _every_tenth(duration: float) -> list[float]:
+    """Keep the first half of every tenth of the file."""
+    return [
+        round(t, 3)
+        for i in range(10)
+        for t in (i * duration / 10, i * duration / 10 + duration / 20)
+    ]
+
+
+def _merge_twice(converter, media: Path, output_file: Path) -> int:
+    concat_list: Path = output_file.with_suffix(".txt")
+    line: str = f"file '{media.as_posix()}'\n"
+    concat_list.write_text(line * 2, encoding="utf-8")
+    return converter.merge(concat_list, output_file)
+
+
+# name: (converter module, media, output file, media duration) -> return code
+OPERATIONS: dict[str, Callable[..., int | object]] = {
+    "cut_silence": lambda converter, media, output_file, duration: converter.cut_silence(
+        media, output_file, dB=-35, sl_duration=0.5
+    ),
+    "speedup": lambda converter, media, output_file, duration: converter.speedup(
+        media, output_file, 2
+    ),
+    "jumpcut": lambda converter, media, output_file, duration: converter.jumpcut(
+        media, output_file, 5, 5, interval_multiple=1, lasting_multiple=0
+    ),
+    "merge": lambda converter, media, output_file, duration: _merge_twice(
+        converter, media, output_file
+    ),
+    "keep_or_remove_by_cuts": lambda converter, media, output_file, duration: (
+        converter.keep_or_remove_by_cuts(media, output_file, _every_tenth(duration))
+    ),
+    "keep_or_remove_by_split_segs": lambda converter, media, output_file, duration: (
+        converter.keep_or_remove_by_split_segs(
+            media, output_file, _every_tenth(duration)
+        )
+    ),
+}
+
+
+def _usage() -> dict[str, float | int | None]:
+    usage: dict[str, float | int | None] = {
+        "cpu_seconds": None,
+        "peak_rss_bytes": None,
+        "bytes_read": None,
+        "bytes_written": None,
+    }
+    if resource is not None:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        usage["cpu_seconds"] = (
+            own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+        )
+        # Kilobytes on Linux, bytes on macOS
+        scale: int = 1 if sys.platform == "darwin" else 1024
+        usage["peak_rss_bytes"] = max(own.ru_maxrss, children.ru_maxrss) * scale
+    try:
+        # Counts the reaped children too
+        io: dict[str, int] = {
+            key: int(value)
+            for key, value in (
+                line.split(": ")
+                for line in Path("/proc/self/io").read_text().splitlines()
+            )
+        }
+        usage["bytes_read"] = io["rchar"]
+        usage["bytes_written"] = io["wchar"]
+    except OSError:
+        pass
+    return usage
+
+
+def worker(operation: str, media: Path, output_dir: Path, duration: float) -> dict:
+    """Run one operation in this process and measure it."""
+    from app.services.ffmpeg_converter import ffmpeg_converter
+
+    output_file: Path = output_dir / f"{operation}{media.suffix}"
+    before: dict[str, float | int | None] = _usage()
+    started: float = time.perf_counter()
+    result = OPERATIONS[operation](ffmpeg_converter, media, output_file, duration)
+    wall_seconds: float = time.perf_counter() - started
+    after: dict[str, float | int | None] = _usage()
+    measured: dict = {"wall_seconds": wall_seconds, "returncode": result}
+    for key, value in after.items():
+        # Peak RSS is not a counter
+        measured[key] = (
+            value
+            if value is None or key == "peak_rss_bytes" or before[key] is None
+            else value - before[key]  # type: ignore
+        )
+    return measured
+
+
+def _run_worker(
+    operation: str, media: Path, output_dir: Path, duration: float
+) -> dict:
+    metrics_file: Path = output_dir / f"{operation}.json"
+    # Keep the analysis cache and job manifests of the user out of it
+    app_dirs: dict[str, str] = {
+        "APPDATA": str(output_dir / "appdata"),
+        "PROGRAMDATA": str(output_dir / "programdata"),
+    }
+    for app_dir in app_dirs.values():
+        Path(app_dir).mkdir()
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "tests.benchmarks.bench_operations",
+            "--worker",
+            operation,
+            str(media),
+            str(output_dir),
+            str(duration),
+            str(metrics_file),
+        ],
+        cwd=Path(__file__).resolve().parents[2],
+        env=os.environ | app_dirs,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    if completed.returncode:
+        return {
+            "returncode": f"worker exited with {completed.returncode}",
+            "error": completed.stderr.strip().rsplit("\n", 1)[-1],
+        }
+    return json.loads(metrics_file.read_text(encoding="utf-8"))
+
+
+def _result_key(result: dict) -> tuple:
+    return (result["operation"], result["duration"], result["gop"], result["pattern"])
+
+
+def compare(results: list[dict], previous_file: Path) -> None:
+    previous: dict[tuple, dict] = {
+        _result_key(result): result
+        for result in json.loads(previous_file.read_text(encoding="utf-8"))["results"]
+    }
+    for result in results:
+        old: dict | None = previous.get(_result_key(result))
+        if old is None or not old.get("wall_seconds") or "wall_seconds" not in result:
+            continue
+        print(
+            f"{result['operation']:<30} {result['duration']:>8g}s gop {result['gop']:<4}"
+            f" {result['pattern']:<8} {result['wall_seconds'] / old['wall_seconds']:6.2f}x"
+            " wall time of previous run"
+        )
+
+
+def run(
+    operations: list[str],
+    durations: list[float],
+    gops: list[int],
+    patterns: list[str],
+    media_dir: Path,
+) -> list[dict]:
+    results: list[dict] = []
+    for duration in durations:
+        for gop in gops:
+            for pattern in patterns:
+                media: Path = make_media(media_dir, duration, gop, pattern)
+                for operation in operations:
+                    output_dir: Path = Path(tempfile.mkdtemp())
+                    try:
+                        result: dict = {
+                            "operation": operation,
+                            "duration": duration,
+                            "gop": gop,
+                            "pattern": pattern,
+                        } | _run_worker(operation, media, output_dir, duration)
+                    finally:
+                        shutil.rmtree(output_dir, ignore_errors=True)
+                    results.append(result)
+                    print(
+                        f"{operation:<30} {duration:>8g}s gop {gop:<4} {pattern:<8}"
+                        f" {result.get('wall_seconds', float('nan')):8.2f}s wall"
+                        f" {result.get('cpu_seconds') or float('nan'):8.2f}s cpu"
+                        f"  returned {result['returncode']}"
+                    )
+    return results
+
+
+def _ffmpeg_version() -> str:
+    return subprocess.run(
+        ["ffmpeg", "-version"], capture_output=True, text=True
+    ).stdout.split("\n", 1)[0]
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        operation, media, output_dir, duration, metrics_file = sys.argv[2:7]
+        measured: dict = worker(operation, Path(media), Path(output_dir), float(duration))
+        Path(metrics_file).write_text(json.dumps(measured, default=str), encoding="utf-8")
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS)
+    )
+    parser.add_argument(
+        "--durations", type=float, nargs="+", default=[60], help="seconds, up to 86400"
+    )
+    parser.add_argument("--gops", type=int, nargs="+", default=[250])
+    parser.add_argument(
+        "--patterns", nargs="+", choices=list(SILENCE_PATTERNS), default=["speech"]
+    )
+    parser.add_argument(
+        "--media-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "trimshh_bench_media",
+        help="generated media are kept here for the next runs",
+    )
+    parser.add_argument("--output", type=Path, default=Path("bench_operations.json"))
+    parser.add_argument("--compare", type=Path, help="results of a previous run")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("ffmpeg or ffprobe not found, skipping.")
+        return 0
+    results: list[dict] = run(
+        args.operations, args.durations, args.gops, args.patterns, args.media_dir
+    )
+    args.output.write_text(
+        json.dumps(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+                "ffmpeg": _ffmpeg_version(),
+                "results": results,
+            },
+            indent=2,
+            default=str,
+        ),
+        encoding="utf-8",
+    )
+    print(f"Results written to {args.output}")
+    if args.compare is not None:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""Benchmark the rerender filter graphs on many intervals.
+
+Run from src/:
+    python -m tests.benchmarks.bench_rerender_graph --intervals 1000 10000
+
+The between() chain is evaluated for every frame against every interval, the
+trim/concat batches only against the intervals of their batch.
+"""
+
+from pathlib import Path
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+from app.services.ffmpeg_converter import ffmpeg_converter
+from app.services.ffmpeg_converter.types import RerenderGraph
+
+
+def make_media(output_file: Path, duration: float) -> Path:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size=160x90:rate=10:duration={duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:sample_rate=16000:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            "20",
+            "-y",
+            str(output_file),
+        ],
+        check=True,
+    )
+    return output_file
+
+
+def make_intervals(count: int, duration: float) -> list[float]:
+    """`count` evenly spread intervals keeping 60% of every period."""
+    period: float = duration / count
+    return [
+        round(t, 3)
+        for i in range(count)
+        for t in (i * period, i * period + period * 0.6)
+    ]
+
+
+def run(counts: list[int], seconds_per_interval: float) -> list[dict]:
+    results: list[dict] = []
+    temp_dir: Path = Path(tempfile.mkdtemp())
+    try:
+        for count in counts:
+            duration: float = count * seconds_per_interval
+            media: Path = make_media(temp_dir / f"{count}.mkv", duration)
+            intervals: list[float] = make_intervals(count, duration)
+            for graph in RerenderGraph:
+                output_file: Path = temp_dir / f"{count}_{graph}.mkv"
+                started: float = time.perf_counter()
+                ffmpeg_converter.rerender_segments(
+                    media,
+                    output_file,
+                    intervals,
+                    graph,
+                    **{"c:v": "libx264", "preset": "ultrafast"},
+                )
+                results.append(
+                    {
+                        "intervals": count,
+                        "graph": str(graph),
+                        "seconds": time.perf_counter() - started,
+                    }
+                )
+                print(
+                    f"{count:>6} intervals  {graph:<12} {results[-1]['seconds']:8.2f}s"
+                )
+    finally:
+        shutil.rmtree(temp_dir)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--seconds-per-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found, skipping.")
+        return 0
+    run(args.intervals, args.seconds_per_interval)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
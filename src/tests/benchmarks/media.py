@@ -0,0 +1,92 @@
+"""Deterministic synthetic media for the benchmarks.
+
+Video is testsrc2 and audio a sine tone muted by a scripted silence pattern,
+both from ffmpeg's lavfi sources, so the same parameters give the same file on
+every machine without any download. Files are named after their parameters
+and generated once per media directory, a 24 h file takes a while.
+"""
+
+from pathlib import Path
+import subprocess
+
+# (sound seconds, silence seconds) repeated over the whole file, None is all silent
+SILENCE_PATTERNS: dict[str, tuple[float, float] | None] = {
+    "speech": (4.0, 1.0),
+    "lecture": (20.0, 3.0),
+    "sparse": (2.0, 8.0),
+    "silent": None,
+}
+
+
+def media_name(
+    duration: float, gop: int, pattern: str, size: str = "320x180", rate: int = 25
+) -> str:
+    return f"{pattern}_{duration:g}s_gop{gop}_{size}_{rate}fps.mkv"
+
+
+def _audio_source(duration: float, pattern: str) -> str:
+    cycle: tuple[float, float] | None = SILENCE_PATTERNS[pattern]
+    if cycle is None:
+        return f"anullsrc=channel_layout=mono:sample_rate=16000,atrim=0:{duration}"
+    sound, silence = cycle
+    return (
+        f"sine=frequency=440:sample_rate=16000:duration={duration},"
+        f"volume=0:enable='gte(mod(t,{sound + silence}),{sound})'"
+    )
+
+
+def make_media(
+    media_dir: Path,
+    duration: float,
+    gop: int = 250,
+    pattern: str = "speech",
+    size: str = "320x180",
+    rate: int = 25,
+) -> Path:
+    """Generate the file unless `media_dir` already has it.
+
+    Args:
+        duration (float): Seconds, 60 to 86400 for the usual runs.
+        gop (int, optional): Frames between keyframes. Defaults to 250.
+        pattern (str, optional): Key of SILENCE_PATTERNS. Defaults to "speech".
+    """
+    output_file: Path = media_dir / media_name(duration, gop, pattern, size, rate)
+    if output_file.is_file():
+        return output_file
+    media_dir.mkdir(parents=True, exist_ok=True)
+    temp_file: Path = output_file.with_stem(output_file.stem + "_processing")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={size}:rate={rate}:duration={duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            _audio_source(duration, pattern),
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            str(gop),
+            "-c:a",
+            "aac",
+            "-map_metadata",
+            "-1",
+            "-fflags",
+            "+bitexact",
+            "-flags",
+            "+bitexact",
+            "-shortest",
+            "-y",
+            str(temp_file),
+        ],
+        check=True,
+    )
+    temp_file.replace(output_file)
+    return output_file
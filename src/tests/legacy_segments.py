@@ -0,0 +1,176 @@
+"""The flat-list segment helpers as they were before `Intervals`.
+
+Kept verbatim as the reference the property tests compare against, and as
+the baseline of benchmarks/bench_intervals.py.
+"""
+
+from collections import deque
+from typing import Sequence
+from app.services.ffmpeg_converter.ffmpeg_converter import (
+    _convert_seconds_to_timestamp,
+)
+
+
+def _adjust_segments_to_keyframes(
+    video_segments: Sequence[float], keyframe_times: Sequence[float]
+) -> Sequence[float]:
+    adjusted_segments = []
+    keyframe_index = 0
+
+    for i, time in enumerate(video_segments):
+        if i % 2 == 0:  # start time
+            # 找到不大於當前時間的最大關鍵幀時間
+            while (
+                keyframe_index < len(keyframe_times)
+                and keyframe_times[keyframe_index] <= time
+            ):
+                keyframe_index += 1
+            adjusted_time = (
+                keyframe_times[keyframe_index - 1] if keyframe_index > 0 else time
+            )
+            adjusted_segments.append(adjusted_time)
+        else:  # end time
+            # 找到不小於當前時間的最小關鍵幀時間
+            while (
+                keyframe_index < len(keyframe_times)
+                and keyframe_times[keyframe_index] < time
+            ):
+                keyframe_index += 1
+            adjusted_time = (
+                keyframe_times[keyframe_index]
+                if keyframe_index < len(keyframe_times)
+                else time
+            )
+            adjusted_segments.append(adjusted_time)
+
+    return adjusted_segments
+
+
+def _ensure_minimum_segment_length(
+    video_segments: Sequence[float],
+    seg_min_duration: float = 1,
+    total_duration: float | None = None,
+) -> Sequence[float]:
+    """
+    Ensures that every segment in the video_segments list is at least seg_min_duration seconds long.
+
+    Args:
+        video_segments (list[float]): List of start and end times in seconds.
+        seg_min_duration (float, optional): Minimum duration for each segment in seconds. Defaults to 2.
+
+    Raises:
+        ValueError: If video_segments does not contain pairs of start and end times.
+
+    Returns:
+        list[float]: Updated list of start and end times with adjusted segment durations.
+    """
+    if seg_min_duration == 0 or video_segments == []:
+        return video_segments
+
+    if seg_min_duration < 0:
+        raise ValueError(
+            f"seg_min_duration must greater than 0 but got {seg_min_duration}."
+        )
+
+    if len(video_segments) % 2 != 0:
+        raise ValueError("video_segments must contain pairs of start and end times.")
+
+    if total_duration is None:
+        total_duration = video_segments[-1]
+
+    updated_segments = []
+    for i in range(0, len(video_segments), 2):
+        start_time = video_segments[i]
+        end_time = video_segments[i + 1]
+        duration = end_time - start_time
+
+        if duration >= seg_min_duration or len(video_segments) == 2:
+            updated_segments.extend([start_time, end_time])
+            continue
+
+        if i == len(video_segments) - 2:
+            # This is the last segment
+            start_time = max(0, end_time - seg_min_duration)
+        else:
+            # Calculate the difference between the minimum duration and the current duration
+            diff = seg_min_duration - duration
+            # Adjust the start and end times to increase the duration to the minimum
+            start_time = max(0, start_time - diff / 2)
+            end_time = min(start_time + seg_min_duration, total_duration)
+
+        updated_segments.extend([start_time, end_time])
+
+    # Ensure the hole video is long enough
+    if updated_segments[-1] - updated_segments[0] < seg_min_duration:
+        return []
+
+    return updated_segments
+
+
+def _merge_overlapping_segments(segments: Sequence[float]) -> Sequence[float]:
+    """_summary_
+
+    Args:
+        segments (Sequence[float]): _description_
+
+    Returns:
+        Sequence[float]: _description_
+    """
+    # Sort segments by start time
+    sorted_segments = sorted(
+        (segments[i], segments[i + 1]) for i in range(0, len(segments), 2)
+    )
+    if len(sorted_segments) == 0:
+        return []
+
+    merged_segments = []
+    current_start, current_end = sorted_segments[0]
+
+    for start, end in sorted_segments[1:]:
+        if start <= current_end:
+            # Overlapping segments, merge them
+            current_end = max(current_end, end)
+        else:
+            # No overlap, add the current segment and move to the next
+            merged_segments.extend([current_start, current_end])
+            current_start, current_end = start, end
+
+    # Add the last segment
+    merged_segments.extend([current_start, current_end])
+
+    return merged_segments
+
+
+def _select_pieces(
+    video_segments: Sequence[float],
+    total_duration: float,
+    odd_args: None | dict[str, str],
+    even_args: None | dict[str, str] = None,
+) -> tuple[list[str], list[dict[str, str] | None]]:
+    """Steps 1 to 3 of advanced_keep_or_remove_by_cuts."""
+    # Step 1:convert video segments if needed and double them
+    video_segments = deque(
+        _convert_seconds_to_timestamp(s) if isinstance(s, (float, int)) else s
+        for o in video_segments
+        for s in (o, o)
+    )  # type: ignore
+
+    # Step 2: create a full segment list
+    video_segments.appendleft("00:00:00.000")  # type: ignore
+    video_segments.append(_convert_seconds_to_timestamp(total_duration))  # type: ignore
+
+    # Step 3: Select the segments to keep and their further args
+    selected_segments: list[str] = []
+    segment_args: list[dict[str, str] | None] = []
+    for i in range(0, len(video_segments), 2):
+        if even_args is None and i % 4 == 0:
+            continue
+        if odd_args is None and i % 4 == 2:
+            continue
+        start_time: str = video_segments[i]  # type:ignore
+        end_time: str = video_segments[i + 1]  # type:ignore
+        if start_time[:8] == end_time[:8]:
+            continue
+        selected_segments.extend((start_time, end_time))
+        segment_args.append(even_args if i % 4 == 0 else odd_args)
+    return selected_segments, segment_args
@@ -0,0 +1,147 @@
+"""analysis_cache keys and LRU eviction on a temporary database."""
+
+from collections.abc import Iterator
+from pathlib import Path
+from types import SimpleNamespace
+import concurrent.futures
+import itertools
+import os
+import pytest
+from app.services.ffmpeg_converter import analysis_cache
+
+
+@pytest.fixture
+def db_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    # One tick per call keeps the access order exact
+    clock: Iterator[int] = itertools.count(1)
+    monkeypatch.setattr(
+        analysis_cache, "time", SimpleNamespace(time=lambda: next(clock))
+    )
+    monkeypatch.setattr(analysis_cache, "enabled", True)
+    monkeypatch.setattr(analysis_cache, "_fingerprints", {})
+    return tmp_path / "cache.sqlite"
+
+
+def media(tmp_path: Path, name: str, content: bytes = b"video") -> Path:
+    path: Path = tmp_path / name
+    path.write_bytes(content)
+    return path
+
+
+def rows(db_path: Path) -> int:
+    db = analysis_cache._connect(db_path)
+    try:
+        return db.execute_query("SELECT COUNT(*) FROM analysis")[0][0]
+    finally:
+        db.sqlite = "close"
+
+
+def test_store_and_load(tmp_path: Path, db_path: Path) -> None:
+    video: Path = media(tmp_path, "a.mp4")
+    assert analysis_cache.load(video, "keyframes", db_path) is None
+    analysis_cache.store(video, "keyframes", b"\x00\x01", db_path)
+    analysis_cache.store_json(video, "streams", {"streams": [1, 2]}, db_path)
+    assert analysis_cache.load(video, "keyframes", db_path) == b"\x00\x01"
+    assert analysis_cache.load_json(video, "streams", db_path) == {"streams": [1, 2]}
+    assert analysis_cache.load(video, "other", db_path) is None
+
+    analysis_cache.clear(db_path)
+    assert analysis_cache.load(video, "keyframes", db_path) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path, db_path: Path) -> None:
+    videos: list[Path] = [media(tmp_path, f"{i}.mp4", bytes([i])) for i in range(3)]
+    analysis_cache.store(videos[0], "a", b"0" * 100, db_path, max_bytes=250)
+    analysis_cache.store(videos[1], "a", b"1" * 100, db_path, max_bytes=250)
+    # Reading the first entry makes the second the least recently used
+    assert analysis_cache.load(videos[0], "a", db_path) is not None
+    analysis_cache.store(videos[2], "a", b"2" * 100, db_path, max_bytes=250)
+
+    assert analysis_cache.load(videos[1], "a", db_path) is None
+    assert analysis_cache.load(videos[0], "a", db_path) == b"0" * 100
+    assert analysis_cache.load(videos[2], "a", db_path) == b"2" * 100
+
+    # An entry over the whole budget evicts everything, itself included
+    analysis_cache.store(videos[0], "b", b"x" * 300, db_path, max_bytes=250)
+    assert rows(db_path) == 0
+
+
+def test_changed_file_misses_and_replaces_old_entries(
+    tmp_path: Path, db_path: Path
+) -> None:
+    video: Path = media(tmp_path, "a.mp4", b"first")
+    analysis_cache.store(video, "a", b"old", db_path)
+    stat = video.stat()
+
+    # Same size and mtime, other content: only the fingerprint tells. It is
+    # read once per process, so drop the one in memory like a new run would
+    video.write_bytes(b"other")
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert analysis_cache.load(video, "a", db_path) == b"old"
+    analysis_cache._fingerprints.clear()
+    assert analysis_cache.load(video, "a", db_path) is None
+
+    video.write_bytes(b"longer content")
+    assert analysis_cache.load(video, "a", db_path) is None
+    analysis_cache.store(video, "a", b"new", db_path)
+    assert analysis_cache.load(video, "a", db_path) == b"new"
+    assert rows(db_path) == 1
+
+
+def test_fingerprint_reads_head_and_tail(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(analysis_cache, "FINGERPRINT_CHUNK", 4)
+    content: bytes = b"head" + b"middle" + b"tail"
+    video: Path = media(tmp_path, "a.mp4", content)
+    fingerprint: str = analysis_cache._fingerprint(video, len(content))
+    video.write_bytes(b"head" + b"MIDDLE" + b"tail")
+    assert analysis_cache._fingerprint(video, len(content)) == fingerprint
+    video.write_bytes(b"head" + b"middle" + b"TAIL")
+    assert analysis_cache._fingerprint(video, len(content)) != fingerprint
+
+
+def test_disabled_cache_neither_loads_nor_stores(
+    tmp_path: Path, db_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    video: Path = media(tmp_path, "a.mp4")
+    analysis_cache.store(video, "a", b"value", db_path)
+    monkeypatch.setattr(analysis_cache, "enabled", False)
+    assert analysis_cache.load(video, "a", db_path) is None
+    analysis_cache.store(video, "b", b"value", db_path)
+    monkeypatch.setattr(analysis_cache, "enabled", True)
+    assert analysis_cache.load(video, "b", db_path) is None
+
+
+def test_parallel_writers_keep_every_entry(tmp_path: Path, db_path: Path) -> None:
+    videos: list[Path] = [media(tmp_path, f"{i}.mp4", bytes([i])) for i in range(8)]
+
+    def write(video: Path) -> None:
+        for name in "abcdefghij":
+            analysis_cache.store(video, name, name.encode() * 100, db_path)
+            assert analysis_cache.load(video, name, db_path) is not None
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        list(executor.map(write, videos))
+    assert rows(db_path) == 80
+    db = analysis_cache._connect(db_path)
+    try:
+        assert db.execute_query("PRAGMA journal_mode")[0][0] == "wal"
+    finally:
+        db.sqlite = "close"
+
+
+def test_fingerprints_in_memory_are_bounded(
+    tmp_path: Path, db_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(analysis_cache, "MAX_FINGERPRINTS", 2)
+    a, b, c = (media(tmp_path, f"{name}.mp4") for name in "abc")
+    analysis_cache.file_identity(a)
+    analysis_cache.file_identity(b)
+    # A hit makes a the most recently used, so b is dropped for c
+    analysis_cache.file_identity(a)
+    analysis_cache.file_identity(c)
+    assert [Path(path).name for path, _, _ in analysis_cache._fingerprints] == [
+        "a.mp4",
+        "c.mp4",
+    ]
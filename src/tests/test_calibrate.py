@@ -0,0 +1,95 @@
+"""calibrate_profile targets when ffprobe reports no stream bitrate."""
+
+from pathlib import Path
+from typing import Any
+import json
+import pytest
+from app.services.ffmpeg_converter import analysis_cache, engine, ffmpeg_converter
+from app.services.ffmpeg_converter.types import EncodeProfile
+
+# Sample bitrate of every preset, from the fastest on
+SAMPLE_BITRATES: dict[str, int] = {
+    preset: 4_000_000 - i * 500_000
+    for i, preset in enumerate(ffmpeg_converter.ENCODER_PRESETS)
+}
+
+
+def mkv_probe(format_bit_rate: str | None = None) -> dict[str, Any]:
+    """ffprobe json of a Matroska file, whose streams have no bit_rate."""
+    probe: dict[str, Any] = {
+        "streams": [
+            {"codec_type": "video", "codec_name": "h264", "time_base": "1/1000"},
+            {"codec_type": "audio", "codec_name": "opus", "sample_rate": "48000"},
+        ],
+        "format": {"format_name": "matroska,webm"},
+    }
+    if format_bit_rate is not None:
+        probe["format"]["bit_rate"] = format_bit_rate
+    return probe
+
+
+@pytest.fixture
+def calibrate(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> tuple[Path, list[str], dict[str, Any]]:
+    """Fake ffprobe and sample encodes, returns the input, presets tried, probe."""
+    monkeypatch.setattr(analysis_cache, "enabled", False)
+    monkeypatch.setattr(
+        ffmpeg_converter, "CALIBRATION_PATH", tmp_path / "calibration.json"
+    )
+    video: Path = tmp_path / "clip.mkv"
+    # 2.5 Mb/s over 8 s
+    video.write_bytes(bytes(2_500_000))
+    answers: dict[str, Any] = {"probe": mkv_probe(), "duration": "8.0"}
+
+    def run(argv: list[str], capture: bool = False, **kwargs) -> str:
+        if "format=duration" in argv:
+            return answers["duration"]
+        return json.dumps(answers["probe"])
+
+    tried: list[str] = []
+
+    def encode_sample(priority=None, **kwargs) -> None:
+        tried.append(kwargs["preset"])
+        kwargs["y"].write_bytes(bytes(SAMPLE_BITRATES[kwargs["preset"]] // 8 * 10))
+
+    monkeypatch.setattr(engine, "run", run)
+    monkeypatch.setattr(ffmpeg_converter, "_ffmpeg", encode_sample)
+    monkeypatch.setattr(ffmpeg_converter, "_measure_ssim", lambda *args: 0.99)
+    return video, tried, answers
+
+
+def test_format_bitrate_is_the_target(
+    calibrate: tuple[Path, list[str], dict[str, Any]],
+) -> None:
+    video, tried, answers = calibrate
+    answers["probe"] = mkv_probe(format_bit_rate="3000000")
+    assert ffmpeg_converter.probe_encoding(video)["video_bitrate"] == 3_000_000
+    result = ffmpeg_converter.calibrate_profile(video, sample_duration=10)
+    assert result["preset"] == "veryfast"
+    assert result["bitrate"] == 3_000_000
+    assert tried == ["ultrafast", "superfast", "veryfast"]
+
+
+def test_average_bitrate_is_the_target_without_any_bit_rate(
+    calibrate: tuple[Path, list[str], dict[str, Any]],
+) -> None:
+    video, tried, answers = calibrate
+    assert "video_bitrate" not in ffmpeg_converter.probe_encoding(video)
+    result = ffmpeg_converter.calibrate_profile(video, sample_duration=10)
+    assert result["bitrate"] <= 2_500_000
+    assert tried == list(ffmpeg_converter.ENCODER_PRESETS[:4])
+
+
+def test_no_target_refuses_to_calibrate(
+    calibrate: tuple[Path, list[str], dict[str, Any]],
+) -> None:
+    video, tried, answers = calibrate
+    answers["duration"] = ""
+    with pytest.raises(ValueError):
+        ffmpeg_converter.calibrate_profile(video)
+    # The profile keeps its own preset and nothing is cached for the camera
+    args = ffmpeg_converter.encode_profile_args(EncodeProfile.FAST, True, video)
+    assert args == ffmpeg_converter.ENCODE_PROFILES[EncodeProfile.FAST]
+    assert tried == []
+    assert not ffmpeg_converter.CALIBRATION_PATH.exists()
@@ -0,0 +1,130 @@
+"""FFmpegCommand against the option dicts ffmpeg_converter builds."""
+
+from pathlib import Path
+from app.services.ffmpeg_converter.command import FFmpegCommand, option_args
+
+
+def test_option_args_repeat_sequences_and_bare_flags() -> None:
+    assert option_args({"map": ["0:v", "1:a"], "shortest": "", "crf": 23}) == [
+        "-map",
+        "0:v",
+        "-map",
+        "1:a",
+        "-shortest",
+        "-crf",
+        "23",
+    ]
+    assert option_args() == []
+
+
+def test_from_kwargs_ffprobe_keeps_order() -> None:
+    kwargs: dict = {
+        "v": "error",
+        "skip_frame": "nokey",
+        "select_streams": "v:0",
+        "show_entries": "frame=pts_time",
+        "of": "csv=p=0",
+        "i": Path("in put.mp4"),
+    }
+    assert FFmpegCommand.from_kwargs(kwargs, "ffprobe").argv == [
+        "ffprobe",
+        "-v",
+        "error",
+        "-skip_frame",
+        "nokey",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "frame=pts_time",
+        "-of",
+        "csv=p=0",
+        "-i",
+        # No shell, so no quoting either
+        "in put.mp4",
+    ]
+
+
+def test_from_kwargs_splits_inputs_outputs_and_globals() -> None:
+    # "y" closes the output and turns on overwrite, what follows it is global
+    kwargs: dict = {
+        "ss": 1.5,
+        "i": "a.mp4",
+        "f": "mp4",
+        "c:v": "libx264",
+        "map": [0, "1:a"],
+        "y": Path("out.mp4"),
+        "loglevel": "error",
+    }
+    command = FFmpegCommand.from_kwargs(kwargs, hide_banner="")
+    assert command.global_options == {"hide_banner": "", "y": "", "loglevel": "error"}
+    assert command.inputs == [({"ss": 1.5}, "a.mp4")]
+    assert command.outputs == [
+        ({"f": "mp4", "c:v": "libx264", "map": [0, "1:a"]}, Path("out.mp4"))
+    ]
+    assert command.argv == [
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-loglevel",
+        "error",
+        "-ss",
+        "1.5",
+        "-i",
+        "a.mp4",
+        "-f",
+        "mp4",
+        "-c:v",
+        "libx264",
+        "-map",
+        "0",
+        "-map",
+        "1:a",
+        "out.mp4",
+    ]
+
+
+def test_from_kwargs_empty_key_writes_to_stdout() -> None:
+    command = FFmpegCommand.from_kwargs(
+        {"i": "a.mkv", "af": "silencedetect=n=-35dB:d=1", "f": "null", "": ""}
+    )
+    assert command.argv == [
+        "ffmpeg",
+        "-i",
+        "a.mkv",
+        "-af",
+        "silencedetect=n=-35dB:d=1",
+        "-f",
+        "null",
+        "-",
+    ]
+    assert "y" not in command.global_options
+
+
+def test_builder_methods() -> None:
+    command = (
+        FFmpegCommand(y="")
+        .input("a.mp4", ss=2)
+        .input("b.mp4")
+        .filter_complex("graph.txt", script=True)
+        .output("x.mp4", {"c:v": "copy"})
+        .output("y.mp4")
+        .set_default("c:v", "libx264")
+    )
+    assert command.argv == [
+        "ffmpeg",
+        "-y",
+        "-filter_complex_script",
+        "graph.txt",
+        "-ss",
+        "2",
+        "-i",
+        "a.mp4",
+        "-i",
+        "b.mp4",
+        "-c:v",
+        "copy",
+        "x.mp4",
+        "-c:v",
+        "libx264",
+        "y.mp4",
+    ]
@@ -0,0 +1,49 @@
+"""Tests of the pure helpers of the ffmpeg engine."""
+
+from app.services.ffmpeg_converter import engine
+from app.services.ffmpeg_converter.types import ProgressEvent
+
+PROGRESS_BLOCK: list[str] = [
+    "frame=25",
+    "fps=24.5",
+    "stream_0_0_q=-0.0",
+    "bitrate=N/A",
+    "total_size=N/A",
+    "out_time_us=1000000",
+    "out_time_ms=1000000",
+    "out_time=00:00:01.000000",
+    "dup_frames=0",
+    "drop_frames=0",
+    "speed=2.5x",
+    "progress=continue",
+]
+
+
+def test_route_progress_keeps_filter_output_on_stdout() -> None:
+    metadata: list[str] = [
+        "frame:0    pts:0       pts_time:0",
+        "lavfi.astats.Overall.Peak_level=-20.5",
+        "lavfi.astats.Overall.RMS_level=-31.2",
+    ]
+    lines: list[tuple[int, str]] = [
+        (1, metadata[0]),
+        *((1, line) for line in PROGRESS_BLOCK[:6]),
+        (2, "Input #0, matroska,webm, from 'a.mkv':"),
+        (1, metadata[1]),
+        *((1, line) for line in PROGRESS_BLOCK[6:]),
+        (1, metadata[2]),
+        *((1, line) for line in PROGRESS_BLOCK[:-1]),
+        (1, "progress=end"),
+    ]
+    events: list[ProgressEvent] = []
+    routed: list[str] = list(engine.route_progress(lines, events.append))
+    assert routed == [
+        metadata[0],
+        "Input #0, matroska,webm, from 'a.mkv':",
+        metadata[1],
+        metadata[2],
+    ]
+    assert events == [
+        {"frame": 25, "fps": 24.5, "out_time": 1.0, "speed": 2.5, "done": False},
+        {"frame": 25, "fps": 24.5, "out_time": 1.0, "speed": 2.5, "done": True},
+    ]
@@ -0,0 +1,110 @@
+"""non_silence_from_envelope against a window by window silence scan."""
+
+from array import array
+import numpy as np
+import pytest
+from app.services.ffmpeg_converter import ffmpeg_converter
+from app.services.ffmpeg_converter.types import LoudnessEnvelope
+
+SEEDS: list[int] = list(range(100))
+
+
+def envelope(
+    peak: list[float],
+    window: float = 0.1,
+    start: float = 0.0,
+    total: float | None = None,
+) -> LoudnessEnvelope:
+    return LoudnessEnvelope(
+        window=window,
+        start=start,
+        total_duration=start + len(peak) * window if total is None else total,
+        peak=array("f", peak),
+        rms=array("f", [p - 3 for p in peak]),
+    )
+
+
+def scan_silences(
+    env: LoudnessEnvelope, dB: float, sl_duration: float
+) -> list[tuple[float, float]]:
+    """Silences as runs of windows below dB, cut at the total duration."""
+    silences: list[tuple[float, float]] = []
+    run_start: int | None = None
+    peaks: list[float] = [*env["peak"], 0.0]
+    for i, peak in enumerate(peaks):
+        if peak < dB and i < len(env["peak"]):
+            run_start = i if run_start is None else run_start
+            continue
+        if run_start is not None:
+            start = env["start"] + run_start * env["window"]
+            end = min(env["start"] + i * env["window"], env["total_duration"])
+            if end - start >= sl_duration:
+                silences.append((start, end))
+            run_start = None
+    return silences
+
+
+def test_short_silences_stay_in_the_segments() -> None:
+    # 1 s loud, 0.5 s quiet, 1 s loud, 1.5 s quiet, 0.5 s loud
+    peak: list[float] = [-10] * 10 + [-50] * 5 + [-10] * 10 + [-50] * 15 + [-10] * 5
+    segs, total, silence = ffmpeg_converter.non_silence_from_envelope(
+        envelope(peak), dB=-35, sl_duration=1
+    )
+    assert total == pytest.approx(4.5)
+    assert segs == pytest.approx([0.0, 2.5, 4.0, 4.5])
+    assert silence == pytest.approx(1.5)
+
+
+def test_silence_at_the_edges_and_threshold() -> None:
+    peak: list[float] = [-60] * 12 + [-35] * 3 + [-60] * 20
+    # The last window runs past the end of the file
+    segs, total, silence = ffmpeg_converter.non_silence_from_envelope(
+        envelope(peak, start=0.5, total=3.95), dB=-35, sl_duration=1
+    )
+    # -35 dB is not below -35 dB
+    assert segs == pytest.approx([0.0, 0.5, 1.7, 2.0, 3.95, 3.95])
+    assert total == 3.95
+    assert silence == pytest.approx(1.2 + 1.95)
+
+
+def test_no_silence_keeps_everything() -> None:
+    segs, total, silence = ffmpeg_converter.non_silence_from_envelope(
+        envelope([-20.0] * 30), dB=-35, sl_duration=0.5
+    )
+    assert segs == pytest.approx([0.0, 3.0])
+    assert silence == 0.0
+    segs, total, silence = ffmpeg_converter.non_silence_from_envelope(
+        envelope([]), dB=-35, sl_duration=0.5
+    )
+    assert segs == [0.0, 0.0]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_window_scan(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    n: int = int(rng.integers(0, 500))
+    # Runs of quiet and loud windows of random length
+    peak: list[float] = []
+    while len(peak) < n:
+        level: float = float(rng.choice([-70.0, -40.0, -30.0, -5.0]))
+        peak += [level + float(rng.normal(0, 3))] * int(rng.integers(1, 40))
+    peak = peak[:n]
+    window: float = float(rng.choice([0.02, 0.05, 0.1]))
+    env = envelope(
+        peak,
+        window,
+        start=float(rng.uniform(-0.05, 0.5)),
+        total=float(rng.uniform(0.5, 1.0)) * n * window + 0.5,
+    )
+    dB: float = float(rng.choice([-50, -35, -20]))
+    sl_duration: float = float(rng.choice([0.1, 0.5, 1, 2]))
+
+    segs, total, silence = ffmpeg_converter.non_silence_from_envelope(
+        env, dB, sl_duration
+    )
+    silences = scan_silences(env, dB, sl_duration)
+    assert total == env["total_duration"]
+    assert segs == pytest.approx(
+        [0.0, *[t for pair in silences for t in pair], env["total_duration"]]
+    )
+    assert silence == pytest.approx(sum(end - start for start, end in silences))
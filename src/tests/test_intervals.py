@@ -0,0 +1,191 @@
+"""Property tests of Intervals against the flat-list helpers it replaced."""
+
+import numpy as np
+import pytest
+from app.services.ffmpeg_converter import ffmpeg_converter
+from app.services.ffmpeg_converter.intervals import Intervals
+from app.services.ffmpeg_converter.keyframe_index import KeyframeIndex
+from . import legacy_segments
+
+SEEDS: list[int] = list(range(200))
+
+
+def random_flat(rng: np.random.Generator, disjoint: bool) -> list[float]:
+    """Segments on a millisecond grid, so that ties and touching rows happen."""
+    n: int = int(rng.integers(0, 30))
+    if disjoint:
+        times = np.cumsum(rng.integers(0, 4000, 2 * n)) / 1000
+        return times.tolist()
+    starts = rng.integers(0, 60_000, n) / 1000
+    lengths = rng.integers(0, 8000, n) / 1000
+    return np.column_stack((starts, starts + lengths)).ravel().tolist()
+
+
+def covered(intervals: Intervals, points: np.ndarray) -> np.ndarray:
+    return (
+        (points[:, None] >= intervals.starts) & (points[:, None] < intervals.ends)
+    ).any(axis=1)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_merge_matches_legacy(seed: int) -> None:
+    flat: list[float] = random_flat(np.random.default_rng(seed), disjoint=False)
+    assert ffmpeg_converter._merge_overlapping_segments(
+        flat
+    ) == legacy_segments._merge_overlapping_segments(flat)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_minimum_length_matches_legacy(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    flat: list[float] = random_flat(rng, disjoint=True)
+    min_duration: float = float(rng.integers(0, 5000)) / 1000
+    total: float | None = (
+        None if not flat or rng.random() < 0.5 else flat[-1] + float(rng.random())
+    )
+    assert ffmpeg_converter._ensure_minimum_segment_length(
+        flat, min_duration, total
+    ) == legacy_segments._ensure_minimum_segment_length(flat, min_duration, total)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_keyframe_snapping_matches_legacy(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    # The legacy scan walks both lists once, it takes sorted keyframes and
+    # disjoint segments like every caller passes
+    flat: list[float] = random_flat(rng, disjoint=True)
+    keyframes: list[float] = (
+        rng.integers(0, 70_000, rng.integers(0, 40)) / 1000
+    ).tolist()
+    # Segment times that are keyframes themselves
+    keyframes += rng.choice(flat, min(len(flat), 5)).tolist() if flat else []
+    keyframes.sort()
+    assert ffmpeg_converter._adjust_segments_to_keyframes(
+        flat, keyframes
+    ) == legacy_segments._adjust_segments_to_keyframes(flat, keyframes)
+    assert ffmpeg_converter._adjust_segments_to_keyframes(
+        flat, KeyframeIndex(keyframes)
+    ) == legacy_segments._adjust_segments_to_keyframes(flat, keyframes)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_select_pieces_matches_legacy(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    flat: list[float] = random_flat(rng, disjoint=True)
+    total: float = (flat[-1] if flat else 0.0) + float(rng.integers(0, 3000)) / 1000
+    odd_args, even_args = [
+        (None, {}),
+        ({}, None),
+        ({}, {"filter:v": "setpts=0.5*PTS"}),
+    ][seed % 3]
+    assert ffmpeg_converter._select_pieces(
+        flat, total, odd_args, even_args
+    ) == legacy_segments._select_pieces(flat, total, odd_args, even_args)
+
+
+def test_select_pieces_keeps_given_timestamps() -> None:
+    segments: tuple[str, ...] = ("00:00:00", "00:00:05", "00:12:22", "00:14:26")
+    assert ffmpeg_converter._select_pieces(segments, 1000.5, {}, None) == (
+        ["00:00:00", "00:00:05", "00:12:22", "00:14:26"],
+        [{}, {}],
+    )
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_union_intersection_complement(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    a: Intervals = Intervals.from_flat(random_flat(rng, disjoint=False))
+    b: Intervals = Intervals.from_flat(random_flat(rng, disjoint=False))
+    # Points off the millisecond grid, so they never sit on a boundary
+    points: np.ndarray = rng.random(500) * 80 - 5
+
+    union: Intervals = a.union(b)
+    assert np.all(union.starts[1:] > union.ends[:-1])
+    assert np.array_equal(
+        covered(union, points), covered(a, points) | covered(b, points)
+    )
+
+    intersection: Intervals = a.intersection(b)
+    assert np.all(intersection.durations > 0)
+    assert np.array_equal(
+        covered(intersection, points), covered(a, points) & covered(b, points)
+    )
+
+    complement: Intervals = a.complement(-5, 75)
+    inside: np.ndarray = (points >= -5) & (points < 75)
+    assert np.array_equal(covered(complement, points), inside & ~covered(a, points))
+    assert union.union() == union
+    assert a.complement(-5, 75).complement(-5, 75) == a.union().intersection(
+        Intervals([(-5, 75)])
+    )
+
+
+@pytest.mark.parametrize("seed", SEEDS[:50])
+def test_pad_and_close_gaps(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    a: Intervals = Intervals.from_flat(random_flat(rng, disjoint=True))
+    padded: Intervals = a.pad(0.5, 1.0, 0.0, 30.0)
+    assert np.all((padded.bounds >= 0) & (padded.bounds <= 30))
+    assert len(padded) == len(a)
+
+    closed: Intervals = a.close_gaps(1.0)
+    gaps: np.ndarray = closed.starts[1:] - closed.ends[:-1]
+    assert np.all(gaps > 1.0)
+    assert closed.union(a) == closed
+    assert a.union().close_gaps(0) == a.union()
+
+
+def test_timestamps_match_legacy() -> None:
+    rng = np.random.default_rng(0)
+    # Up to a few hundred days, hours past 99 take more digits
+    seconds: np.ndarray = rng.random(1000) * 10.0 ** rng.integers(0, 8, 1000)
+    assert Intervals.from_flat(seconds).timestamps() == [
+        ffmpeg_converter._convert_seconds_to_timestamp(s) for s in seconds.tolist()
+    ]
+
+
+def test_from_flat_rejects_odd_length() -> None:
+    with pytest.raises(ValueError):
+        Intervals.from_flat([1.0, 2.0, 3.0])
+
+
+def test_keyframe_snapping_empty_segment_on_keyframe() -> None:
+    flat: list[float] = [1.0, 1.0, 2.5, 2.5]
+    keyframes: list[float] = [0.0, 1.0, 2.0, 3.0]
+    assert ffmpeg_converter._adjust_segments_to_keyframes(flat, keyframes) == [
+        1.0,
+        2.0,
+        2.0,
+        3.0,
+    ]
+    assert ffmpeg_converter._adjust_segments_to_keyframes(
+        flat, keyframes
+    ) == legacy_segments._adjust_segments_to_keyframes(flat, keyframes)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_piece_owners_match_a_scan_of_every_pair(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    flat: list[float] = random_flat(rng, disjoint=bool(rng.integers(0, 2)))
+    keyframes: list[float] = sorted(
+        (rng.integers(0, 70_000, rng.integers(1, 40)) / 1000).tolist()
+    )
+    # Snapped pairs share GOPs, empty pairs stay as they are
+    pairs: list[tuple[float, float]] = [
+        snapped if end > start else (start, end)
+        for (start, end), snapped in zip(
+            zip(flat[::2], flat[1::2]),
+            Intervals.from_flat(flat).snap_to_keyframes(KeyframeIndex(keyframes)),
+        )
+    ]
+    piece_starts: list[float] = [0.0, *sorted({t for pair in pairs for t in pair})]
+    piece_starts += (rng.integers(0, 70_000, 10) / 1000).tolist()
+    delta: float = ffmpeg_converter.SEGMENT_TIME_DELTA
+    assert ffmpeg_converter._piece_owners(pairs, piece_starts) == [
+        [
+            i
+            for i, (start, end) in enumerate(pairs)
+            if start - delta <= piece_start < end - delta
+        ]
+        for piece_start in piece_starts
+    ]
@@ -0,0 +1,113 @@
+"""Tests of resumable jobs, scratch dirs and their garbage collection."""
+
+from pathlib import Path
+import os
+import time
+import pytest
+from app.services.ffmpeg_converter import job_manifest
+from app.services.ffmpeg_converter.job_manifest import (
+    Job,
+    collect_garbage,
+    open_job,
+    scratch_dir,
+)
+
+
+@pytest.fixture
+def input_file(tmp_path: Path) -> Path:
+    path: Path = tmp_path / "input.mp4"
+    path.write_bytes(os.urandom(1000))
+    return path
+
+
+@pytest.fixture
+def jobs_dir(tmp_path: Path) -> Path:
+    return tmp_path / "jobs"
+
+
+def age(path: Path, seconds: float) -> None:
+    past: float = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_job_resumes_completed_segments(input_file: Path, jobs_dir: Path) -> None:
+    plan: dict = {"segments": [0.0, 1.0, 2.0, 3.0]}
+    job: Job = open_job(input_file, "keep_or_remove", plan, jobs_dir)
+    assert job.files(0) is None
+    segment: Path = jobs_dir / "pending.mp4"
+    segment.write_bytes(b"segment")
+    kept: list[Path] = job.complete(0, [segment])
+    assert kept == [job.dir / "0_0.mp4"] and not segment.exists()
+    job.close()
+
+    resumed: Job = open_job(input_file, "keep_or_remove", plan, jobs_dir)
+    assert resumed.job_id == job.job_id
+    assert resumed.files(0) == kept
+    assert resumed.files(1) is None
+    resumed.close()
+
+    # Another plan is another job
+    other: Job = open_job(input_file, "keep_or_remove", {"segments": []}, jobs_dir)
+    assert other.job_id != job.job_id and other.files(0) is None
+    other.close()
+
+
+def test_changed_segment_is_rendered_again(input_file: Path, jobs_dir: Path) -> None:
+    job: Job = open_job(input_file, "cut", {}, jobs_dir)
+    segment: Path = jobs_dir / "pending.mp4"
+    segment.write_bytes(b"segment")
+    kept: list[Path] = job.complete(0, [segment])
+    job.close()
+    kept[0].write_bytes(b"truncated")
+    assert open_job(input_file, "cut", {}, jobs_dir).files(0) is None
+
+
+def test_finish_removes_the_job(input_file: Path, jobs_dir: Path) -> None:
+    job: Job = open_job(input_file, "cut", {}, jobs_dir)
+    job.finish()
+    assert not job.dir.exists()
+    assert collect_garbage(jobs_dir) == 0
+
+
+def test_collect_garbage(input_file: Path, jobs_dir: Path) -> None:
+    stale: Job = open_job(input_file, "cut", {"stale": True}, jobs_dir)
+    stale.close()
+    closed: Job = open_job(input_file, "cut", {"closed": True}, jobs_dir)
+    closed.close()
+    running: Job = open_job(input_file, "cut", {"running": True}, jobs_dir)
+    orphan: Path = jobs_dir / "0123456789abcdef"
+    orphan.mkdir()
+
+    assert collect_garbage(jobs_dir, max_age=-1) == 3
+    assert not stale.dir.exists() and not closed.dir.exists() and not orphan.exists()
+    # Open jobs are kept whatever their age
+    assert running.dir.exists()
+    running.close()
+
+
+def test_scratch_dir(jobs_dir: Path) -> None:
+    with scratch_dir(jobs_dir) as path:
+        assert path.parent == jobs_dir
+        (path / "piece.mp4").write_bytes(b"piece")
+        # In use, however old it looks
+        age(path, job_manifest.SCRATCH_MAX_AGE + 60)
+        assert collect_garbage(jobs_dir) == 0
+        assert path.exists()
+    assert not path.exists()
+
+    with pytest.raises(RuntimeError):
+        with scratch_dir(jobs_dir) as path:
+            raise RuntimeError
+    assert not path.exists()
+
+
+def test_leaked_scratch_dirs_expire(jobs_dir: Path) -> None:
+    jobs_dir.mkdir()
+    recent: Path = jobs_dir / f"{job_manifest.SCRATCH_PREFIX}recent"
+    leaked: Path = jobs_dir / f"{job_manifest.SCRATCH_PREFIX}leaked"
+    recent.mkdir()
+    leaked.mkdir()
+    age(leaked, job_manifest.SCRATCH_MAX_AGE + 60)
+    # A recent one may belong to another process
+    assert collect_garbage(jobs_dir) == 1
+    assert recent.exists() and not leaked.exists()
@@ -0,0 +1,72 @@
+"""Where _cut_sl_speedup_file keeps its intermediates and how it publishes them."""
+
+from pathlib import Path
+import errno
+import tempfile
+import pytest
+from app.actions.mideo_converter import mideo_converter
+from app.actions.mideo_converter.types import FileStatus
+
+ffmpeg_converter = mideo_converter.ffmpeg_converter
+
+
+@pytest.fixture
+def cut_silence(monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+    """Fake cut_silence writing its output, returns the files it wrote."""
+    written: list[Path] = []
+
+    def fake(input_file: Path, output_file: Path, **kwargs) -> int:
+        output_file.write_bytes(b"cut " + input_file.read_bytes())
+        written.append(output_file)
+        return 0
+
+    monkeypatch.setattr(ffmpeg_converter, "cut_silence", fake)
+    return written
+
+
+def test_scratch_dir_is_next_to_the_output(
+    tmp_path: Path, cut_silence: list[Path]
+) -> None:
+    video: Path = tmp_path / "1700000000.mkv"
+    video.write_bytes(b"video")
+    output_dir: Path = tmp_path / "out"
+    output_dir.mkdir()
+    output_file: Path = output_dir / "1700000000_out.mkv"
+
+    result = mideo_converter._cut_sl_speedup_file(video, output_file, 0, False, {})
+    assert result["status"] == FileStatus.DONE
+    assert cut_silence[0].parent.parent == output_dir
+    assert output_file.read_bytes() == b"cut video"
+    assert output_file.stat().st_mtime == 1700000000
+    # The scratch dir is gone, only the output is left
+    assert list(output_dir.iterdir()) == [output_file]
+
+
+def test_output_is_moved_across_drives(
+    tmp_path: Path, cut_silence: list[Path], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    video: Path = tmp_path / "clip.mkv"
+    video.write_bytes(b"video")
+    other_drive: Path = tmp_path / "other_drive"
+    other_drive.mkdir()
+    output_file: Path = tmp_path / "clip_out.mkv"
+    output_file.write_bytes(b"older output")
+
+    mkdtemp = tempfile.mkdtemp
+    monkeypatch.setattr(
+        tempfile,
+        "mkdtemp",
+        lambda prefix=None, dir=None: mkdtemp(prefix=prefix, dir=other_drive),
+    )
+
+    def cross_device_replace(self: Path, target: Path) -> Path:
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(Path, "replace", cross_device_replace)
+
+    result = mideo_converter._cut_sl_speedup_file(video, output_file, 0, False, {})
+    assert result["status"] == FileStatus.DONE
+    assert cut_silence[0].parent.parent == other_drive
+    assert output_file.read_bytes() == b"cut video"
+    assert not cut_silence[0].exists()
+    assert list(other_drive.iterdir()) == []
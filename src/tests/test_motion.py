@@ -0,0 +1,221 @@
+"""motion_segments against the loops of might_be_useful/fdcm.py it vectorises."""
+
+import statistics
+import numpy as np
+import pytest
+from app.services.ffmpeg_converter import ffmpeg_converter
+from app.services.ffmpeg_converter.intervals import Intervals
+
+SEEDS: list[int] = list(range(100))
+# Seconds between two scores, every 20th frame at 30 fps
+STEP: float = 20 / 30
+
+
+def fdcm_threshold(
+    times: list[float],
+    median: list[float],
+    min_threshold: float,
+    max_threshold: float,
+    test_duration: float,
+) -> float:
+    """The threshold search loop of fdcm.py."""
+    threshold: float = min_threshold
+    while True:
+        longest_still: float = 0
+        last_change: float = 0
+        run: float = 0
+        for x in range(len(times)):
+            if median[x] < threshold:
+                run = times[x] - last_change
+            else:
+                if longest_still < run:
+                    longest_still = run
+                last_change = times[x]
+        if longest_still <= test_duration:
+            threshold += min_threshold
+            if threshold > max_threshold:
+                return min_threshold
+        else:
+            return threshold
+
+
+def fdcm_segments(
+    times: list[float],
+    scores: list[float],
+    min_threshold: float = 0.0095,
+    max_threshold: float = 0.04,
+    test_duration: float = 7,
+    smooth: int = 0,
+    samples_to_start: int = 2,
+    samples_to_end: int = 10,
+    before: float = 2.5,
+    after: float = 2,
+    min_break: float = 5.9,
+    ignore_start: float = 2,
+    ignore_end: float = 2,
+) -> list[tuple[float, float]]:
+    """fdcm.py from the scene scores on, clips are cut at the last score time."""
+    f = range(len(times))
+    median: list[float] = [
+        statistics.median(scores[max(0, x - smooth) : x + smooth + 1]) for x in f
+    ]
+    threshold: float = fdcm_threshold(
+        times, median, min_threshold, max_threshold, test_duration
+    )
+
+    trigger: list[int] = []
+    x_max: int = len(f) - max(samples_to_start, samples_to_end)
+    for x in f:
+        if x >= x_max:
+            trigger.append(0)
+        elif all(median[x + y] > threshold for y in range(samples_to_start)):
+            trigger.append(1)
+        elif not any(median[x + y] > threshold for y in range(samples_to_end)):
+            trigger.append(-1)
+        else:
+            trigger.append(0)
+
+    starts: list[float] = []
+    ends: list[float] = []
+    copying: bool = False
+    end_time: float = times[-1]
+    for x in f:
+        if times[x] < ignore_start:
+            continue
+        if x >= x_max or times[x] > end_time - ignore_end:
+            # fdcm keeps copying here and marks every later sample as an end,
+            # only the first one gets paired with the start
+            if copying:
+                ends.append(times[x])
+            continue
+        if not copying:
+            if trigger[x] == 1:
+                starts.append(times[x])
+                copying = True
+            continue
+        if trigger[x] == -1:
+            can_end: bool = True
+            y: int = x
+            while True:
+                y += 1
+                if y >= x_max:
+                    break
+                if trigger[y] == 1:
+                    can_end = False
+                    break
+                if times[y] - times[x] > min_break:
+                    break
+            if can_end:
+                ends.append(times[x])
+                copying = False
+    return [
+        (max(start - before, 0), min(end + after, end_time))
+        for start, end in zip(starts, ends)
+    ]
+
+
+def synthetic_scores(
+    rng: np.random.Generator, noise: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Still noise with motion bursts of random length, gap and strength.
+
+    Gaps run from one sample to well past min_break and bursts often sit on
+    the first or last seconds, so restarts and the ignored ends are all hit.
+    """
+    n: int = int(rng.integers(20, 400))
+    scores = rng.uniform(0, noise, n)
+    position: int = int(rng.integers(0, 8))
+    while position < n:
+        length: int = min(int(rng.integers(1, 15)), n - position)
+        burst = rng.uniform(0.01, 0.12, length)
+        # A few samples dip below the threshold inside the burst
+        burst[rng.random(length) < 0.15] = rng.uniform(0, noise)
+        scores[position : position + length] = burst
+        position += length + int(rng.integers(1, 30))
+    if rng.random() < 0.3:
+        scores[-int(rng.integers(1, 6)) :] = rng.uniform(0.01, 0.12)
+    times = np.arange(n) * STEP + float(rng.uniform(0, 0.1))
+    return times, scores
+
+
+def merged(clips: list[tuple[float, float]]) -> list[float]:
+    """fdcm writes overlapping clips as separate files, motion_segments joins them."""
+    return Intervals(np.array(clips, dtype=np.float64).reshape(-1, 2)).union().to_flat()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_motion_segments_match_fdcm(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    # Noise above min_threshold makes the search raise the threshold
+    times, scores = synthetic_scores(rng, float(rng.choice([0.008, 0.015, 0.03])))
+    kwargs: dict = {
+        "smooth": int(rng.integers(0, 3)),
+        "samples_to_start": int(rng.integers(1, 4)),
+        "samples_to_end": int(rng.integers(2, 12)),
+        "min_break": float(rng.choice([0.0, 2.0, 5.9, 15.0])),
+        "ignore_start": float(rng.choice([0.0, 2.0, 10.0])),
+        "ignore_end": float(rng.choice([0.0, 2.0, 10.0])),
+        "test_duration": float(rng.choice([3.0, 7.0])),
+    }
+    expected: list[float] = merged(
+        fdcm_segments(times.tolist(), scores.tolist(), **kwargs)
+    )
+    assert ffmpeg_converter.motion_segments(
+        times, scores, float(times[-1]), **kwargs
+    ) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_threshold_search_matches_fdcm(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    noise: float = float(rng.choice([0.008, 0.015, 0.025, 0.05]))
+    times, scores = synthetic_scores(rng, noise)
+    test_duration: float = float(rng.choice([1.0, 3.0, 7.0]))
+    assert ffmpeg_converter._search_motion_threshold(
+        times, scores, 0.0095, 0.04, test_duration
+    ) == pytest.approx(
+        fdcm_threshold(times.tolist(), scores.tolist(), 0.0095, 0.04, test_duration)
+    )
+
+
+def test_threshold_search_steps_up_and_falls_back() -> None:
+    times = np.arange(40) * 1.0
+    # 9 s still at 0.015 between two bursts, 0.0095 sees no still stretch
+    scores = np.full(40, 0.015)
+    scores[[0, 10, 30]] = 0.1
+    assert ffmpeg_converter._search_motion_threshold(
+        times, scores, 0.0095, 0.04, 7
+    ) == pytest.approx(0.019)
+    # Too noisy for any threshold up to 0.04
+    scores[:] = 0.05
+    assert ffmpeg_converter._search_motion_threshold(
+        times, scores, 0.0095, 0.04, 7
+    ) == pytest.approx(0.0095)
+
+
+def test_min_break_keeps_short_pauses() -> None:
+    times = np.arange(60) * 1.0
+    scores = np.zeros(60)
+    # Motion ends at 23 s and starts again at 27 s, the last still sample is 26 s
+    scores[[20, 21, 22, 27, 28, 29]] = 0.1
+    kwargs: dict = {"samples_to_end": 2, "before": 0, "after": 0}
+    assert ffmpeg_converter.motion_segments(
+        times, scores, 60, min_break=5, **kwargs
+    ) == [20.0, 30.0]
+    assert ffmpeg_converter.motion_segments(
+        times, scores, 60, min_break=2, **kwargs
+    ) == [20.0, 23.0, 27.0, 30.0]
+
+
+def test_ignore_start_and_end() -> None:
+    times = np.arange(60) * 1.0
+    scores = np.zeros(60)
+    scores[[1, 2, 3, 30, 31, 54, 55, 56]] = 0.1
+    kwargs: dict = {"samples_to_end": 2, "before": 0, "after": 0}
+    assert ffmpeg_converter.motion_segments(
+        times, scores, 60, ignore_start=0, ignore_end=0, **kwargs
+    ) == [1.0, 4.0, 30.0, 32.0, 54.0, 57.0]
+    # Starts before 2 s are dropped, a clip past 59 - 4 s ends on the next sample
+    assert ffmpeg_converter.motion_segments(
+        times, scores, 60, ignore_start=2, ignore_end=4, **kwargs
+    ) == [2.0, 4.0, 30.0, 32.0, 54.0, 56.0]
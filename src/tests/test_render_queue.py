@@ -0,0 +1,234 @@
+"""RenderQueue ordering, pausing and cancelling, RenderProgress accounting."""
+
+from collections import defaultdict
+import threading
+import time
+import pytest
+from app.services.ffmpeg_converter.engine import current_cancel
+from app.services.ffmpeg_converter.types import ProgressEvent
+from app.views.progress import RenderProgress
+from app.views.render_queue import RenderQueue, RenderStatus
+
+TIMEOUT: float = 5
+
+
+class Renders:
+    """Render function whose jobs run until released or cancelled."""
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.gates: defaultdict[str, threading.Event] = defaultdict(threading.Event)
+        self.changes: list[tuple[str, RenderStatus]] = []
+        self.idle = threading.Event()
+
+    def __call__(self, job_id: str, result: int | Exception = 0) -> int:
+        self.started.append(job_id)
+        token = current_cancel.get()
+        assert token is not None
+        while not self.gates[job_id].wait(0.001):
+            token.raise_if_cancelled()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def queue(self, concurrency: int) -> RenderQueue:
+        return RenderQueue(
+            self,
+            on_change=lambda job_id, status: self.changes.append((job_id, status)),
+            on_idle=self.idle.set,
+            concurrency=concurrency,
+        )
+
+    def wait_started(self, *job_ids: str) -> None:
+        for _ in range(int(TIMEOUT / 0.001)):
+            if all(job_id in self.started for job_id in job_ids):
+                return
+            time.sleep(0.001)
+        pytest.fail(f"{job_ids} not started")
+
+    def release(self, queue: RenderQueue, job_id: str) -> None:
+        """Let a running job end and wait until its end is reported."""
+        self.gates[job_id].set()
+        for _ in range(int(TIMEOUT / 0.001)):
+            if queue.status(job_id) != RenderStatus.RENDERING and any(
+                job == job_id and status != RenderStatus.RENDERING
+                for job, status in list(self.changes)
+            ):
+                return
+            time.sleep(0.001)
+        pytest.fail(f"{job_id} still rendering")
+
+
+def test_waiting_jobs_start_in_queue_order_after_moves_and_pauses() -> None:
+    renders = Renders()
+    queue = renders.queue(concurrency=1)
+    for job_id in "abcd":
+        queue.add(job_id)
+    assert renders.started == []
+    # a b c d -> a d c b
+    assert queue.move("d", -2) == "b"
+    assert queue.move("a", -1) is None
+    assert queue.move("b", 1) is None
+    assert queue.toggle_pause("c") == RenderStatus.PAUSED
+
+    assert queue.start()
+    renders.wait_started("a")
+    assert queue.move("a", 1) is None
+    assert queue.toggle_pause("a") is None
+    renders.release(queue, "a")
+    renders.wait_started("d")
+    renders.release(queue, "d")
+    renders.wait_started("b")
+    renders.release(queue, "b")
+    assert renders.idle.wait(TIMEOUT)
+    assert not queue.running
+    assert queue.status("c") == RenderStatus.PAUSED
+
+    # Releasing a job of a stopped queue does not start it
+    assert queue.toggle_pause("c") == RenderStatus.READY
+    assert renders.started == ["a", "d", "b"]
+    renders.idle.clear()
+    assert queue.start()
+    renders.wait_started("c")
+    renders.release(queue, "c")
+    assert renders.idle.wait(TIMEOUT)
+    assert renders.started == ["a", "d", "b", "c"]
+    assert not queue.start()
+
+
+def test_cancel_waiting_and_running_jobs() -> None:
+    renders = Renders()
+    queue = renders.queue(concurrency=1)
+    queue.add("a")
+    queue.add("b")
+    queue.start()
+    renders.wait_started("a")
+
+    assert queue.cancel("b") == RenderStatus.CANCELLED
+    assert queue.cancel("a") == RenderStatus.RENDERING
+    assert renders.idle.wait(TIMEOUT)
+    assert queue.status("a") == queue.status("b") == RenderStatus.CANCELLED
+    assert renders.started == ["a"]
+    assert renders.changes == [
+        ("a", RenderStatus.RENDERING),
+        ("a", RenderStatus.CANCELLED),
+    ]
+    # Ended and unknown jobs can't be cancelled
+    assert queue.cancel("a") is None
+    assert queue.cancel("x") is None
+
+
+def test_parallel_renders_and_failures() -> None:
+    renders = Renders()
+    queue = renders.queue(concurrency=2)
+    queue.add("a", 1)
+    queue.add("b", RuntimeError("boom"))
+    queue.add("c")
+    queue.add("d")
+    queue.start()
+    renders.wait_started("a", "b")
+    assert queue.status("c") == RenderStatus.READY
+
+    renders.release(queue, "a")
+    renders.wait_started("c")
+    assert queue.status("d") == RenderStatus.READY
+    # A third slot starts the last job right away
+    queue.set_concurrency(3)
+    renders.wait_started("d")
+    for job_id in "bcd":
+        renders.release(queue, job_id)
+    assert renders.idle.wait(TIMEOUT)
+    assert [queue.status(job_id) for job_id in "abcd"] == [
+        RenderStatus.FAILED,
+        RenderStatus.FAILED,
+        RenderStatus.DONE,
+        RenderStatus.DONE,
+    ]
+    # Every job reports its start before its end
+    for job_id in "abcd":
+        statuses = [status for job, status in renders.changes if job == job_id]
+        assert statuses[0] == RenderStatus.RENDERING and len(statuses) == 2
+
+
+def test_added_jobs_start_while_the_queue_runs() -> None:
+    renders = Renders()
+    queue = renders.queue(concurrency=1)
+    queue.add("a")
+    queue.start()
+    renders.wait_started("a")
+    queue.add("b")
+    renders.release(queue, "a")
+    renders.wait_started("b")
+    renders.release(queue, "b")
+    assert renders.idle.wait(TIMEOUT)
+
+
+def event(out_time: float, done: bool = False) -> ProgressEvent:
+    return {"frame": 0, "fps": 30.0, "out_time": out_time, "speed": 2.0, "done": done}
+
+
+def test_render_progress_counts_runs_and_finishes_on_real_length() -> None:
+    progress = RenderProgress()
+    progress.add("a", 10)
+    progress.add("b", 5)
+    callback = progress.start("a")
+
+    callback(event(4))
+    job = progress.snapshot()["jobs"]["a"]
+    assert job["fraction"] == pytest.approx(0.4)
+    assert job["running"] and not job["done"]
+    assert job["speed"] == 2.0 and job["eta"] is not None
+
+    # The analysis run ends, the render run starts from 0 again
+    callback(event(6, done=True))
+    callback(event(3))
+    assert progress.snapshot()["jobs"]["a"]["processed"] == pytest.approx(9)
+    # More than expected stays below 100% until the job ends
+    callback(event(5, done=True))
+    assert progress.snapshot()["jobs"]["a"]["fraction"] == pytest.approx(0.99)
+
+    progress.finish("a")
+    snapshot = progress.snapshot()
+    job = snapshot["jobs"]["a"]
+    assert job["done"] and not job["running"]
+    assert job["expected"] == job["processed"] == pytest.approx(11)
+    assert job["speed"] is job["eta"] is None
+    assert snapshot["jobs"]["b"]["fraction"] == 0.0
+    assert snapshot["jobs"]["b"]["eta"] is None
+    assert (snapshot["done"], snapshot["total"]) == (1, 2)
+    assert snapshot["fraction"] == pytest.approx(11 / 16)
+    assert snapshot["throughput"] > 0
+    assert snapshot["eta"] == pytest.approx(5 / snapshot["throughput"])
+
+
+def test_render_progress_without_runs() -> None:
+    progress = RenderProgress()
+    snapshot = progress.snapshot()
+    assert snapshot["total"] == 0 and snapshot["fraction"] == 0.0
+    assert snapshot["throughput"] == 0.0 and snapshot["eta"] is None
+
+
+def test_render_progress_remove_takes_cancelled_jobs_out_of_the_totals() -> None:
+    progress = RenderProgress()
+    progress.add("a", 10)
+    progress.add("b", 5)
+    progress.add("c", 20)
+    callback = progress.start("a")
+    callback(event(4))
+    # b is cancelled while queued, c while running
+    progress.remove("b")
+    progress.start("c")
+    progress.remove("c")
+    snapshot = progress.snapshot()
+    assert set(snapshot["jobs"]) == {"a"}
+    assert (snapshot["done"], snapshot["total"]) == (0, 1)
+    assert snapshot["fraction"] == pytest.approx(0.4)
+
+    progress.finish("a")
+    snapshot = progress.snapshot()
+    assert (snapshot["done"], snapshot["total"]) == (1, 1)
+    assert snapshot["fraction"] == 1.0 and snapshot["eta"] == 0
+    # A finish after the remove and removing twice are no-ops
+    progress.finish("c")
+    progress.remove("b")
+    assert progress.snapshot()["total"] == 1
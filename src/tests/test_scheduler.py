@@ -0,0 +1,172 @@
+"""FFmpegScheduler slot limits and start order, and the runs that take slots."""
+
+from collections.abc import Callable
+from pathlib import Path
+import threading
+import time
+import pytest
+from app.services.ffmpeg_converter import analysis_cache, engine, ffmpeg_converter
+from app.services.ffmpeg_converter.scheduler import FFmpegScheduler, priority
+from app.services.ffmpeg_converter.types import JobPriority
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5) -> None:
+    deadline: float = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.001)
+
+
+def start_waiters(
+    scheduler: FFmpegScheduler,
+    levels: list[JobPriority],
+    started: list[int],
+    by_context: bool = False,
+) -> list[threading.Thread]:
+    """Queue one job per level behind the running ones, in list order.
+
+    The level goes to `slot`, or with `by_context` to `priority` around it.
+    """
+    threads: list[threading.Thread] = []
+
+    def job(i: int, level: JobPriority) -> None:
+        if by_context:
+            with priority(level), scheduler.slot():
+                started.append(i)
+        else:
+            with scheduler.slot(level):
+                started.append(i)
+
+    for i, level in enumerate(levels):
+        queued: int = scheduler.stats()["queued"]
+        thread = threading.Thread(target=job, args=(i, level))
+        thread.start()
+        threads.append(thread)
+        # Tickets are taken in arrival order, so wait for each before the next
+        wait_until(lambda: scheduler.stats()["queued"] == queued + 1)
+    return threads
+
+
+def test_waiting_jobs_start_by_priority_then_arrival() -> None:
+    scheduler = FFmpegScheduler(max_jobs=1, total_threads=4)
+    levels: list[JobPriority] = [
+        JobPriority.LOW,
+        JobPriority.NORMAL,
+        JobPriority.HIGH,
+        JobPriority.NORMAL,
+        JobPriority.HIGH,
+    ]
+    started: list[int] = []
+    with scheduler.slot():
+        threads = start_waiters(scheduler, levels, started)
+        assert started == []
+    for thread in threads:
+        thread.join(5)
+    assert started == [2, 4, 1, 3, 0]
+    stats = scheduler.stats()
+    assert stats["completed"] == 6
+    assert stats["peak_queued"] == 5
+    assert stats["running"] == stats["queued"] == 0
+
+
+def test_priority_context_applies_to_slots_without_level() -> None:
+    scheduler = FFmpegScheduler(max_jobs=1)
+    started: list[int] = []
+    with scheduler.slot():
+        threads = start_waiters(
+            scheduler, [JobPriority.LOW, JobPriority.HIGH], started, by_context=True
+        )
+    for thread in threads:
+        thread.join(5)
+    assert started == [1, 0]
+
+
+def test_running_jobs_stay_within_max_jobs() -> None:
+    scheduler = FFmpegScheduler(max_jobs=2, total_threads=8)
+    assert scheduler.threads_per_job == 4
+    lock = threading.Lock()
+    running: list[int] = [0, 0]  # now, peak
+    given_threads: set[int] = set()
+
+    def job() -> None:
+        with scheduler.slot() as threads:
+            given_threads.add(threads)
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert running == [0, 2]
+    assert given_threads == {4}
+    assert scheduler.stats()["completed"] == 8
+
+
+def test_nested_slot_reuses_the_held_one() -> None:
+    scheduler = FFmpegScheduler(max_jobs=1)
+    with scheduler.slot():
+        with scheduler.slot():
+            assert scheduler.stats()["running"] == 1
+        assert scheduler.stats()["running"] == 1
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.stats()["completed"] == 1
+
+
+def test_configure_wakes_waiting_jobs() -> None:
+    scheduler = FFmpegScheduler(max_jobs=1, total_threads=2)
+    started: list[int] = []
+    with scheduler.slot():
+        threads = start_waiters(
+            scheduler, [JobPriority.NORMAL, JobPriority.NORMAL], started
+        )
+        scheduler.configure(max_jobs=3, total_threads=6)
+        wait_until(lambda: len(started) == 2)
+    for thread in threads:
+        thread.join(5)
+    assert scheduler.threads_per_job == 2
+
+
+def test_process_lines_hold_no_slot_while_the_consumer_runs(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    scheduler = FFmpegScheduler(max_jobs=1)
+    monkeypatch.setattr(ffmpeg_converter, "scheduler", scheduler)
+    running_at_fetch: list[int] = []
+
+    def iter_line_batches(argv: list[str], **kwargs):
+        for i in range(3):
+            running_at_fetch.append(scheduler.stats()["running"])
+            yield [(1, f"{i}a"), (1, f"{i}b")]
+
+    monkeypatch.setattr(engine, "iter_line_batches", iter_line_batches)
+    lines: list[str] = []
+    for _, line in ffmpeg_converter._iter_process_lines(["ffprobe"]):
+        # A run started by the consumer gets the only slot, it does not share it
+        assert scheduler.stats()["running"] == 0
+        with scheduler.slot():
+            lines.append(line)
+    assert lines == ["0a", "0b", "1a", "1b", "2a", "2b"]
+    assert running_at_fetch == [1, 1, 1]
+    assert scheduler.stats()["running"] == 0
+
+
+def test_ffprobe_runs_take_a_slot(monkeypatch: pytest.MonkeyPatch) -> None:
+    scheduler = FFmpegScheduler(max_jobs=1)
+    monkeypatch.setattr(ffmpeg_converter, "scheduler", scheduler)
+    running: list[int] = []
+
+    def run(argv: list[str], capture: bool = False, **kwargs) -> str:
+        running.append(scheduler.stats()["running"])
+        return "12.5\n"
+
+    monkeypatch.setattr(engine, "run", run)
+    monkeypatch.setattr(analysis_cache, "enabled", False)
+    assert ffmpeg_converter.probe_duration(Path("clip.mkv")) == 12.5
+    assert running == [1]
@@ -0,0 +1,102 @@
+"""Tests of the smart cut planning and its edge encoder args."""
+
+from pathlib import Path
+from typing import Any
+import pytest
+from app.services.ffmpeg_converter import ffmpeg_converter
+from app.services.ffmpeg_converter.keyframe_index import KeyframeIndex
+
+
+def make_probe(
+    video_codec: str = "h264",
+    audio_codec: str = "aac",
+    format_name: str = "mov,mp4,m4a,3gp,3g2,mj2",
+    has_b_frames: int = 2,
+) -> dict[str, Any]:
+    return {
+        "streams": [
+            {
+                "codec_type": "video",
+                "codec_name": video_codec,
+                "profile": "High",
+                "level": 40,
+                "pix_fmt": "yuv420p",
+                "width": 1920,
+                "height": 1080,
+                "time_base": "1/15360",
+                "r_frame_rate": "30/1",
+                "has_b_frames": has_b_frames,
+                "bit_rate": "8000000",
+            },
+            {
+                "codec_type": "audio",
+                "codec_name": audio_codec,
+                "profile": "LC",
+                "sample_rate": "48000",
+                "channels": 2,
+                "sample_fmt": "fltp",
+            },
+        ],
+        "format": {"format_name": format_name},
+    }
+
+
+def test_edges_match_the_source_streams() -> None:
+    args, copyable = ffmpeg_converter._create_smart_cut_encode_args(make_probe())
+    assert copyable
+    assert args == {
+        "c:v": "libx264",
+        "b:v": "8000000",
+        "profile:v": "high",
+        "pix_fmt": "yuv420p",
+        "s": "1920x1080",
+        "bf": 3,
+        "b-pyramid": "normal",
+        "level:v": "4",
+        "video_track_timescale": "15360",
+        "c:a": "aac",
+        "ar": "48000",
+        "ac": 2,
+        "sample_fmt": "fltp",
+    }
+    assert ffmpeg_converter._reorder_delay(make_probe()) == pytest.approx(2 / 30)
+
+
+@pytest.mark.parametrize(
+    "probe",
+    [
+        make_probe(video_codec="hevc"),
+        make_probe(audio_codec="vorbis", format_name="matroska,webm"),
+        make_probe(format_name="avi"),
+        make_probe(has_b_frames=3),
+    ],
+)
+def test_unchecked_sources_are_not_copied(probe: dict[str, Any]) -> None:
+    args, copyable = ffmpeg_converter._create_smart_cut_encode_args(probe)
+    assert not copyable
+    # Codecs without a checked encoder are left to the defaults of the container
+    assert args.get("c:v") in (None, "libx264")
+    assert args.get("c:a") in (None, "aac")
+
+
+def test_plan_copies_the_whole_gops() -> None:
+    keyframes = KeyframeIndex([0.0, 2.0, 4.0, 6.0, 8.0])
+    assert ffmpeg_converter._plan_smart_cut(1.5, 7.0, keyframes) == [
+        (1.5, 2.0, False),
+        (2.0, 6.0, True),
+        (6.0, 7.0, False),
+    ]
+    assert ffmpeg_converter._plan_smart_cut(2.0, 6.0, keyframes) == [
+        (2.0, 6.0, True)
+    ]
+    assert ffmpeg_converter._plan_smart_cut(2.5, 3.5, keyframes) == [
+        (2.5, 3.5, False)
+    ]
+
+
+@pytest.mark.parametrize("kwargs", [{"rerender": True}, {"vcodec": "libx265"}])
+def test_smart_cut_refuses_encoding_args(kwargs: dict[str, Any]) -> None:
+    with pytest.raises(ValueError):
+        ffmpeg_converter.cut(
+            Path("in.mp4"), Path("out.mp4"), "00:00:01", "00:00:02", smart=True, **kwargs
+        )
@@ -0,0 +1,73 @@
+"""Frame selection of speedup, whole and in chunks."""
+
+from collections.abc import Callable
+from pathlib import Path
+import numpy as np
+import pytest
+from app.services.ffmpeg_converter import ffmpeg_converter
+
+# 1024 sample AAC frames at 48 kHz
+AUDIO_FRAME: float = 1024 / 48000
+
+
+def test_speedup_args_offset_video_and_audio_frames_apart() -> None:
+    args = ffmpeg_converter._create_speedup_args(8)
+    assert args["vf"] == "select='not(mod(n,8))',setpts=N/FRAME_RATE/TB"
+    assert args["af"] == "aselect='not(mod(n,8))',asetpts=N/SR/TB"
+    args = ffmpeg_converter._create_speedup_args(8, 300, 469)
+    assert args["vf"] == "select='not(mod(n+300,8))',setpts=N/FRAME_RATE/TB"
+    assert args["af"] == "aselect='not(mod(n+469,8))',asetpts=N/SR/TB"
+    # Slow factors change the timestamps, there is nothing to offset
+    args = ffmpeg_converter._create_speedup_args(2, 300, 469)
+    assert args["af"] == "atempo=2"
+
+
+def test_audio_frame_at_is_the_packet_the_seek_lands_in() -> None:
+    packets: np.ndarray = np.arange(100) * AUDIO_FRAME
+    assert ffmpeg_converter._audio_frame_at(packets, 0.0) == 0
+    assert ffmpeg_converter._audio_frame_at(packets, -0.1) == 0
+    assert ffmpeg_converter._audio_frame_at(packets, packets[10]) == 10
+    assert ffmpeg_converter._audio_frame_at(packets, packets[10] + 0.001) == 10
+    assert ffmpeg_converter._audio_frame_at(np.empty(0), 1.0) == 0
+
+
+@pytest.mark.parametrize("multiple, listed", [(8, True), (2, False)])
+def test_chunks_number_audio_frames_from_the_file_start(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, multiple: int, listed: bool
+) -> None:
+    listings: list[Path] = []
+
+    def probe_packet_times(input_file: Path) -> np.ndarray:
+        listings.append(input_file)
+        return np.arange(1000) * AUDIO_FRAME
+
+    chunk_args: list[dict] = []
+
+    def encode_in_chunks(
+        input_file: Path,
+        output_file: Path,
+        create_args: Callable[[float, int], dict],
+        chunks: int,
+    ) -> None:
+        # 30 fps video with a keyframe every 2 s
+        chunk_args.extend(create_args(start, int(start * 30)) for start in (0, 2, 4))
+        output_file.write_bytes(b"")
+
+    monkeypatch.setattr(ffmpeg_converter, "_probe_packet_times", probe_packet_times)
+    monkeypatch.setattr(ffmpeg_converter, "encode_in_chunks", encode_in_chunks)
+    video: Path = tmp_path / "clip.mp4"
+    video.write_bytes(b"")
+    output: Path = tmp_path / "out.mp4"
+    assert ffmpeg_converter.speedup(video, output, multiple, chunks=3) == 0
+
+    assert listings == ([video] if listed else [])
+    if listed:
+        # 2 s is 93.75 audio frames, the seek lands in frame 93
+        assert [args["af"] for args in chunk_args] == [
+            "aselect='not(mod(n,8))',asetpts=N/SR/TB",
+            "aselect='not(mod(n+93,8))',asetpts=N/SR/TB",
+            "aselect='not(mod(n+187,8))',asetpts=N/SR/TB",
+        ]
+        assert chunk_args[1]["vf"].startswith("select='not(mod(n+60,8))'")
+    else:
+        assert {args["af"] for args in chunk_args} == {"atempo=2"}
@@ -0,0 +1,153 @@
+"""Container header checks and the cached validity of clips."""
+
+from pathlib import Path
+import os
+import pytest
+from app.services.ffmpeg_converter import analysis_cache, ffmpeg_converter
+from app.services.ffmpeg_converter.types import ValidityCheck
+
+
+def box(kind: bytes, payload: bytes = b"", size: int | None = None) -> bytes:
+    return (len(payload) + 8 if size is None else size).to_bytes(4) + kind + payload
+
+
+FTYP: bytes = box(b"ftyp", b"isom\x00\x00\x02\x00isomavc1")
+MDAT: bytes = box(b"mdat", bytes(1000))
+MOOV: bytes = box(b"moov", box(b"mvhd", bytes(100)) + box(b"trak", bytes(300)))
+
+
+@pytest.fixture
+def clips(tmp_path: Path) -> Path:
+    for name, content in {
+        "recorded.mp4": FTYP + MDAT + MOOV,
+        "faststart.mp4": FTYP + MOOV + MDAT,
+        # The camera stopped before writing the moov box
+        "no_moov.mp4": FTYP + MDAT,
+        "cut_in_moov.mp4": (FTYP + MDAT + MOOV)[:-50],
+        "cut_in_mdat.mp4": (FTYP + box(b"mdat", bytes(1000)))[:500],
+        # 64-bit box size, then a last box running to the end of the file
+        "large_mdat.mp4": FTYP
+        + (1).to_bytes(4)
+        + b"mdat"
+        + (1016).to_bytes(8)
+        + bytes(1000)
+        + box(b"moov", bytes(200), size=0),
+        "broken_box.mp4": FTYP + box(b"free", size=4) + MOOV,
+        "clip.mkv": b"\x1a\x45\xdf\xa3" + bytes(100),
+        "clip.avi": b"RIFF\x00\x00\x00\x00AVI LIST",
+        "clip.flv": b"FLV\x01" + bytes(20),
+        "clip.ts": (b"\x47" + bytes(187)) * 2,
+        "bad.ts": b"\x47" + bytes(300),
+        "unknown.bin": b"not a video container",
+        "empty.mp4": b"",
+    }.items():
+        (tmp_path / name).write_bytes(content)
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "name, valid",
+    [
+        ("recorded.mp4", True),
+        ("faststart.mp4", True),
+        ("no_moov.mp4", False),
+        ("cut_in_moov.mp4", False),
+        ("cut_in_mdat.mp4", False),
+        ("large_mdat.mp4", True),
+        ("broken_box.mp4", False),
+        ("clip.mkv", True),
+        ("clip.avi", True),
+        ("clip.flv", True),
+        ("clip.ts", True),
+        ("bad.ts", False),
+        ("unknown.bin", None),
+        ("empty.mp4", None),
+        ("missing.mp4", False),
+    ],
+)
+def test_probe_header(clips: Path, name: str, valid: bool | None) -> None:
+    assert ffmpeg_converter._probe_header(clips / name) is valid
+
+
+def test_mp4_has_moov_walks_to_the_moov_box(clips: Path) -> None:
+    with open(clips / "recorded.mp4", "rb") as f:
+        size: int = len(FTYP + MDAT + MOOV)
+        assert ffmpeg_converter._mp4_has_moov(f, size)
+        # The same bytes seen as a shorter file end inside the moov box
+        assert not ffmpeg_converter._mp4_has_moov(f, size - 1)
+        assert not ffmpeg_converter._mp4_has_moov(f, len(FTYP + MDAT))
+
+
+@pytest.fixture
+def db_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    db_path: Path = tmp_path / "cache.sqlite"
+    monkeypatch.setattr(analysis_cache, "CACHE_PATH", db_path)
+    monkeypatch.setattr(analysis_cache, "enabled", True)
+    return db_path
+
+
+def test_validity_is_keyed_by_path_size_and_mtime(
+    clips: Path, db_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(analysis_cache, "QUERY_CHUNK", 2)
+    files: list[Path] = sorted(clips.glob("clip.*"))
+    analysis_cache.store_validity(
+        {f: f.suffix != ".flv" for f in files} | {clips / "missing.mp4": True},
+        "header",
+    )
+    assert analysis_cache.load_validity(files, "header") == {
+        f: f.suffix != ".flv" for f in files
+    }
+    assert analysis_cache.load_validity(files, "duration") == {}
+    assert analysis_cache.load_validity([clips / "missing.mp4"], "header") == {}
+
+    # Another spelling of the same path shares the row
+    relative: Path = Path(os.path.relpath(files[0]))
+    assert analysis_cache.load_validity([relative, files[0]], "header") == {
+        relative: True,
+        files[0]: True,
+    }
+
+    # A rewritten or touched file is checked again
+    files[0].write_bytes(files[0].read_bytes() + b"more")
+    stat = files[1].stat()
+    os.utime(files[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert set(analysis_cache.load_validity(files, "header")) == set(files[2:])
+
+    analysis_cache.store_validity({files[0]: False}, "header")
+    assert analysis_cache.load_validity(files[:1], "header") == {files[0]: False}
+
+
+def test_probe_valid_videos_checks_only_changed_files(
+    clips: Path, db_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    files: list[Path] = [clips / name for name in ("recorded.mp4", "no_moov.mp4")]
+    files += [clips / "clip.mkv", files[0]]
+    expected: dict[Path, bool] = {files[0]: True, files[1]: False, files[2]: True}
+    assert (
+        ffmpeg_converter.probe_valid_videos(files, ValidityCheck.HEADER) == expected
+    )
+
+    checked: list[Path] = []
+
+    def validate_clip(input_file: Path, check: ValidityCheck) -> bool:
+        checked.append(input_file)
+        return ffmpeg_converter._probe_header(input_file) or False
+
+    monkeypatch.setattr(ffmpeg_converter, "_validate_clip", validate_clip)
+    assert (
+        ffmpeg_converter.probe_valid_videos(files, ValidityCheck.HEADER) == expected
+    )
+    assert checked == []
+
+    # The recording got its moov box after all
+    files[1].write_bytes(FTYP + MDAT + MOOV)
+    assert ffmpeg_converter.probe_valid_videos(files, ValidityCheck.HEADER) == (
+        expected | {files[1]: True}
+    )
+    assert checked == [files[1]]
+    assert ffmpeg_converter.probe_valid_videos(
+        files, ValidityCheck.HEADER, use_cache=False
+    ) == (expected | {files[1]: True})
+    assert checked[0] == files[1]
+    assert sorted(checked[1:]) == sorted(files[:3])